@@ -1,12 +1,129 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 from routers.chat_with_history import chat_with_history_router
 from routers.transcribe import transcribe_router
+from routers.cache_stats import cache_stats_router
+from routers.sessions import sessions_router
+from routers.voice_chat import voice_chat_router
+from routers.images import images_router
+from routers.health import health_router
+from features.rag_generation.client_registry import client_registry
+from features.rag_generation.embedding_cache import embedding_cache
+from features.transcription.worker_pool import transcription_pool
+from features.sessions.session_store import session_store
+from features.monitoring.telemetry import telemetry_writer
+from features.monitoring.mlflow_setup import setup_mlflow
+from features.monitoring.readiness import readiness
+from features.monitoring.metrics import render_prometheus
+from features.monitoring.traffic_capture import TrafficCaptureMiddleware, traffic_capture_writer
+from features.rag_generation.semantic_cache import semantic_cache
+from features.rag_generation.rag_router import rag_router
+from features.rag_generation.history_compaction import load_encoding
+from features.rag_generation.admission import AdmissionRejected, chat_limiter, embedding_limiter, summary_limiter
 
 
 load_dotenv()
 
-app = FastAPI(title="Python assistant API", version="0.0.1")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    transcription_pool.start()
+    telemetry_writer.start()
+    traffic_capture_writer.start()
+    # Slow initialization runs in the background so the server accepts requests within seconds.
+    readiness.launch("retrieval", client_registry.warm_up)
+    readiness.launch("transcription", transcription_pool.warm_up)
+    readiness.launch("mlflow", setup_mlflow)
+    readiness.launch("rag_router", rag_router.load)
+    readiness.launch("tokenizer", load_encoding)
+    app.state.clients = client_registry
+    yield
+    await readiness.stop()
+    await client_registry.aclose()
+    transcription_pool.shutdown()
+    embedding_cache.close()
+    session_store.close()
+    telemetry_writer.stop()
+    traffic_capture_writer.stop()
+
+
+app = FastAPI(title="Python assistant API", version="0.0.1", lifespan=lifespan)
+
+if traffic_capture_writer.path:
+    app.add_middleware(TrafficCaptureMiddleware, writer=traffic_capture_writer)
+
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request, exc):
+    return JSONResponse(
+        status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(int(exc.retry_after))}
+    )
+
 
 app.include_router(chat_with_history_router)
-app.include_router(transcribe_router)
\ No newline at end of file
+app.include_router(transcribe_router)
+app.include_router(cache_stats_router)
+app.include_router(sessions_router)
+app.include_router(voice_chat_router)
+app.include_router(images_router)
+app.include_router(health_router)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    embedding_stats = embedding_cache.stats()
+    semantic_stats = semantic_cache.stats()
+    telemetry_stats = telemetry_writer.stats()
+    limiters = {limiter.name: limiter.stats() for limiter in (chat_limiter, embedding_limiter, summary_limiter)}
+    retrieval = client_registry.retrieval_stats()
+    router_stats = rag_router.stats()
+    return render_prometheus({
+        "rag_cache_hit_ratio": ("Hit ratio of each cache since start.", {
+            'cache="embedding"': embedding_stats["hit_ratio"],
+            'cache="semantic"': semantic_stats["hit_ratio"],
+        }),
+        "rag_cache_entries": ("Entries currently held in memory by each cache.", {
+            'cache="embedding"': embedding_stats["memory_entries"],
+            'cache="semantic"': semantic_stats["entries"],
+        }),
+        "telemetry_dropped_records": ("Telemetry records dropped because the queue was full.", {
+            "": telemetry_stats["dropped"],
+        }),
+        "upstream_concurrency_limit": ("Current adaptive concurrency limit per upstream.", {
+            f'upstream="{name}"': stats["limit"] for name, stats in limiters.items()
+        }),
+        "upstream_in_flight": ("Upstream calls currently admitted.", {
+            f'upstream="{name}"': stats["in_flight"] for name, stats in limiters.items()
+        }),
+        "upstream_queued": ("Upstream calls waiting for a slot.", {
+            f'upstream="{name}"': stats["queued"] for name, stats in limiters.items()
+        }),
+        "upstream_tokens_available": ("Tokens left in the per-minute budget.", {
+            f'upstream="{name}"': stats["tokens_available"] for name, stats in limiters.items()
+        }),
+        "upstream_rejected": ("Calls rejected because they could not meet their deadline.", {
+            f'upstream="{name}"': stats["rejected"] for name, stats in limiters.items()
+        }),
+        "upstream_rate_limited": ("Calls that hit an upstream 429.", {
+            f'upstream="{name}"': stats["rate_limited"] for name, stats in limiters.items()
+        }),
+        "retrieval_circuit_open": ("1 while the retrieval circuit breaker is not closed.", {
+            f'index="{name}"': int(stats["circuit_state"] != "closed") for name, stats in retrieval.items()
+        }),
+        "retrieval_hedge_delay_seconds": ("Delay before a hedged second retrieval query is sent.", {
+            f'index="{name}"': stats["hedge_delay_seconds"] for name, stats in retrieval.items()
+        }),
+        "retrieval_hedged_queries": ("Retrieval queries that sent a hedged second request.", {
+            f'index="{name}"': stats["hedged"] for name, stats in retrieval.items()
+        }),
+        "retrieval_fallbacks": ("Retrieval queries served by the local fallback index.", {
+            f'index="{name}"': stats["fallbacks"] for name, stats in retrieval.items()
+        }),
+        "rag_router_decisions": ("Chat turns routed with or without retrieval.", {
+            'route="retrieve"': router_stats["retrieved"],
+            'route="skip"': router_stats["skipped"],
+        }),
+    })
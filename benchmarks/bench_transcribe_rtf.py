@@ -0,0 +1,48 @@
+import argparse
+import io
+import time
+
+import soundfile as sf
+
+from benchmarks.fixtures import synthetic_wav
+from features.transcription.audio_processing import TARGET_SAMPLE_RATE
+from features.transcription.transcription import load_model, transcribe_wav
+
+
+def real_time_factor(audio_bytes, model, repeats, **kwargs):
+    duration = sf.info(io.BytesIO(audio_bytes)).duration
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        transcribe_wav(audio_bytes, model, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings) / duration
+
+
+def main(args):
+    if args.wav:
+        with open(args.wav, "rb") as file:
+            audio_bytes = file.read()
+    else:
+        audio_bytes = synthetic_wav(args.seconds, args.sample_rate)
+    info = sf.info(io.BytesIO(audio_bytes))
+    print(f"audio: {info.duration:.1f} s, {info.samplerate} Hz, {info.channels} channel(s)")
+
+    model = load_model()
+    variants = [
+        ("native rate", {"target_rate": None, "trim_silence": False}),
+        (f"resampled to {TARGET_SAMPLE_RATE} Hz", {"target_rate": TARGET_SAMPLE_RATE, "trim_silence": False}),
+        ("resampled + trimmed", {"target_rate": TARGET_SAMPLE_RATE, "trim_silence": True}),
+    ]
+    for name, kwargs in variants:
+        rtf = real_time_factor(audio_bytes, model, args.repeats, **kwargs)
+        print(f"{name:<28} RTF={rtf:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Real-time factor of transcribe_wav before/after resampling")
+    parser.add_argument("--wav", help="WAV file to transcribe (defaults to a synthetic clip)")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--sample-rate", type=int, default=48000)
+    parser.add_argument("--repeats", type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,106 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+import joblib
+from sklearn.model_selection import StratifiedKFold
+
+from features.rag_generation.rag_router import RAG_ROUTER_FAQ_SOURCE, build_model, seed_dataset, train_model
+
+
+def out_of_fold_probabilities(texts, labels, folds, seed):
+    probabilities = [0.0] * len(texts)
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+    for train_rows, test_rows in splitter.split(texts, labels):
+        model = build_model().fit([texts[i] for i in train_rows], [labels[i] for i in train_rows])
+        for row, probability in zip(test_rows, model.predict_proba([texts[i] for i in test_rows])[:, 1]):
+            probabilities[row] = float(probability)
+    return probabilities
+
+
+def inference_ms(model, texts, repeats=200):
+    # One decision per request, so time single predictions rather than a batch.
+    start = time.perf_counter()
+    for i in range(repeats):
+        model.predict_proba([texts[i % len(texts)]])
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def retrieval_cost_ms(args):
+    if args.results:
+        scenarios = json.loads(Path(args.results).read_text(encoding="utf-8"))["scenarios"]
+        return scenarios["embedding"]["p50_ms"] + scenarios["retrieval"]["p50_ms"]
+    return args.embedding_ms + args.retrieval_ms
+
+
+def evaluate(labels, probabilities, threshold, saved_ms, router_ms):
+    retrieve = [probability >= threshold for probability in probabilities]
+    total = len(labels)
+    positives = sum(labels)
+    correct = sum(int(decision) == label for decision, label in zip(retrieve, labels))
+    false_skips = sum(label and not decision for decision, label in zip(retrieve, labels))
+    skips = retrieve.count(False)
+    skip_ratio = skips / total
+    return {
+        "threshold": threshold,
+        "accuracy": correct / total,
+        "retrieve_recall": (positives - false_skips) / positives if positives else 1.0,
+        "false_skip_ratio": false_skips / positives if positives else 0.0,
+        "skip_ratio": skip_ratio,
+        # Expected saving per turn: skipped round trips minus the classifier run on every turn.
+        "saved_ms_per_turn": skip_ratio * saved_ms - router_ms,
+    }
+
+
+def main(args):
+    texts, labels = seed_dataset(args.faq, args.labelled)
+    print(f"{len(texts)} examples: {sum(labels)} retrieve, {len(labels) - sum(labels)} skip")
+    probabilities = out_of_fold_probabilities(texts, labels, args.folds, args.seed)
+    model = train_model(texts, labels)
+    router_ms = inference_ms(model, texts)
+    saved_ms = retrieval_cost_ms(args)
+    print(f"Router inference {router_ms:.3f} ms/turn, embedding + retrieval {saved_ms:.1f} ms/turn")
+
+    rows = [evaluate(labels, probabilities, threshold, saved_ms, router_ms) for threshold in args.thresholds]
+    for row in rows:
+        print(
+            f"threshold={row['threshold']:.2f}  accuracy={row['accuracy']:6.1%}  "
+            f"retrieve_recall={row['retrieve_recall']:6.1%}  false_skips={row['false_skip_ratio']:6.1%}  "
+            f"skipped={row['skip_ratio']:6.1%}  saved={row['saved_ms_per_turn']:7.1f} ms/turn"
+        )
+    errors = [(text, label, probability) for text, label, probability in zip(texts, labels, probabilities)
+              if (probability >= args.thresholds[0]) != bool(label)]
+    if errors:
+        print(f"Misrouted at threshold {args.thresholds[0]:.2f}:")
+        for text, label, probability in errors:
+            print(f"  {'retrieve' if label else 'skip':<8} p={probability:.2f}  {text}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "examples": len(texts),
+            "router_ms": router_ms,
+            "retrieval_cost_ms": saved_ms,
+            "thresholds": rows,
+        }, indent=2), encoding="utf-8")
+        print(f"Results written to {args.output}")
+    if args.save:
+        Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump(model, args.save)
+        print(f"Model written to {args.save} (serve it with RAG_ROUTER_MODEL_PATH)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline evaluation of the RAG router: accuracy against latency saved")
+    parser.add_argument("--faq", default=RAG_ROUTER_FAQ_SOURCE, help="FAQ whose questions are retrieve examples")
+    parser.add_argument("--labelled", default="",
+                        help='Extra JSONL examples, one {"text": ..., "retrieve": true|false} per line')
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.45, 0.55, 0.7])
+    parser.add_argument("--results", help="run_suite.py results file to take embedding and retrieval p50 from")
+    parser.add_argument("--embedding-ms", type=float, default=150.0)
+    parser.add_argument("--retrieval-ms", type=float, default=80.0)
+    parser.add_argument("--output", help="Write the evaluation as JSON")
+    parser.add_argument("--save", help="Train on every example and write the model with joblib")
+    main(parser.parse_args())
@@ -0,0 +1,132 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+EMBEDDING_DIMENSION = 1536
+
+latency = {
+    "embedding": float(os.getenv("FAKE_OPENAI_EMBEDDING_LATENCY", "0.05")),
+    "chat": float(os.getenv("FAKE_OPENAI_CHAT_LATENCY", "0.5")),
+    "token": float(os.getenv("FAKE_OPENAI_TOKEN_INTERVAL", "0.01")),
+}
+answer_words = int(os.getenv("FAKE_OPENAI_ANSWER_WORDS", "60"))
+
+app = FastAPI(title="Fake OpenAI API")
+
+
+def configure(embedding_latency=None, chat_latency=None, token_interval=None, words=None):
+    global answer_words
+    if embedding_latency is not None:
+        latency["embedding"] = embedding_latency
+    if chat_latency is not None:
+        latency["chat"] = chat_latency
+    if token_interval is not None:
+        latency["token"] = token_interval
+    if words is not None:
+        answer_words = words
+
+
+def fake_embedding(text, dimension=EMBEDDING_DIMENSION):
+    # Deterministic unit vector per text, so the same question always lands on the same neighbours.
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def fake_answer():
+    return " ".join(["Respuesta"] + ["simulada"] * (answer_words - 1))
+
+
+@app.post("/v1/embeddings")
+async def create_embedding(request: Request):
+    body = await request.json()
+    texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    await asyncio.sleep(latency["embedding"])
+    tokens = sum(len(text.split()) for text in texts)
+    return {
+        "object": "list",
+        "data": [
+            {"object": "embedding", "index": i, "embedding": fake_embedding(text)} for i, text in enumerate(texts)
+        ],
+        "model": body.get("model", "text-embedding-3-small"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+def completion_chunk(completion_id, model, content=None, finish_reason=None):
+    delta = {"content": content} if content is not None else {}
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+async def stream_completion(completion_id, model):
+    words = fake_answer().split(" ")
+    for i, word in enumerate(words):
+        if i:
+            await asyncio.sleep(latency["token"])
+        yield f"data: {json.dumps(completion_chunk(completion_id, model, word if i == 0 else ' ' + word))}\n\n"
+    yield f"data: {json.dumps(completion_chunk(completion_id, model, finish_reason='stop'))}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def create_chat_completion(request: Request):
+    body = await request.json()
+    model = body.get("model", "gpt-4o")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    # Time to first token; streamed answers then pay the per-token interval on top.
+    await asyncio.sleep(latency["chat"])
+    if body.get("stream"):
+        return StreamingResponse(stream_completion(completion_id, model), media_type="text/event-stream")
+
+    await asyncio.sleep(latency["token"] * (answer_words - 1))
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": fake_answer()}, "finish_reason": "stop"}
+        ],
+        "usage": {"prompt_tokens": 0, "completion_tokens": answer_words, "total_tokens": answer_words},
+    }
+
+
+def start_in_thread(host="127.0.0.1", port=8765):
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="fake-openai", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"Fake OpenAI server failed to start on {host}:{port}")
+        time.sleep(0.05)
+    return server, thread
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible server with simulated latency (point OPENAI_BASE_URL at /v1)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--embedding-latency", type=float)
+    parser.add_argument("--chat-latency", type=float, help="Seconds until the first token")
+    parser.add_argument("--token-interval", type=float)
+    parser.add_argument("--answer-words", type=int)
+    args = parser.parse_args()
+    configure(args.embedding_latency, args.chat_latency, args.token_interval, args.answer_words)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
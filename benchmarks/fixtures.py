@@ -0,0 +1,62 @@
+import io
+import json
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+from benchmarks.fake_openai_server import fake_embedding
+
+
+FIXTURE_QUESTIONS = [
+    "¿Qué es una lista en Python?",
+    "¿Cómo se define una función?",
+    "¿Qué diferencia hay entre una tupla y una lista?",
+    "¿Cómo leo un fichero de texto?",
+    "¿Qué es un diccionario?",
+    "¿Cómo capturo una excepción?",
+    "¿Para qué sirve un entorno virtual?",
+    "¿Qué es una list comprehension?",
+]
+
+
+def synthetic_wav(seconds, sample_rate, channels=2):
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    # Voiced-like bursts separated by silence, with leading and trailing silence.
+    envelope = ((t > 0.5) & (t < seconds - 0.5)) * (np.sin(2 * np.pi * 0.5 * t) > 0)
+    signal = envelope * (0.3 * np.sin(2 * np.pi * 180 * t) + 0.1 * np.sin(2 * np.pi * 720 * t))
+    signal = signal + 0.002 * rng.standard_normal(len(t))
+    buffer = io.BytesIO()
+    sf.write(buffer, np.repeat(signal[:, None], channels, axis=1), sample_rate, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
+
+
+def wav_fixtures():
+    """Clips covering the formats the frontend and clients send: mic rate, telephony rate and CD rate."""
+    return {
+        "5s_16k_mono": synthetic_wav(5.0, 16000, channels=1),
+        "10s_44k_stereo": synthetic_wav(10.0, 44100),
+        "10s_48k_stereo": synthetic_wav(10.0, 48000),
+    }
+
+
+def synthetic_faq_records(count):
+    records = []
+    for i in range(count):
+        pregunta = FIXTURE_QUESTIONS[i] if i < len(FIXTURE_QUESTIONS) else f"Pregunta sintética número {i}"
+        records.append({
+            "id": f"faq-{i}",
+            "values": fake_embedding(pregunta),
+            "metadata": {"pregunta": pregunta, "respuesta": f"Respuesta sintética para la pregunta {i}."},
+        })
+    return records
+
+
+def write_faq_fixture(path, count):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        for record in synthetic_faq_records(count):
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return path
@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "embeddings.sqlite3"))
+
+import anyio.to_thread
+
+from features.rag_generation import async_rag_generation, rag_generation
+
+
+SYSTEM_PROMPT = "Eres un experto útil en Python."
+EMBEDDING_DIMENSION = 1536
+
+
+def fake_embedding_response():
+    return SimpleNamespace(data=[SimpleNamespace(embedding=[0.01] * EMBEDDING_DIMENSION)])
+
+
+def fake_chat_response():
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="Respuesta simulada"))], usage=None
+    )
+
+
+class FakeIndex:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def query(self, vector, namespace, top_k=3, filter=None, timeout=None):
+        time.sleep(self.latency)
+        return [
+            {"id": f"faq-{i}", "score": 0.9, "metadata": {"pregunta": "¿Qué es Python?", "respuesta": "Un lenguaje."}}
+            for i in range(top_k)
+        ]
+
+
+class FakeOpenAI:
+    def __init__(self, embedding_latency, chat_latency):
+        self.embeddings = SimpleNamespace(create=self._create_embedding)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_chat))
+        self.embedding_latency = embedding_latency
+        self.chat_latency = chat_latency
+
+    def _create_embedding(self, **kwargs):
+        time.sleep(self.embedding_latency)
+        return fake_embedding_response()
+
+    def _create_chat(self, **kwargs):
+        time.sleep(self.chat_latency)
+        return fake_chat_response()
+
+
+class FakeAsyncOpenAI(FakeOpenAI):
+    async def _create_embedding(self, **kwargs):
+        await asyncio.sleep(self.embedding_latency)
+        return fake_embedding_response()
+
+    async def _create_chat(self, **kwargs):
+        await asyncio.sleep(self.chat_latency)
+        return fake_chat_response()
+
+
+def install_fakes(args):
+    index = FakeIndex(args.query_latency)
+    sync_client = FakeOpenAI(args.embedding_latency, args.chat_latency)
+    async_client = FakeAsyncOpenAI(args.embedding_latency, args.chat_latency)
+    rag_generation.start_retrieval_backend = lambda host, index_name: index
+    rag_generation.start_openai_client = lambda: sync_client
+    async_rag_generation.start_retrieval_backend = lambda host, index_name: index
+    async_rag_generation.start_openai_client = lambda: async_client
+
+
+def build_request(i):
+    user_query = f"¿Cómo funciona una lista en Python? #{i}"
+    return user_query, [{"role": "user", "content": user_query}]
+
+
+async def run_sync_request(i):
+    user_query, history = build_request(i)
+    # Same default threadpool (40 tokens) FastAPI uses for sync path operations.
+    await anyio.to_thread.run_sync(
+        rag_generation.generation_main_workflow, user_query, "fake", "fake", history, SYSTEM_PROMPT, False
+    )
+
+
+async def run_async_request(i):
+    user_query, history = build_request(i)
+    await async_rag_generation.generation_main_workflow(
+        user_query, "fake", "fake", history, SYSTEM_PROMPT, use_cache=False
+    )
+
+
+async def run_load(request_fn, total, concurrency, offset):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await request_fn(offset + i)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "throughput_rps": total / elapsed,
+        "p50_s": statistics.median(latencies),
+        "p95_s": latencies[int(0.95 * (len(latencies) - 1))],
+        "elapsed_s": elapsed,
+    }
+
+
+def print_report(name, result):
+    print(
+        f"{name:<6} throughput={result['throughput_rps']:8.1f} req/s  "
+        f"p50={result['p50_s'] * 1000:8.1f} ms  p95={result['p95_s'] * 1000:8.1f} ms  "
+        f"total={result['elapsed_s']:.2f} s"
+    )
+
+
+async def main(args):
+    install_fakes(args)
+    print(
+        f"{args.requests} requests, concurrency {args.concurrency}, upstream latency "
+        f"embedding={args.embedding_latency}s query={args.query_latency}s chat={args.chat_latency}s"
+    )
+    sync_result = await run_load(run_sync_request, args.requests, args.concurrency, 0)
+    print_report("sync", sync_result)
+    async_result = await run_load(run_async_request, args.requests, args.concurrency, args.requests)
+    print_report("async", async_result)
+    print(f"speedup x{async_result['throughput_rps'] / sync_result['throughput_rps']:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare sync vs async RAG pipeline concurrency with simulated upstreams")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--embedding-latency", type=float, default=0.1)
+    parser.add_argument("--query-latency", type=float, default=0.01)
+    parser.add_argument("--chat-latency", type=float, default=1.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import base64
+import io
+import json
+import time
+from collections import Counter, defaultdict
+
+import httpx
+from PIL import Image
+
+from benchmarks.fixtures import synthetic_wav
+from features.monitoring.metrics import quantile
+
+
+def load_records(path, limit=None):
+    records = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                records.append(json.loads(line))
+            if limit and len(records) >= limit:
+                break
+    records.sort(key=lambda record: record["timestamp"])
+    return records
+
+
+def schedule(records, qps=None, time_scale=1.0):
+    """Seconds after replay start at which each record is sent."""
+    if qps:
+        return [i / qps for i in range(len(records))]
+    first = records[0]["timestamp"] if records else 0.0
+    return [(record["timestamp"] - first) / time_scale for record in records]
+
+
+def placeholder_image_url(size=(1024, 768)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 200, 200)).save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def restore_message(message, image_url):
+    # Redacted images are replaced by a placeholder of realistic size, or a marker when images are disabled.
+    content = message["content"]
+    if not isinstance(content, str):
+        content = [
+            part if part.get("type") == "text"
+            else {"type": "image_url", "image_url": {"url": image_url}} if image_url
+            else {"type": "text", "text": "[imagen]"}
+            for part in content
+        ]
+    return {"role": message["role"], "content": content}
+
+
+def restore_chat_body(body, image_url):
+    return {"chat_history": [restore_message(message, image_url) for message in body["chat_history"]]}
+
+
+def build_request(record, audio_bytes, image_url):
+    """Route template (with a {session_id} placeholder for session routes) and request arguments."""
+    path = record["path"]
+    headers = {key: value for key, value in record.get("headers", {}).items() if key == "x-bypass-cache"}
+    upload = {"files": {"file": ("replay.wav", audio_bytes, "audio/wav")}}
+    if path.startswith("/chat_with_history") and record.get("body"):
+        return path, {"json": restore_chat_body(record["body"], image_url), "headers": headers}
+    if path.startswith("/sessions/") and path.endswith("/voice/stream"):
+        return path, {**upload, "headers": headers}
+    if path.startswith("/sessions/") and record.get("body"):
+        return path, {"json": {"message": restore_message(record["body"]["message"], image_url)}, "headers": headers}
+    if path.startswith("/transcribe"):
+        # Captured audio is never stored, so both transcription endpoints are replayed as uploads.
+        return "/transcribe/upload", upload
+    return None, None
+
+
+class ReplaySessions:
+    """Maps each captured (hashed) session to a fresh session on the target, created on first use."""
+
+    def __init__(self, client):
+        self.client = client
+        self._sessions = {}
+
+    async def get(self, key):
+        if key not in self._sessions:
+            self._sessions[key] = asyncio.ensure_future(self._create())
+        return await self._sessions[key]
+
+    async def _create(self):
+        response = await self.client.post("/sessions", json={})
+        response.raise_for_status()
+        return response.json()["session_id"]
+
+
+async def send(client, path, kwargs):
+    start = time.perf_counter()
+    first_byte_at = None
+    async with client.stream("POST", path, **kwargs) as response:
+        async for chunk in response.aiter_bytes():
+            if first_byte_at is None and chunk:
+                first_byte_at = time.perf_counter()
+        status = response.status_code
+    end = time.perf_counter()
+    return status, end - start, (first_byte_at or end) - start
+
+
+async def replay(args):
+    records = load_records(args.log, args.limit)
+    if not records:
+        raise SystemExit(f"No records in {args.log}")
+    offsets = schedule(records, args.qps, args.time_scale)
+    audio_bytes = open(args.wav, "rb").read() if args.wav else synthetic_wav(args.audio_seconds, 16000, channels=1)
+    image_url = None if args.drop_images else placeholder_image_url()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results = defaultdict(lambda: {"latencies": [], "ttfb": [], "lag": [], "statuses": Counter(), "errors": 0})
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.target, timeout=args.timeout, limits=limits) as client:
+        sessions = ReplaySessions(client)
+        start = time.perf_counter()
+
+        async def one(record, offset):
+            path, kwargs = build_request(record, audio_bytes, image_url)
+            if path is None:
+                return
+            await asyncio.sleep(max(0.0, start + offset - time.perf_counter()))
+            async with semaphore:
+                stats = results[path]
+                # How far behind schedule the request left, e.g. because concurrency was saturated.
+                stats["lag"].append(time.perf_counter() - start - offset)
+                try:
+                    target_path = path
+                    if "{session_id}" in path:
+                        target_path = path.replace("{session_id}", await sessions.get(record.get("session")))
+                    status, latency, ttfb = await send(client, target_path, kwargs)
+                except httpx.HTTPError as exc:
+                    stats["errors"] += 1
+                    stats["statuses"][type(exc).__name__] += 1
+                    return
+                stats["statuses"][status] += 1
+                if status >= 400:
+                    stats["errors"] += 1
+                stats["latencies"].append(latency)
+                stats["ttfb"].append(ttfb)
+
+        await asyncio.gather(*(one(record, offset) for record, offset in zip(records, offsets)))
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def report(results, elapsed):
+    summary = {}
+    for path, stats in sorted(results.items()):
+        latencies, ttfb, lag = sorted(stats["latencies"]), sorted(stats["ttfb"]), sorted(stats["lag"])
+        total = len(lag)
+        summary[path] = {
+            "requests": total,
+            "achieved_qps": total / elapsed if elapsed else 0.0,
+            "error_rate": stats["errors"] / total if total else 0.0,
+            "statuses": {str(key): value for key, value in stats["statuses"].items()},
+            **{f"p{int(q * 100)}_ms": quantile(latencies, q) * 1000 for q in (0.5, 0.95, 0.99)},
+            "ttfb_p50_ms": quantile(ttfb, 0.5) * 1000,
+            "ttfb_p95_ms": quantile(ttfb, 0.95) * 1000,
+            "schedule_lag_p95_ms": quantile(lag, 0.95) * 1000,
+        }
+        data = summary[path]
+        print(
+            f"{path:<28} n={total:<6} qps={data['achieved_qps']:6.1f}  errors={data['error_rate']:6.1%}  "
+            f"p50={data['p50_ms']:8.1f} ms  p95={data['p95_ms']:8.1f} ms  p99={data['p99_ms']:8.1f} ms  "
+            f"ttfb_p50={data['ttfb_p50_ms']:8.1f} ms  lag_p95={data['schedule_lag_p95_ms']:7.1f} ms"
+        )
+        print(f"{'':<36} statuses={data['statuses']}")
+    return summary
+
+
+def main(args):
+    results, elapsed = asyncio.run(replay(args))
+    print(f"Replayed in {elapsed:.1f} s against {args.target}")
+    summary = report(results, elapsed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"target": args.target, "elapsed_s": elapsed, "endpoints": summary}, file, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay captured traffic (TRAFFIC_CAPTURE_PATH) against a backend")
+    parser.add_argument("log", help="JSONL file written by the traffic capture middleware")
+    parser.add_argument("--target", default="http://localhost:8000")
+    rate = parser.add_mutually_exclusive_group()
+    rate.add_argument("--qps", type=float, help="Send at a fixed rate instead of the recorded arrival times")
+    rate.add_argument("--time-scale", type=float, default=1.0,
+                      help="Speed-up over the recorded arrival times (2.0 replays twice as fast)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Maximum requests in flight")
+    parser.add_argument("--limit", type=int, help="Replay only the first N records")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--wav", help="Audio to upload for transcription requests (defaults to a synthetic clip)")
+    parser.add_argument("--audio-seconds", type=float, default=5.0)
+    parser.add_argument("--drop-images", action="store_true", help="Replace redacted images with a text marker")
+    parser.add_argument("--output", help="Write the summary as JSON")
+    main(parser.parse_args())
@@ -0,0 +1,285 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Everything upstream is local: the OpenAI SDK reads OPENAI_BASE_URL and the registry picks the local index.
+FAKE_OPENAI_PORT = int(os.getenv("BENCH_OPENAI_PORT", "8765"))
+WORK_DIR = tempfile.mkdtemp(prefix="rag-bench-")
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{FAKE_OPENAI_PORT}/v1"
+os.environ["OPENAI_API_KEY"] = "offline-benchmark"
+os.environ["RETRIEVAL_BACKEND"] = "local"
+os.environ["LOCAL_INDEX_DIR"] = os.path.join(WORK_DIR, "local_index")
+os.environ["LOCAL_INDEX_SOURCE"] = os.path.join(WORK_DIR, "faq_pairs.jsonl")
+os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(WORK_DIR, "embeddings.sqlite3")
+
+import soundfile as sf
+
+from benchmarks import fake_openai_server
+from benchmarks.fixtures import wav_fixtures, write_faq_fixture
+from features.monitoring.metrics import quantile, stage_metrics
+from features.rag_generation import async_rag_generation, rag_generation
+from features.rag_generation.client_registry import PINECONE_HOST, PINECONE_INDEX_NAME, client_registry
+from features.transcription.transcription import MODEL_DIR, load_model, transcribe_wav
+
+
+SYSTEM_PROMPT = "Eres un experto útil en Python."
+RESULTS_DIR = Path(__file__).parent / "results"
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "rtf")
+HIGHER_IS_BETTER = ("throughput_rps",)
+
+
+class DelayedBackend:
+    """Adds a fixed network round trip to a retrieval backend, to mimic a remote Pinecone."""
+
+    def __init__(self, backend, latency):
+        self.backend = backend
+        self.latency = latency
+
+    def query(self, vector, namespace, top_k=3, filter=None, timeout=None):
+        time.sleep(self.latency)
+        return self.backend.query(vector, namespace, top_k, filter, timeout=timeout)
+
+
+def install_retrieval_backend(query_latency):
+    backend = client_registry.get_retrieval_backend(PINECONE_HOST, PINECONE_INDEX_NAME)
+    if query_latency > 0:
+        backend = DelayedBackend(backend, query_latency)
+    rag_generation.start_retrieval_backend = lambda host, index_name: backend
+    async_rag_generation.start_retrieval_backend = lambda host, index_name: backend
+    return backend
+
+
+def unique_query(scenario, i):
+    # Unique text per request so every call misses the embedding cache.
+    return f"¿Cómo funciona una lista en Python? [{scenario} {i} {time.time_ns()}]"
+
+
+def summarize(latencies, elapsed, errors):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": quantile(latencies, 0.5) * 1000,
+        "p95_ms": quantile(latencies, 0.95) * 1000,
+        "p99_ms": quantile(latencies, 0.99) * 1000,
+    }
+
+
+def stage_breakdown():
+    return {
+        stage: {
+            "count": data["count"],
+            **{f"p{int(q * 100)}_ms": value * 1000 for q, value in data["quantiles"].items()},
+        }
+        for stage, data in stage_metrics.snapshot().items() if data["count"]
+    }
+
+
+async def run_load(request_fn, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await request_fn(i)
+            except Exception as exc:
+                errors += 1
+                print(f"request {i} failed: {exc}")
+                return
+            latencies.append(time.perf_counter() - start)
+
+    stage_metrics.reset()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    result = summarize(latencies, time.perf_counter() - start, errors)
+    result["stages"] = stage_breakdown()
+    return result
+
+
+async def bench_embedding(i):
+    await async_rag_generation.generate_embedding(unique_query("embedding", i), async_rag_generation.start_openai_client())
+
+
+def make_bench_retrieval(backend, vector):
+    async def bench_retrieval(i):
+        await async_rag_generation.query_index_async(vector, backend)
+    return bench_retrieval
+
+
+async def bench_generation(i):
+    messages = [{"role": "user", "content": unique_query("generation", i)}]
+    await async_rag_generation.chat_openai_with_history(
+        async_rag_generation.start_openai_client(), messages, SYSTEM_PROMPT
+    )
+
+
+async def bench_end_to_end(i):
+    user_query = unique_query("end_to_end", i)
+    await async_rag_generation.generation_main_workflow(
+        user_query, PINECONE_HOST, PINECONE_INDEX_NAME, [{"role": "user", "content": user_query}], SYSTEM_PROMPT,
+        use_cache=False
+    )
+
+
+async def bench_end_to_end_stream(i):
+    user_query = unique_query("end_to_end_stream", i)
+    deltas = async_rag_generation.stream_generation_main_workflow(
+        user_query, PINECONE_HOST, PINECONE_INDEX_NAME, [{"role": "user", "content": user_query}], SYSTEM_PROMPT,
+        use_cache=False
+    )
+    async for _ in deltas:
+        pass
+
+
+def bench_transcription(repeats):
+    if not os.path.isdir(MODEL_DIR):
+        print(f"Skipping transcription: Vosk model not found at {MODEL_DIR}")
+        return None
+    model = load_model()
+    results = {}
+    for name, audio_bytes in wav_fixtures().items():
+        duration = sf.info(io.BytesIO(audio_bytes)).duration
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            transcribe_wav(audio_bytes, model)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        results[name] = {
+            "audio_seconds": duration,
+            "p50_ms": quantile(timings, 0.5) * 1000,
+            "rtf": timings[0] / duration,
+        }
+    return results
+
+
+async def run_scenarios(args):
+    write_faq_fixture(os.environ["LOCAL_INDEX_SOURCE"], args.corpus_size)
+    backend = install_retrieval_backend(args.query_latency)
+    probe_vector = fake_openai_server.fake_embedding("¿Qué es una lista en Python?")
+
+    scenarios = {
+        "embedding": bench_embedding,
+        "retrieval": make_bench_retrieval(backend, probe_vector),
+        "generation": bench_generation,
+        "end_to_end": bench_end_to_end,
+        "end_to_end_stream": bench_end_to_end_stream,
+    }
+    results = {}
+    for name, request_fn in scenarios.items():
+        if args.only and name not in args.only:
+            continue
+        results[name] = await run_load(request_fn, args.requests, args.concurrency)
+        print_scenario(name, results[name])
+    await client_registry.aclose()
+    return results
+
+
+def print_scenario(name, result):
+    print(
+        f"{name:<18} throughput={result['throughput_rps']:8.1f} req/s  p50={result['p50_ms']:8.1f} ms  "
+        f"p95={result['p95_ms']:8.1f} ms  p99={result['p99_ms']:8.1f} ms  errors={result['errors']}"
+    )
+    for stage, data in sorted(result.get("stages", {}).items()):
+        print(f"  {stage:<22} n={data['count']:<6} p50={data['p50_ms']:8.1f} ms  p95={data['p95_ms']:8.1f} ms")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(data, prefix=""):
+    for key, value in data.items():
+        if isinstance(value, dict):
+            yield from flatten(value, f"{prefix}{key}.")
+        else:
+            yield f"{prefix}{key}", value
+
+
+def compare(results, baseline, tolerance):
+    previous = dict(flatten(baseline.get("scenarios", {})))
+    regressions = []
+    for key, value in flatten(results["scenarios"]):
+        metric = key.rsplit(".", 1)[-1]
+        old = previous.get(key)
+        if metric not in LOWER_IS_BETTER + HIGHER_IS_BETTER or not old or value != value:
+            continue
+        change = (value - old) / old
+        if (metric in LOWER_IS_BETTER and change > tolerance) or (metric in HIGHER_IS_BETTER and change < -tolerance):
+            regressions.append(f"{key}: {old:.2f} -> {value:.2f} ({change:+.0%})")
+    return regressions
+
+
+def main(args):
+    fake_openai_server.configure(args.embedding_latency, args.chat_latency, args.token_interval)
+    server, thread = fake_openai_server.start_in_thread(port=FAKE_OPENAI_PORT)
+    try:
+        scenarios = asyncio.run(run_scenarios(args))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    if not args.only or "transcription" in args.only:
+        transcription = bench_transcription(args.transcription_repeats)
+        if transcription is not None:
+            scenarios["transcription"] = transcription
+            for clip, data in transcription.items():
+                print(f"transcription {clip:<16} p50={data['p50_ms']:8.1f} ms  RTF={data['rtf']:.3f}")
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "scenarios": scenarios,
+    }
+    output = Path(args.output or RESULTS_DIR / f"{results['commit'] or 'results'}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions against {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline per-stage and end-to-end benchmark of the RAG and transcription pipelines")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--query-latency", type=float, default=0.01)
+    parser.add_argument("--chat-latency", type=float, default=0.5, help="Seconds until the first token")
+    parser.add_argument("--token-interval", type=float, default=0.005)
+    parser.add_argument("--corpus-size", type=int, default=5000)
+    parser.add_argument("--transcription-repeats", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="Scenarios to run (embedding, retrieval, generation, "
+                                                  "end_to_end, end_to_end_stream, transcription)")
+    parser.add_argument("--output", help="Results file (defaults to benchmarks/results/<commit>.json)")
+    parser.add_argument("--baseline", help="Previous results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative slowdown before failing")
+    sys.exit(main(parser.parse_args()))
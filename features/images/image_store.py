@@ -0,0 +1,156 @@
+import base64
+import hashlib
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from PIL import Image
+
+
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", "cache/images")
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+IMAGE_DATA_URL_CACHE_ENTRIES = 128
+
+# GPT-4o vision tiers: "low" is a single 512px view; "high" fits 2048x2048, then shortest side 768.
+LOW_DETAIL_SIZE = 512
+HIGH_DETAIL_MAX_SIZE = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+
+IMAGE_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+MIME_TYPES = {"PNG": "image/png", "WEBP": "image/webp", "JPEG": "image/jpeg"}
+
+
+class InvalidImage(Exception):
+    pass
+
+
+def vision_tier_size(width, height, detail):
+    if detail == "low":
+        scale = min(1.0, LOW_DETAIL_SIZE / max(width, height))
+    else:
+        scale = min(1.0, HIGH_DETAIL_MAX_SIZE / max(width, height))
+        scale *= min(1.0, HIGH_DETAIL_SHORT_SIDE / (min(width, height) * scale))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def encode_smallest(image):
+    candidates = []
+    for image_format, options in (("PNG", {"optimize": True}), ("WEBP", {"lossless": True, "method": 4})):
+        buffer = io.BytesIO()
+        try:
+            image.save(buffer, format=image_format, **options)
+        except (KeyError, OSError):
+            continue
+        candidates.append((len(buffer.getvalue()), image_format, buffer.getvalue()))
+    _, image_format, data = min(candidates)
+    return image_format, data
+
+
+class ImageStore:
+    def __init__(self, root=IMAGE_STORE_DIR):
+        self.root = Path(root)
+        self._data_urls = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _original_path(self, image_id):
+        if not IMAGE_ID_PATTERN.match(image_id):
+            raise InvalidImage(f"Invalid image id '{image_id}'")
+        return self.root / image_id[:2] / f"{image_id}.orig"
+
+    def _variant_path(self, image_id, detail, image_format):
+        return self.root / image_id[:2] / f"{image_id}.{detail}.{image_format.lower()}"
+
+    def put(self, image_bytes):
+        if len(image_bytes) > IMAGE_MAX_BYTES:
+            raise InvalidImage(f"Image larger than {IMAGE_MAX_BYTES} bytes")
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as image:
+                image.verify()
+            with Image.open(io.BytesIO(image_bytes)) as image:
+                width, height = image.size
+        except Exception as exc:
+            raise InvalidImage(f"Unreadable image: {exc}")
+
+        image_id = hashlib.sha256(image_bytes).hexdigest()
+        path = self._original_path(image_id)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.tmp")
+            tmp_path.write_bytes(image_bytes)
+            os.replace(tmp_path, path)
+        return {"image_id": image_id, "width": width, "height": height, "bytes": len(image_bytes)}
+
+    def get_variant(self, image_id, detail="high"):
+        if not IMAGE_ID_PATTERN.match(image_id):
+            return None
+        for image_format in MIME_TYPES:
+            path = self._variant_path(image_id, detail, image_format)
+            if path.exists():
+                return MIME_TYPES[image_format], path.read_bytes()
+
+        original = self._original_path(image_id)
+        if not original.exists():
+            return None
+        with Image.open(original) as image:
+            image.load()
+            target_size = vision_tier_size(image.width, image.height, detail)
+            if image.mode not in ("RGB", "RGBA", "L", "LA"):
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+            if target_size != image.size:
+                image = image.resize(target_size, Image.LANCZOS)
+            image_format, data = encode_smallest(image)
+
+        path = self._variant_path(image_id, detail, image_format)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        return MIME_TYPES[image_format], data
+
+    def get_data_url(self, image_id, detail="high"):
+        key = (image_id, detail)
+        with self._lock:
+            data_url = self._data_urls.get(key)
+            if data_url is not None:
+                self._data_urls.move_to_end(key)
+                return data_url
+
+        variant = self.get_variant(image_id, detail)
+        if variant is None:
+            return None
+        mime_type, data = variant
+        data_url = f"data:{mime_type};base64," + base64.b64encode(data).decode("utf-8")
+        with self._lock:
+            self._data_urls[key] = data_url
+            while len(self._data_urls) > IMAGE_DATA_URL_CACHE_ENTRIES:
+                self._data_urls.popitem(last=False)
+        return data_url
+
+
+def resolve_image_refs(messages, store, latest_detail="high", history_detail="low"):
+    resolved = []
+    for position, message in enumerate(messages):
+        content = message["content"]
+        if isinstance(content, str) or not any(part.get("type") == "image_ref" for part in content):
+            resolved.append(message)
+            continue
+        is_latest = position == len(messages) - 1
+        parts = []
+        for part in content:
+            if part.get("type") != "image_ref":
+                parts.append(part)
+                continue
+            detail = (part.get("detail") or latest_detail) if is_latest else history_detail
+            detail = "low" if detail == "low" else "high"
+            data_url = store.get_data_url(part.get("image_id", ""), detail)
+            if data_url is None:
+                parts.append({"type": "text", "text": "[imagen no disponible]"})
+            else:
+                parts.append({"type": "image_url", "image_url": {"url": data_url, "detail": detail}})
+        resolved.append({**message, "content": parts})
+    return resolved
+
+
+image_store = ImageStore()
@@ -0,0 +1,150 @@
+import bisect
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+METRICS_WINDOW_SIZE = int(os.getenv("METRICS_WINDOW_SIZE", "2048"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def quantile(sorted_values, q):
+    if not sorted_values:
+        return math.nan
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class Histogram:
+    """Cumulative buckets for Prometheus plus a sliding window of recent samples for p50/p95/p99."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window_size=METRICS_WINDOW_SIZE):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.window = deque(maxlen=window_size)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.window.append(value)
+
+    def quantiles(self):
+        recent = sorted(self.window)
+        return {q: quantile(recent, q) for q in QUANTILES}
+
+
+class StageMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.in_flight = {}
+        self.errors = {}
+
+    def start(self, stage):
+        with self._lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = Histogram()
+            self.in_flight[stage] = self.in_flight.get(stage, 0) + 1
+
+    def finish(self, stage, elapsed, failed=False):
+        with self._lock:
+            self.in_flight[stage] -= 1
+            self.histograms[stage].observe(elapsed)
+            if failed:
+                self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    def observe(self, stage, elapsed):
+        with self._lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = Histogram()
+            self.histograms[stage].observe(elapsed)
+
+    @contextmanager
+    def track(self, stage):
+        self.start(stage)
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.finish(stage, time.perf_counter() - start, failed)
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {stage: Histogram() for stage, count in self.in_flight.items() if count}
+            self.errors = {}
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                stage: {
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "buckets": list(histogram.counts),
+                    "quantiles": histogram.quantiles(),
+                    "in_flight": self.in_flight.get(stage, 0),
+                    "errors": self.errors.get(stage, 0),
+                }
+                for stage, histogram in self.histograms.items()
+            }
+
+
+stage_metrics = StageMetrics()
+
+
+def track_stage(stage):
+    return stage_metrics.track(stage)
+
+
+def _format_value(value):
+    if isinstance(value, float) and math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(gauges=None):
+    """Render stage metrics and extra `{name: (help, {label_value: value})}` gauges in text format."""
+    lines = [
+        "# HELP rag_stage_latency_seconds Latency of each pipeline stage.",
+        "# TYPE rag_stage_latency_seconds histogram",
+    ]
+    snapshot = stage_metrics.snapshot()
+    for stage, data in sorted(snapshot.items()):
+        cumulative = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS + (math.inf,), data["buckets"]):
+            cumulative += bucket_count
+            le = "+Inf" if math.isinf(bound) else repr(bound)
+            lines.append(f'rag_stage_latency_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+        lines.append(f'rag_stage_latency_seconds_sum{{stage="{stage}"}} {data["sum"]!r}')
+        lines.append(f'rag_stage_latency_seconds_count{{stage="{stage}"}} {data["count"]}')
+
+    lines += [
+        "# HELP rag_stage_latency_quantile_seconds Latency quantiles over the most recent samples.",
+        "# TYPE rag_stage_latency_quantile_seconds gauge",
+    ]
+    for stage, data in sorted(snapshot.items()):
+        for q, value in data["quantiles"].items():
+            lines.append(
+                f'rag_stage_latency_quantile_seconds{{stage="{stage}",quantile="{q}"}} {_format_value(value)}'
+            )
+
+    lines += ["# HELP rag_stage_in_flight Calls currently running in each stage.", "# TYPE rag_stage_in_flight gauge"]
+    lines += [f'rag_stage_in_flight{{stage="{stage}"}} {data["in_flight"]}' for stage, data in sorted(snapshot.items())]
+
+    lines += ["# HELP rag_stage_errors_total Calls that raised in each stage.", "# TYPE rag_stage_errors_total counter"]
+    lines += [f'rag_stage_errors_total{{stage="{stage}"}} {data["errors"]}' for stage, data in sorted(snapshot.items())]
+
+    for name, (help_text, values) in (gauges or {}).items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for label, value in values.items():
+            lines.append(f'{name}{{{label}}} {_format_value(value)}' if label else f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
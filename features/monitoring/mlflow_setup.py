@@ -0,0 +1,15 @@
+import mlflow
+import os
+
+MLFLOW_TRACKING_URI = os.getenv("MLFLOW_TRACKING_URI", "http://localhost:8080")
+MLFLOW_EXPERIMENT_NAME = os.getenv("MLFLOW_EXPERIMENT_NAME", "chatbot-fastapi")
+MLFLOW_OPENAI_AUTOLOG = os.getenv("MLFLOW_OPENAI_AUTOLOG", "false").lower() in ("1", "true", "yes")
+
+
+def setup_mlflow():
+    mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
+
+    # Autolog traces every OpenAI call inline, so it is opt-in.
+    if MLFLOW_OPENAI_AUTOLOG:
+        mlflow.set_experiment(MLFLOW_EXPERIMENT_NAME)
+        mlflow.openai.autolog()
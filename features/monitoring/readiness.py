@@ -0,0 +1,58 @@
+import asyncio
+import os
+import time
+
+
+READINESS_REQUIRED = [name.strip() for name in os.getenv("READINESS_REQUIRED", "retrieval").split(",") if name.strip()]
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", "5"))
+
+
+class Readiness:
+    def __init__(self, required=READINESS_REQUIRED, retry_seconds=STARTUP_RETRY_SECONDS):
+        self.required = set(required)
+        self.retry_seconds = retry_seconds
+        self._subsystems = {}
+        self._tasks = []
+
+    async def _initialize(self, name, initializer):
+        state = self._subsystems[name]
+        started = time.perf_counter()
+        while True:
+            state["attempts"] += 1
+            try:
+                await asyncio.to_thread(initializer)
+            except Exception as exc:
+                state.update(status="failed", error=str(exc))
+                print(f"Startup of '{name}' failed (attempt {state['attempts']}), retrying in {self.retry_seconds}s: {exc}")
+                await asyncio.sleep(self.retry_seconds)
+                continue
+            state.update(status="ready", error=None, startup_seconds=time.perf_counter() - started)
+            print(f"'{name}' ready in {state['startup_seconds']:.1f}s")
+            return
+
+    def launch(self, name, initializer):
+        """Run a blocking initializer in a thread, retrying until it succeeds, without delaying startup."""
+        self._subsystems[name] = {"status": "starting", "error": None, "attempts": 0, "startup_seconds": None}
+        task = asyncio.create_task(self._initialize(name, initializer), name=f"startup-{name}")
+        self._tasks.append(task)
+        return task
+
+    def is_ready(self, name):
+        return self._subsystems.get(name, {}).get("status") == "ready"
+
+    def all_ready(self):
+        return all(self.is_ready(name) for name in self.required)
+
+    def snapshot(self):
+        return {
+            name: {**state, "required": name in self.required} for name, state in self._subsystems.items()
+        }
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+readiness = Readiness()
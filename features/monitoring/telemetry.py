@@ -0,0 +1,163 @@
+import os
+import queue
+import random
+import threading
+import time
+
+from mlflow import MlflowClient
+from mlflow.entities import Metric, Param
+
+from features.monitoring.mlflow_setup import MLFLOW_EXPERIMENT_NAME, MLFLOW_TRACKING_URI
+
+
+TELEMETRY_QUEUE_SIZE = int(os.getenv("TELEMETRY_QUEUE_SIZE", "1000"))
+TELEMETRY_BATCH_SIZE = int(os.getenv("TELEMETRY_BATCH_SIZE", "50"))
+TELEMETRY_FLUSH_SECONDS = float(os.getenv("TELEMETRY_FLUSH_SECONDS", "5"))
+TELEMETRY_SAMPLE_RATE = float(os.getenv("TELEMETRY_SAMPLE_RATE", "1.0"))
+MLFLOW_MAX_METRICS_PER_BATCH = 1000
+
+_STOP = object()
+
+
+def numeric_params(params):
+    return {key: value for key, value in params.items() if isinstance(value, (int, float)) and not isinstance(value, bool)}
+
+
+def text_params(params):
+    return {key: value for key, value in params.items() if key not in numeric_params(params)}
+
+
+class TelemetryWriter:
+    def __init__(self, queue_size=TELEMETRY_QUEUE_SIZE, batch_size=TELEMETRY_BATCH_SIZE,
+                 flush_seconds=TELEMETRY_FLUSH_SECONDS, sample_rate=TELEMETRY_SAMPLE_RATE):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._client = None
+        self._experiment_id = None
+        self.logged = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.failed = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def log_run(self, run_name, params=None, metrics=None, tags=None):
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return
+        record = {
+            "run_name": run_name,
+            "params": params or {},
+            "metrics": metrics or {},
+            "tags": tags or {},
+            "timestamp_ms": int(time.time() * 1000),
+        }
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _experiment(self):
+        if self._experiment_id is None:
+            self._client = MlflowClient(tracking_uri=MLFLOW_TRACKING_URI)
+            experiment = self._client.get_experiment_by_name(MLFLOW_EXPERIMENT_NAME)
+            if experiment is None:
+                self._experiment_id = self._client.create_experiment(MLFLOW_EXPERIMENT_NAME)
+            else:
+                self._experiment_id = experiment.experiment_id
+        return self._client, self._experiment_id
+
+    def _log_group(self, client, experiment_id, run_name, params, tags, records):
+        """One MLflow run for every record in a flush that shares run name, tags and text params."""
+        started, ended = records[0]["timestamp_ms"], records[-1]["timestamp_ms"]
+        run = client.create_run(
+            experiment_id, start_time=started, run_name=run_name,
+            tags={key: str(value) for key, value in tags},
+        )
+        # Each request is a step; its numeric params and metrics become step-indexed metrics.
+        metrics = [
+            Metric(key, float(value), record["timestamp_ms"], step)
+            for step, record in enumerate(records)
+            for key, value in {**numeric_params(record["params"]), **record["metrics"]}.items()
+        ]
+        params = [Param(key, str(value)) for key, value in params] + [Param("requests", str(len(records)))]
+        # log_batch accepts at most 1000 metrics per call; a default-sized flush fits in one.
+        for start in range(0, max(len(metrics), 1), MLFLOW_MAX_METRICS_PER_BATCH):
+            client.log_batch(
+                run.info.run_id,
+                metrics=metrics[start:start + MLFLOW_MAX_METRICS_PER_BATCH],
+                params=params if start == 0 else [],
+            )
+        client.set_terminated(run.info.run_id, end_time=ended)
+
+    def _flush(self, batch):
+        groups = {}
+        for record in batch:
+            key = (
+                record["run_name"],
+                tuple(sorted(text_params(record["params"]).items())),
+                tuple(sorted(record["tags"].items())),
+            )
+            groups.setdefault(key, []).append(record)
+        try:
+            client, experiment_id = self._experiment()
+        except Exception as exc:
+            self.failed += len(batch)
+            print(f"Telemetry flush failed, dropping {len(batch)} records: {exc}")
+            return
+        for (run_name, params, tags), records in groups.items():
+            try:
+                self._log_group(client, experiment_id, run_name, params, tags, records)
+                self.logged += len(records)
+            except Exception as exc:
+                self.failed += len(records)
+                print(f"Telemetry flush failed, dropping {len(records)} records: {exc}")
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+            if batch:
+                self._flush(batch)
+
+    def stop(self, timeout=10.0):
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def stats(self):
+        return {
+            "logged": self.logged,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "failed": self.failed,
+            "queued": self._queue.qsize(),
+        }
+
+
+telemetry_writer = TelemetryWriter()
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from pathlib import Path
+
+
+TRAFFIC_CAPTURE_PATH = os.getenv("TRAFFIC_CAPTURE_PATH", "")
+TRAFFIC_CAPTURE_SAMPLE_RATE = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", "1.0"))
+TRAFFIC_CAPTURE_QUEUE_SIZE = int(os.getenv("TRAFFIC_CAPTURE_QUEUE_SIZE", "1000"))
+TRAFFIC_CAPTURE_MAX_BODY_BYTES = int(os.getenv("TRAFFIC_CAPTURE_MAX_BODY_BYTES", str(256 * 1024)))
+TRAFFIC_CAPTURE_MAX_BUFFER_BYTES = int(os.getenv("TRAFFIC_CAPTURE_MAX_BUFFER_BYTES", str(4 * 1024 * 1024)))
+CAPTURED_ROUTES = [
+    (template, re.compile("^" + re.escape(template).replace(r"\{session_id\}", "([^/]+)") + "$"))
+    for template in (
+        "/chat_with_history",
+        "/chat_with_history/stream",
+        "/transcribe",
+        "/transcribe/upload",
+        "/sessions/{session_id}/chat",
+        "/sessions/{session_id}/chat/stream",
+        "/sessions/{session_id}/voice/stream",
+    )
+]
+CAPTURED_HEADERS = {"content-type", "x-bypass-cache"}
+_INLINE_DATA = re.compile(rb"data:[\w/+.-]+;base64,[A-Za-z0-9+/=]+")
+_REDACTED_DATA = "data:redacted;bytes="
+
+_SCRUBBERS = [
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "<email>"),
+    (re.compile(r"https?://\S+"), "<url>"),
+    (re.compile(r"\b(?:sk|pk|pcsk)[-_][A-Za-z0-9_-]{10,}"), "<secret>"),
+    (re.compile(r"(/home/|/Users/|[A-Za-z]:\\Users\\)[^/\\\s]+"), r"\1<user>"),
+    (re.compile(r"\+?\d[\d .-]{7,}\d"), "<number>"),
+]
+_STOP = object()
+
+
+def scrub_text(text):
+    for pattern, replacement in _SCRUBBERS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def match_route(path):
+    """Route template and session id for a captured path, or (None, None) if it is not captured."""
+    for template, pattern in CAPTURED_ROUTES:
+        match = pattern.match(path)
+        if match:
+            return template, match.group(1) if match.groups() else None
+    return None, None
+
+
+def session_key(session_id):
+    # Session ids grant access to the stored history, so only a stable hash is kept to group turns.
+    return hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:16]
+
+
+def redact_inline_data(body):
+    return _INLINE_DATA.sub(lambda match: f"{_REDACTED_DATA}{len(match.group())}".encode("ascii"), body)
+
+
+def redacted_size(url):
+    if url.startswith(_REDACTED_DATA):
+        return int(url[len(_REDACTED_DATA):])
+    return len(url)
+
+
+def anonymize_content(content):
+    if isinstance(content, str):
+        return scrub_text(content)
+    if not isinstance(content, list):
+        return ""
+    parts = []
+    for part in content:
+        if not isinstance(part, dict):
+            continue
+        if part.get("type") == "text":
+            text = part.get("text")
+            parts.append({"type": "text", "text": scrub_text(text) if isinstance(text, str) else ""})
+        else:
+            # Images (inline or by reference) are replaced by their size so replays keep the payload shape.
+            image = part.get("image_url")
+            url = image.get("url") if isinstance(image, dict) else None
+            parts.append({"type": part.get("type"), "redacted_bytes": redacted_size(url) if isinstance(url, str) else 0})
+    return parts
+
+
+def anonymize_message(message):
+    if not isinstance(message, dict):
+        return None
+    return {"role": str(message.get("role")), "content": anonymize_content(message.get("content"))}
+
+
+def prepare_body(path, body, content_type, max_bytes=TRAFFIC_CAPTURE_MAX_BODY_BYTES):
+    if body is None:
+        return None
+    # Base64 images are replaced by their size first, so only bodies that are large without them are dropped.
+    body = redact_inline_data(body)
+    if len(body) > max_bytes:
+        return None
+    return anonymize_body(path, body, content_type)
+
+
+def anonymize_body(path, body, content_type):
+    if body is None or not content_type.startswith("application/json"):
+        return None
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None
+    # Malformed bodies (answered with 422) are captured too, so nothing about their shape is assumed.
+    if not isinstance(payload, dict):
+        return None
+    if path.startswith("/chat_with_history"):
+        history = payload.get("chat_history")
+        if not isinstance(history, list):
+            return None
+        return {"chat_history": [message for message in map(anonymize_message, history) if message is not None]}
+    if path.startswith("/sessions/"):
+        message = anonymize_message(payload.get("message"))
+        return {"message": message} if message is not None else None
+    if path == "/transcribe":
+        return {"recording_path": "<redacted>"}
+    return None
+
+
+class TrafficCaptureWriter:
+    def __init__(self, path=TRAFFIC_CAPTURE_PATH, queue_size=TRAFFIC_CAPTURE_QUEUE_SIZE):
+        self.path = path
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._thread is None and self.path:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+            self._thread.start()
+        return self
+
+    def write(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as file:
+            while True:
+                record = self._queue.get()
+                if record is _STOP:
+                    return
+                # Redacting and anonymizing here keeps regex scans and JSON parsing off the event loop.
+                try:
+                    record["body"] = prepare_body(
+                        record["path"], record["body"], record["headers"].get("content-type", "")
+                    )
+                    file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                except Exception as exc:
+                    # One bad record must not stop the capture for the rest of the process.
+                    self.dropped += 1
+                    print(f"Traffic capture record dropped: {exc!r}")
+                    continue
+                self.written += 1
+                if self._queue.empty():
+                    file.flush()
+
+    def stop(self, timeout=10.0):
+        if self._thread is None:
+            return
+        self._queue.put(_STOP, timeout=timeout)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+
+traffic_capture_writer = TrafficCaptureWriter()
+
+
+class TrafficCaptureMiddleware:
+    """ASGI middleware that records anonymized request bodies and timings for replay."""
+
+    def __init__(self, app, writer=traffic_capture_writer, sample_rate=TRAFFIC_CAPTURE_SAMPLE_RATE):
+        self.app = app
+        self.writer = writer
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        route, session_id = match_route(scope["path"]) if scope["type"] == "http" else (None, None)
+        if route is None or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+
+        headers = {
+            key.decode("latin-1"): value.decode("latin-1")
+            for key, value in scope.get("headers", []) if key.decode("latin-1") in CAPTURED_HEADERS
+        }
+        # Audio uploads are only measured, never buffered.
+        keep_body = headers.get("content-type", "").startswith("application/json")
+        body = bytearray()
+        request_bytes = 0
+        status = None
+        first_byte_at = None
+        started_at = time.time()
+        start = time.perf_counter()
+
+        async def capture_receive():
+            nonlocal request_bytes, keep_body
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                request_bytes += len(chunk)
+                if keep_body and len(body) + len(chunk) > TRAFFIC_CAPTURE_MAX_BUFFER_BYTES:
+                    # Too large to queue raw; the request is still recorded, without its body.
+                    keep_body = False
+                    body.clear()
+                elif keep_body:
+                    body.extend(chunk)
+            return message
+
+        async def capture_send(message):
+            nonlocal status, first_byte_at
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and first_byte_at is None:
+                first_byte_at = time.perf_counter()
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            self.writer.write({
+                "timestamp": started_at,
+                "method": scope["method"],
+                "path": route,
+                "session": session_key(session_id) if session_id else None,
+                "headers": headers,
+                "request_bytes": request_bytes,
+                "body": bytes(body) if keep_body else None,
+                "status": status or 500,
+                "ttfb_ms": (first_byte_at - start) * 1000 if first_byte_at else None,
+                "latency_ms": (time.perf_counter() - start) * 1000,
+            })
@@ -0,0 +1,212 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+
+import openai
+
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+ADMISSION_DEADLINE_SECONDS = float(os.getenv("ADMISSION_DEADLINE_SECONDS", "60"))
+PRIORITY_IMAGE_DELAY_SECONDS = float(os.getenv("PRIORITY_IMAGE_DELAY_SECONDS", "2"))
+AIMD_DECREASE_FACTOR = 0.5
+AIMD_SLOW_DECREASE_FACTOR = 0.9
+LATENCY_EWMA_ALPHA = 0.2
+
+PRIORITY_TEXT = 0
+PRIORITY_IMAGE = 1
+
+_request_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, message, retry_after=1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def set_request_deadline(seconds=ADMISSION_DEADLINE_SECONDS):
+    """Budget for the current request; upstream calls that cannot finish within it are rejected early."""
+    _request_deadline.set(time.monotonic() + seconds)
+
+
+def get_request_deadline():
+    return _request_deadline.get()
+
+
+def message_priority(messages):
+    last = messages[-1]["content"] if messages else ""
+    if isinstance(last, list) and any(part.get("type") == "image_url" for part in last):
+        return PRIORITY_IMAGE
+    return PRIORITY_TEXT
+
+
+def retry_after_seconds(exc, default=1.0):
+    response = getattr(exc, "response", None)
+    try:
+        return float(response.headers.get("retry-after", default))
+    except (AttributeError, TypeError, ValueError):
+        return default
+
+
+class Ticket:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.tokens_used = None
+        self.latency = None
+
+
+class UpstreamLimiter:
+    """AIMD concurrency limit plus a tokens-per-minute bucket for one upstream model."""
+
+    def __init__(self, name, max_concurrency, tokens_per_minute, latency_target, min_concurrency=1):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(max_concurrency)
+        self.latency_target = latency_target
+        self.tokens_per_minute = tokens_per_minute
+        self.tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._latency = latency_target / 2
+        self._waiters = []
+        self._sequence = itertools.count()
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.rate_limited = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.tokens_per_minute, self.tokens + (now - self._refilled_at) * self.tokens_per_minute / 60)
+        self._refilled_at = now
+
+    def _token_wait(self, tokens):
+        self._refill()
+        return max(0.0, (tokens - self.tokens) * 60 / self.tokens_per_minute)
+
+    def _estimated_finish(self, tokens):
+        now = time.monotonic()
+        slots = max(1, int(self.limit))
+        queue_wait = 0.0 if self.in_flight < slots else (len(self._waiters) // slots + 1) * self._latency
+        return now + max(queue_wait, self._token_wait(tokens), self._blocked_until - now) + self._latency
+
+    def _reject(self, reason):
+        self.rejected += 1
+        raise AdmissionRejected(f"{self.name}: {reason}", retry_after=max(1.0, self._latency))
+
+    def _wake(self):
+        while self._waiters and self.in_flight < max(1, int(self.limit)):
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    async def acquire(self, tokens, priority=PRIORITY_TEXT, deadline=None):
+        tokens = min(tokens, self.tokens_per_minute)
+        if deadline is not None and self._estimated_finish(tokens) > deadline:
+            self._reject("cannot finish within the request deadline")
+
+        if self.in_flight < max(1, int(self.limit)) and not self._waiters:
+            self.in_flight += 1
+        else:
+            # Image turns queue as if they had arrived a little later, so text goes first without starving them.
+            future = asyncio.get_running_loop().create_future()
+            ready_at = time.monotonic() + priority * PRIORITY_IMAGE_DELAY_SECONDS
+            heapq.heappush(self._waiters, (ready_at, next(self._sequence), future))
+            self._wake()
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                await asyncio.wait_for(future, timeout)
+            except BaseException as exc:
+                if future.done() and not future.cancelled():
+                    # Granted a slot just as we gave up on it.
+                    self.in_flight -= 1
+                    self._wake()
+                if isinstance(exc, asyncio.TimeoutError):
+                    self._reject("deadline expired while queued")
+                raise
+
+        try:
+            wait = max(self._token_wait(tokens), self._blocked_until - time.monotonic())
+            if deadline is not None and time.monotonic() + wait + self._latency > deadline:
+                self._reject("token budget exhausted for the request deadline")
+            # Reserve before sleeping: the bucket goes into debt, so later waiters also wait for these tokens.
+            self.tokens -= tokens
+            if wait > 0:
+                try:
+                    await asyncio.sleep(wait)
+                except BaseException:
+                    self.tokens += tokens
+                    raise
+        except BaseException:
+            self.in_flight -= 1
+            self._wake()
+            raise
+        self.admitted += 1
+
+    def release(self, ticket, latency, rate_limited=False):
+        self.in_flight -= 1
+        if ticket.tokens_used is not None:
+            self.tokens -= ticket.tokens_used - ticket.tokens
+        if rate_limited:
+            self.rate_limited += 1
+            self.limit = max(self.min_concurrency, self.limit * AIMD_DECREASE_FACTOR)
+            self._wake()
+            return
+        self._latency += LATENCY_EWMA_ALPHA * (latency - self._latency)
+        if latency > self.latency_target:
+            self.limit = max(self.min_concurrency, self.limit * AIMD_SLOW_DECREASE_FACTOR)
+        else:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, tokens, priority=PRIORITY_TEXT):
+        if not ADMISSION_ENABLED:
+            yield Ticket(tokens)
+            return
+        await self.acquire(tokens, priority, get_request_deadline())
+        ticket = Ticket(tokens)
+        start = time.perf_counter()
+        rate_limited = False
+        try:
+            yield ticket
+        except openai.RateLimitError as exc:
+            rate_limited = True
+            self._blocked_until = time.monotonic() + retry_after_seconds(exc)
+            raise
+        finally:
+            self.release(ticket, ticket.latency or time.perf_counter() - start, rate_limited)
+
+    def stats(self):
+        elapsed = time.monotonic() - self._refilled_at
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "tokens_available": min(self.tokens_per_minute, self.tokens + elapsed * self.tokens_per_minute / 60),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "rate_limited": self.rate_limited,
+            "latency_ewma_seconds": self._latency,
+        }
+
+
+def limiter_from_env(name, max_concurrency, tokens_per_minute, latency_target):
+    prefix = name.upper()
+    return UpstreamLimiter(
+        name,
+        max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", str(max_concurrency))),
+        tokens_per_minute=float(os.getenv(f"{prefix}_TOKENS_PER_MINUTE", str(tokens_per_minute))),
+        latency_target=float(os.getenv(f"{prefix}_LATENCY_TARGET_SECONDS", str(latency_target))),
+    )
+
+
+chat_limiter = limiter_from_env("chat", 32, 450000, 20.0)
+embedding_limiter = limiter_from_env("embedding", 64, 1000000, 2.0)
+summary_limiter = limiter_from_env("summary", 16, 200000, 10.0)
@@ -0,0 +1,216 @@
+import asyncio
+import os
+import time
+
+from fastapi.concurrency import run_in_threadpool
+
+from features.rag_generation.admission import chat_limiter, embedding_limiter, get_request_deadline, message_priority
+from features.rag_generation.client_registry import client_registry
+from features.rag_generation.embedding_cache import embedding_cache, embedding_cache_key
+from features.rag_generation.rag_generation import (
+    EMBEDDING_MODEL, build_user_prompt, format_retrieved_qa, query_index, replace_user_prompt,
+    start_retrieval_backend
+)
+from features.rag_generation.history_compaction import count_tokens, history_tokens
+from features.rag_generation.rag_router import rag_router
+from features.rag_generation.semantic_cache import context_key, is_single_turn, semantic_cache
+from features.rag_generation.single_flight import (
+    embedding_flight, generation_flight, generation_key, retrieval_flight, stream_generation_flight, vector_key
+)
+from features.retrieval.backends import RETRIEVAL_NAMESPACE
+from features.retrieval.resilient import RetrievalUnavailable
+from features.monitoring.metrics import stage_metrics, track_stage
+
+
+CHAT_EXPECTED_OUTPUT_TOKENS = int(os.getenv("CHAT_EXPECTED_OUTPUT_TOKENS", "500"))
+
+
+def start_openai_client():
+    return client_registry.get_async_openai_client()
+
+
+async def chat_token_estimate(messages):
+    # Image parts are decoded to size them, which is too slow for the event loop.
+    return await run_in_threadpool(history_tokens, messages) + CHAT_EXPECTED_OUTPUT_TOKENS
+
+
+async def generate_embedding(user_query, openai_client):
+    embedding = embedding_cache.get_memory(user_query, EMBEDDING_MODEL)
+    if embedding is not None:
+        return embedding
+
+    return await embedding_flight.do(
+        embedding_cache_key(user_query, EMBEDDING_MODEL), lambda: load_or_create_embedding(user_query, openai_client)
+    )
+
+
+async def load_or_create_embedding(user_query, openai_client):
+    # The SQLite tier is read in a worker thread; only a miss there reaches the API.
+    embedding = await run_in_threadpool(embedding_cache.get_disk, user_query, EMBEDDING_MODEL)
+    if embedding is not None:
+        return embedding
+    return await create_embedding(user_query, openai_client)
+
+
+async def create_embedding(user_query, openai_client):
+    async with embedding_limiter.slot(count_tokens(user_query)):
+        with track_stage("embedding"):
+            response = await openai_client.embeddings.create(
+                input=user_query,
+                model=EMBEDDING_MODEL
+            )
+    embedding = response.data[0].embedding
+    embedding_cache.put_nowait(user_query, EMBEDDING_MODEL, embedding)
+    return embedding
+
+
+def remaining_request_seconds():
+    # Read here, on the event loop: executor threads do not inherit the request's contextvars.
+    deadline = get_request_deadline()
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+async def query_index_async(embedding, retrieval_backend):
+    loop = asyncio.get_running_loop()
+    timeout = remaining_request_seconds()
+    return await retrieval_flight.do(
+        (id(retrieval_backend), RETRIEVAL_NAMESPACE, vector_key(embedding)),
+        lambda: loop.run_in_executor(
+            client_registry.get_query_executor(), query_index, embedding, retrieval_backend, timeout
+        )
+    )
+
+
+async def retrieve_matches(user_query, retrieval_backend, openai_client):
+    embedding = await generate_embedding(user_query, openai_client)
+    matches = await query_index_async(embedding, retrieval_backend)
+    await rag_router.record_scores_async(user_query, matches)
+    return embedding, matches
+
+
+async def retrieval_step(user_query, retrieval_backend, openai_client):
+    _, matches = await retrieve_matches(user_query, retrieval_backend, openai_client)
+    return format_retrieved_qa(matches)
+
+
+async def chat_openai_with_history(openai_client, messages, system_content=None):
+    if system_content:
+        messages.insert(0, {"role": "system", "content": system_content})
+
+    tokens = await chat_token_estimate(messages)
+    async with chat_limiter.slot(tokens, message_priority(messages)) as ticket:
+        with track_stage("generation"):
+            response = await openai_client.chat.completions.create(
+                model="gpt-4o",
+                messages=messages
+            )
+        if response.usage is not None:
+            ticket.tokens_used = response.usage.total_tokens
+    return response.choices[0].message.content
+
+
+async def stream_chat_openai_with_history(openai_client, messages, system_content=None):
+    if system_content:
+        messages.insert(0, {"role": "system", "content": system_content})
+
+    tokens = await chat_token_estimate(messages)
+    async with chat_limiter.slot(tokens, message_priority(messages)) as ticket:
+        with track_stage("generation"):
+            start = time.perf_counter()
+            first_token = True
+            stream = await openai_client.chat.completions.create(
+                model="gpt-4o",
+                messages=messages,
+                stream=True
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token:
+                        # Time to first token is the congestion signal; total time depends on answer length.
+                        ticket.latency = time.perf_counter() - start
+                        stage_metrics.observe("generation_first_token", ticket.latency)
+                        first_token = False
+                    yield chunk.choices[0].delta.content
+
+
+async def generation_step(retrieved_qa, user_query, historical_messages, system_prompt, openai_client=None):
+
+    if openai_client is None:
+        openai_client = start_openai_client()
+
+    user_prompt = build_user_prompt(retrieved_qa, user_query)
+    messages = replace_user_prompt(user_prompt, historical_messages)
+    response = await chat_openai_with_history(openai_client, messages, system_content=system_prompt)
+
+    return response
+
+
+async def generation_main_workflow(user_query, host, index_name, historical_messages, system_prompt, use_cache=True):
+    retrieval_backend = start_retrieval_backend(host, index_name)
+    openai_client = start_openai_client()
+    cacheable = use_cache and is_single_turn(historical_messages)
+
+    try:
+        embedding, matches = await retrieve_matches(user_query, retrieval_backend, openai_client)
+    except RetrievalUnavailable as exc:
+        print(f"---- Retrieval unavailable, answering without RAG: {exc} ----")
+        return await chat_openai_with_history(openai_client, historical_messages, system_prompt)
+    if cacheable:
+        cached_response = semantic_cache.lookup(embedding, context_key(matches))
+        if cached_response is not None:
+            print("---- Semantic cache hit ----")
+            return cached_response
+
+    # Identical concurrent questions share one generation; the key is taken before the prompt rewrite.
+    return await generation_flight.do(
+        generation_key(user_query, context_key(matches), historical_messages, system_prompt),
+        lambda: answer(user_query, historical_messages, system_prompt, openai_client, embedding, matches, cacheable)
+    )
+
+
+async def answer(user_query, historical_messages, system_prompt, openai_client, embedding, matches, cacheable):
+    retrieved_qa = format_retrieved_qa(matches)
+    response = await generation_step(retrieved_qa, user_query, historical_messages, system_prompt, openai_client)
+    if cacheable:
+        semantic_cache.store(embedding, context_key(matches), response)
+    return response
+
+
+async def stream_generation_main_workflow(user_query, host, index_name, historical_messages, system_prompt,
+                                          use_cache=True):
+    retrieval_backend = start_retrieval_backend(host, index_name)
+    openai_client = start_openai_client()
+    cacheable = use_cache and is_single_turn(historical_messages)
+
+    try:
+        embedding, matches = await retrieve_matches(user_query, retrieval_backend, openai_client)
+    except RetrievalUnavailable as exc:
+        print(f"---- Retrieval unavailable, answering without RAG (stream): {exc} ----")
+        async for delta in stream_chat_openai_with_history(openai_client, historical_messages, system_prompt):
+            yield delta
+        return
+    if cacheable:
+        cached_response = semantic_cache.lookup(embedding, context_key(matches))
+        if cached_response is not None:
+            print("---- Semantic cache hit ----")
+            yield cached_response
+            return
+
+    key = generation_key(user_query, context_key(matches), historical_messages, system_prompt)
+    deltas = stream_generation_flight.subscribe(key, lambda: stream_answer(
+        user_query, historical_messages, system_prompt, openai_client, embedding, matches, cacheable
+    ))
+    async for delta in deltas:
+        yield delta
+
+
+async def stream_answer(user_query, historical_messages, system_prompt, openai_client, embedding, matches, cacheable):
+    retrieved_qa = format_retrieved_qa(matches)
+    user_prompt = build_user_prompt(retrieved_qa, user_query)
+    messages = replace_user_prompt(user_prompt, historical_messages)
+    chunks = []
+    async for delta in stream_chat_openai_with_history(openai_client, messages, system_content=system_prompt):
+        chunks.append(delta)
+        yield delta
+    if cacheable:
+        semantic_cache.store(embedding, context_key(matches), "".join(chunks))
@@ -0,0 +1,147 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from pinecone.grpc import PineconeGRPC, GRPCClientConfig
+
+from features.retrieval.backends import RETRIEVAL_BACKEND, LocalVectorIndex, PineconeRetrievalBackend
+from features.retrieval.resilient import RETRIEVAL_FALLBACK, ResilientRetrievalBackend
+
+
+PINECONE_HOST = os.getenv("PINECONE_HOST", "http://localhost:5080")
+PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "dense-index")
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "4"))
+PINECONE_QUERY_WORKERS = int(os.getenv("PINECONE_QUERY_WORKERS", "32"))
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+
+def openai_pool_limits():
+    return httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+    )
+
+
+class ClientRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._openai_client = None
+        self._async_openai_client = None
+        self._query_executor = None
+        self._pinecone_clients = {}
+        self._index_hosts = {}
+        self._index_clients = {}
+        self._retrieval_backends = {}
+
+    def get_openai_client(self):
+        if self._openai_client is None:
+            with self._lock:
+                if self._openai_client is None:
+                    http_client = httpx.Client(limits=openai_pool_limits(), timeout=OPENAI_TIMEOUT)
+                    self._openai_client = OpenAI(http_client=http_client)
+        return self._openai_client
+
+    def get_async_openai_client(self):
+        if self._async_openai_client is None:
+            with self._lock:
+                if self._async_openai_client is None:
+                    http_client = httpx.AsyncClient(limits=openai_pool_limits(), timeout=OPENAI_TIMEOUT)
+                    self._async_openai_client = AsyncOpenAI(http_client=http_client)
+        return self._async_openai_client
+
+    def get_query_executor(self):
+        if self._query_executor is None:
+            with self._lock:
+                if self._query_executor is None:
+                    self._query_executor = ThreadPoolExecutor(
+                        max_workers=PINECONE_QUERY_WORKERS, thread_name_prefix="pinecone-query"
+                    )
+        return self._query_executor
+
+    def get_index_host(self, host, index_name):
+        key = (host, index_name)
+        if key not in self._index_hosts:
+            with self._lock:
+                if key not in self._index_hosts:
+                    pc_grpc = self._pinecone_clients.get(host)
+                    if pc_grpc is None:
+                        pc_grpc = PineconeGRPC(api_key="pclocal", host=host)
+                        self._pinecone_clients[host] = pc_grpc
+                    self._index_hosts[key] = pc_grpc.describe_index(name=index_name).host
+        return self._index_hosts[key]
+
+    def get_index_client(self, host=PINECONE_HOST, index_name=PINECONE_INDEX_NAME):
+        key = (host, index_name)
+        if key not in self._index_clients:
+            index_host = self.get_index_host(host, index_name)
+            with self._lock:
+                if key not in self._index_clients:
+                    self._index_clients[key] = self._pinecone_clients[host].Index(
+                        host=index_host,
+                        grpc_config=GRPCClientConfig(secure=False),
+                        pool_threads=PINECONE_POOL_THREADS,
+                    )
+        return self._index_clients[key]
+
+    def get_retrieval_backend(self, host=PINECONE_HOST, index_name=PINECONE_INDEX_NAME):
+        key = ("local",) if RETRIEVAL_BACKEND == "local" else (host, index_name)
+        if key not in self._retrieval_backends:
+            with self._lock:
+                if key not in self._retrieval_backends:
+                    # Built under the lock so concurrent first requests load the index (or start a hedge pool) once.
+                    if RETRIEVAL_BACKEND == "local":
+                        backend = LocalVectorIndex()
+                    else:
+                        backend = ResilientRetrievalBackend(
+                            lambda: PineconeRetrievalBackend(self.get_index_client(host, index_name)),
+                            fallback_factory=LocalVectorIndex if RETRIEVAL_FALLBACK == "local" else None,
+                        )
+                    self._retrieval_backends[key] = backend
+        return self._retrieval_backends[key]
+
+    def retrieval_stats(self):
+        return {
+            RETRIEVAL_BACKEND if len(key) == 1 else key[1]: backend.stats()
+            for key, backend in self._retrieval_backends.items() if isinstance(backend, ResilientRetrievalBackend)
+        }
+
+    def warm_up(self, host=PINECONE_HOST, index_name=PINECONE_INDEX_NAME):
+        self.get_openai_client()
+        self.get_async_openai_client()
+        backend = self.get_retrieval_backend(host, index_name)
+        if isinstance(backend, ResilientRetrievalBackend):
+            backend.warm_up()
+
+    def close(self):
+        with self._lock:
+            if self._query_executor is not None:
+                self._query_executor.shutdown(wait=True)
+            for backend in self._retrieval_backends.values():
+                if isinstance(backend, ResilientRetrievalBackend):
+                    backend.close()
+            for index_client in self._index_clients.values():
+                index_client.close()
+            if self._openai_client is not None:
+                self._openai_client.close()
+            self._index_clients.clear()
+            self._retrieval_backends.clear()
+            self._index_hosts.clear()
+            self._pinecone_clients.clear()
+            self._openai_client = None
+            self._query_executor = None
+
+    async def aclose(self):
+        if self._async_openai_client is not None:
+            await self._async_openai_client.close()
+            self._async_openai_client = None
+        self.close()
+
+
+client_registry = ClientRegistry()
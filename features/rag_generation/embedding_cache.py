@@ -0,0 +1,205 @@
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "cache/embeddings.sqlite3")
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+EMBEDDING_CACHE_WRITE_QUEUE = int(os.getenv("EMBEDDING_CACHE_WRITE_QUEUE", "1000"))
+
+_STOP = object()
+
+
+def normalize_query(text):
+    text = unicodedata.normalize("NFC", text)
+    return " ".join(text.lower().split())
+
+
+def embedding_cache_key(text, model):
+    return hashlib.sha256(f"{model}\x00{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_bytes=EMBEDDING_CACHE_MAX_BYTES,
+                 write_queue_size=EMBEDDING_CACHE_WRITE_QUEUE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        # SQLite has its own lock so the memory tier never waits behind disk I/O.
+        self._db_lock = threading.Lock()
+        self._db = None
+        self._writes = queue.Queue(maxsize=write_queue_size)
+        self._writer = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dropped_writes = 0
+
+    def _connect(self):
+        if self._db is None and self.path:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, embedding BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            db.commit()
+            self._db = db
+        return self._db
+
+    def _remember(self, key, packed):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = packed
+        self._memory_bytes += len(packed)
+        while self._memory_bytes > self.max_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.evictions += 1
+
+    def get_memory(self, text, model):
+        """Memory tier only; cheap enough to call from the event loop."""
+        key = embedding_cache_key(text, model)
+        with self._lock:
+            packed = self._memory.get(key)
+            if packed is None:
+                return None
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+        return array("f", packed).tolist()
+
+    def get_disk(self, text, model):
+        """SQLite tier; blocking, so async callers run it in a worker thread."""
+        key = embedding_cache_key(text, model)
+        row = None
+        with self._db_lock:
+            db = self._connect()
+            if db is not None:
+                try:
+                    row = db.execute("SELECT embedding FROM embeddings WHERE key = ?", (key,)).fetchone()
+                except sqlite3.Error as exc:
+                    print(f"Embedding cache read failed: {exc}")
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            packed = bytes(row[0])
+            self._remember(key, packed)
+            self.disk_hits += 1
+        return array("f", packed).tolist()
+
+    def get(self, text, model):
+        embedding = self.get_memory(text, model)
+        if embedding is not None:
+            return embedding
+        return self.get_disk(text, model)
+
+    def _pack(self, text, model, embedding):
+        key = embedding_cache_key(text, model)
+        packed = array("f", embedding).tobytes()
+        with self._lock:
+            self._remember(key, packed)
+        return key, model, packed, time.time()
+
+    def _write_rows(self, rows):
+        with self._db_lock:
+            db = self._connect()
+            if db is None:
+                return
+            try:
+                db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, embedding, created_at) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                db.commit()
+            except sqlite3.Error as exc:
+                print(f"Embedding cache write failed: {exc}")
+
+    def put(self, text, model, embedding):
+        self._write_rows([self._pack(text, model, embedding)])
+
+    def put_many(self, texts, model, embeddings):
+        self._write_rows([self._pack(text, model, embedding) for text, embedding in zip(texts, embeddings)])
+
+    def put_nowait(self, text, model, embedding):
+        """Stores in memory right away and leaves the SQLite write to the background writer."""
+        row = self._pack(text, model, embedding)
+        if not self.path:
+            return
+        self._start_writer()
+        try:
+            self._writes.put_nowait(row)
+        except queue.Full:
+            # The embedding is still served from memory; it is only missing on disk after a restart.
+            self.dropped_writes += 1
+
+    def _start_writer(self):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._run_writer, name="embedding-cache-writer", daemon=True)
+                    self._writer.start()
+
+    def _run_writer(self):
+        while True:
+            rows = [self._writes.get()]
+            # Whatever queued up meanwhile is committed in the same transaction.
+            while rows[-1] is not _STOP:
+                try:
+                    rows.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            stop = rows[-1] is _STOP
+            if stop:
+                rows.pop()
+            if rows:
+                self._write_rows(rows)
+            if stop:
+                return
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "pending_writes": self._writes.qsize(),
+                "dropped_writes": self.dropped_writes,
+            }
+
+    def close(self, timeout=10.0):
+        if self._writer is not None:
+            try:
+                self._writes.put(_STOP, timeout=timeout)
+            except queue.Full:
+                # The writer is stuck (e.g. on a locked database); shutdown must not wait on it.
+                print(f"Embedding cache writer did not drain, abandoning {self._writes.qsize()} pending writes")
+            else:
+                self._writer.join(timeout=timeout)
+            self._writer = None
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,228 @@
+import base64
+import hashlib
+import io
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image
+
+from features.rag_generation.admission import summary_limiter
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "8000"))
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "3"))
+HISTORY_SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL", "gpt-4o-mini")
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "400"))
+HISTORY_IMAGE_MODE = os.getenv("HISTORY_IMAGE_MODE", "thumbnail")
+HISTORY_THUMBNAIL_SIZE = int(os.getenv("HISTORY_THUMBNAIL_SIZE", "256"))
+HISTORY_CACHE_ENTRIES = 256
+
+MESSAGE_OVERHEAD_TOKENS = 4
+LOW_DETAIL_IMAGE_TOKENS = 85
+UNKNOWN_IMAGE_TOKENS = 765
+
+SUMMARY_PROMPT = """
+    Resume la conversación entre un estudiante y un asistente experto en Python.
+    Conserva las preguntas del estudiante, el código o los errores relevantes y las conclusiones de las respuestas.
+    Si hay un resumen previo, intégralo. Responde solo con el resumen, en español y en pocas frases.
+    """
+
+_encoding = None
+_summaries = OrderedDict()
+_thumbnails = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def load_encoding():
+    """Loads the tiktoken encoding; the first load downloads the BPE file, so it runs at startup, off the loop."""
+    global _encoding
+    if tiktoken is not None and _encoding is None:
+        _encoding = tiktoken.get_encoding("o200k_base")
+    return _encoding
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    # Until the encoding is loaded (or if it never loads, e.g. offline), a heuristic is close enough for budgets.
+    if _encoding is None:
+        return len(text) // 4 + 1
+    try:
+        return len(_encoding.encode(text, disallowed_special=()))
+    except Exception:
+        return len(text) // 4 + 1
+
+
+def _cache_get(cache, key):
+    with _cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _cache_put(cache, key, value):
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > HISTORY_CACHE_ENTRIES:
+            cache.popitem(last=False)
+
+
+def decode_data_url(url):
+    if not url.startswith("data:image"):
+        return None
+    return base64.b64decode(url.split(",", 1)[1])
+
+
+def image_tokens(image_part):
+    image_url = image_part.get("image_url", {})
+    if image_url.get("detail") == "low":
+        return LOW_DETAIL_IMAGE_TOKENS
+    image_bytes = decode_data_url(image_url.get("url", ""))
+    if image_bytes is None:
+        return UNKNOWN_IMAGE_TOKENS
+    width, height = Image.open(io.BytesIO(image_bytes)).size
+    # GPT-4o high detail: fit in 2048x2048, shortest side to 768, then 170 tokens per 512px tile.
+    scale = min(1.0, 2048 / max(width, height))
+    scale *= min(1.0, 768 / (min(width, height) * scale))
+    tiles = math.ceil(width * scale / 512) * math.ceil(height * scale / 512)
+    return LOW_DETAIL_IMAGE_TOKENS + 170 * tiles
+
+
+def message_tokens(message):
+    content = message["content"]
+    if isinstance(content, str):
+        return MESSAGE_OVERHEAD_TOKENS + count_tokens(content)
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    for part in content:
+        if part.get("type") == "text":
+            tokens += count_tokens(part.get("text", ""))
+        elif part.get("type") == "image_url":
+            tokens += image_tokens(part)
+    return tokens
+
+
+def history_tokens(messages):
+    return sum(message_tokens(message) for message in messages)
+
+
+def thumbnail_image_part(image_part):
+    if image_part.get("image_url", {}).get("detail") == "low":
+        return image_part
+    url = image_part.get("image_url", {}).get("url", "")
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    thumbnail_url = _cache_get(_thumbnails, key)
+    if thumbnail_url is None:
+        image_bytes = decode_data_url(url)
+        if image_bytes is None:
+            return {"type": "image_url", "image_url": {"url": url, "detail": "low"}}
+        image = Image.open(io.BytesIO(image_bytes))
+        image.thumbnail((HISTORY_THUMBNAIL_SIZE, HISTORY_THUMBNAIL_SIZE))
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", optimize=True)
+        thumbnail_url = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("utf-8")
+        _cache_put(_thumbnails, key, thumbnail_url)
+    return {"type": "image_url", "image_url": {"url": thumbnail_url, "detail": "low"}}
+
+
+def shrink_old_images(message):
+    content = message["content"]
+    if isinstance(content, str):
+        return message
+    parts = []
+    for part in content:
+        if part.get("type") != "image_url":
+            parts.append(part)
+        elif HISTORY_IMAGE_MODE == "thumbnail":
+            parts.append(thumbnail_image_part(part))
+        else:
+            parts.append({"type": "text", "text": "[imagen omitida]"})
+    return {**message, "content": parts}
+
+
+def message_text(message):
+    content = message["content"]
+    if isinstance(content, str):
+        return content
+    texts = []
+    for part in content:
+        if part.get("type") == "text":
+            texts.append(part.get("text", ""))
+        elif part.get("type") == "image_url":
+            texts.append("[imagen]")
+    return " ".join(texts)
+
+
+def history_key(messages):
+    payload = json.dumps([(m["role"], message_text(m)) for m in messages], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def summarize_messages(openai_client, messages):
+    key = history_key(messages)
+    summary = _cache_get(_summaries, key)
+    if summary is not None:
+        return summary
+
+    # Rolling summary: extend the longest prefix that was already summarized.
+    previous_summary, start = "", 0
+    for prefix_length in range(len(messages) - 1, 0, -1):
+        cached = _cache_get(_summaries, history_key(messages[:prefix_length]))
+        if cached is not None:
+            previous_summary, start = cached, prefix_length
+            break
+
+    transcript = "\n".join(f"{m['role']}: {message_text(m)}" for m in messages[start:])
+    user_content = f"Resumen previo:\n{previous_summary}\n\nNuevos mensajes:\n{transcript}" if previous_summary else transcript
+    async with summary_limiter.slot(count_tokens(user_content) + HISTORY_SUMMARY_MAX_TOKENS):
+        response = await openai_client.chat.completions.create(
+            model=HISTORY_SUMMARY_MODEL,
+            messages=[{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": user_content}],
+            max_tokens=HISTORY_SUMMARY_MAX_TOKENS,
+        )
+    summary = response.choices[0].message.content.strip()
+    _cache_put(_summaries, key, summary)
+    return summary
+
+
+def split_recent(messages, token_budget, keep_messages):
+    # Always keep the current user message; add earlier ones while they fit in the budget.
+    available = token_budget - HISTORY_SUMMARY_MAX_TOKENS
+    recent = [messages[-1]]
+    used = message_tokens(messages[-1])
+    for message in reversed(messages[:-1][-(keep_messages - 1):] if keep_messages > 1 else []):
+        message = shrink_old_images(message)
+        tokens = message_tokens(message)
+        if used + tokens > available:
+            break
+        recent.insert(0, message)
+        used += tokens
+    return messages[:len(messages) - len(recent)], recent
+
+
+async def compact_history(messages, openai_client, token_budget=HISTORY_TOKEN_BUDGET, keep_turns=HISTORY_KEEP_TURNS):
+    if len(messages) <= 1:
+        return messages
+    # Counting decodes inline images and thumbnails re-encode them, so both run off the event loop.
+    if await run_in_threadpool(history_tokens, messages) <= token_budget:
+        return messages
+    older, recent = await run_in_threadpool(split_recent, messages, token_budget, keep_turns * 2 + 1)
+    if not older:
+        return recent
+
+    try:
+        summary = await summarize_messages(openai_client, older)
+    except Exception as exc:
+        print(f"History summary failed, dropping {len(older)} older messages: {exc}")
+        return recent
+    return [{"role": "system", "content": f"Resumen de la conversación anterior:\n{summary}"}] + recent
@@ -0,0 +1,134 @@
+from dotenv import load_dotenv
+from features.rag_generation.client_registry import client_registry
+from features.rag_generation.embedding_cache import embedding_cache
+from features.rag_generation.semantic_cache import context_key, is_single_turn, semantic_cache
+from features.retrieval.backends import RETRIEVAL_NAMESPACE
+from features.retrieval.resilient import RetrievalUnavailable
+from features.monitoring.metrics import track_stage
+
+load_dotenv()
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+def start_pinecone_index_grpc_client(host, index_name):
+    return client_registry.get_index_client(host, index_name)
+
+
+def start_retrieval_backend(host, index_name):
+    return client_registry.get_retrieval_backend(host, index_name)
+
+
+def start_openai_client():
+    return client_registry.get_openai_client()
+
+
+def generate_embedding(user_query, openai_client):
+    embedding = embedding_cache.get(user_query, EMBEDDING_MODEL)
+    if embedding is not None:
+        return embedding
+
+    with track_stage("embedding"):
+        response = openai_client.embeddings.create(
+            input=user_query,
+            model=EMBEDDING_MODEL
+        )
+    embedding = response.data[0].embedding
+    embedding_cache.put(user_query, EMBEDDING_MODEL, embedding)
+    return embedding
+
+
+def query_index(embedding, retrieval_backend, timeout=None):
+    with track_stage("retrieval"):
+        return retrieval_backend.query(vector=embedding, namespace=RETRIEVAL_NAMESPACE, top_k=3, timeout=timeout)
+
+
+def format_retrieved_qa(matches):
+    retrieved_qa = [
+        f"Pregunta: {match['metadata']['pregunta']}\nRespuesta:{match['metadata']['respuesta']}\n\n" 
+        for match in matches
+    ]
+    return retrieved_qa
+
+
+def retrieve_matches(user_query, retrieval_backend, openai_client):
+    embedding = generate_embedding(user_query, openai_client)
+    matches = query_index(embedding, retrieval_backend)
+    return embedding, matches
+
+
+def retrieval_step(user_query, retrieval_backend, openai_client):
+    _, matches = retrieve_matches(user_query, retrieval_backend, openai_client)
+    return format_retrieved_qa(matches)
+
+
+def chat_openai_with_history(openai_client, messages, system_content=None):
+    if system_content:
+        messages.insert(0, {"role": "system", "content": system_content})
+
+    with track_stage("generation"):
+        response = openai_client.chat.completions.create(
+            model="gpt-4o",
+            messages=messages
+        )
+    return response.choices[0].message.content
+
+
+def replace_user_prompt(new_user_prompt, historical_messages):
+    user_content = historical_messages[-1]["content"]
+    if historical_messages[-1]["role"] == "user":
+        if isinstance(user_content, str):
+            historical_messages[-1]["content"] = new_user_prompt
+        elif isinstance(user_content, list):
+            historical_messages[-1]["content"][0]["text"] = new_user_prompt
+    else:
+        raise ValueError("Last message in history must be from the user")
+    return historical_messages
+
+
+def build_user_prompt(retrieved_qa, user_query):
+    user_prompt = f"""
+        Contexto:
+        <<<{retrieved_qa}>>>
+
+        Pregunta:
+        <<<{user_query}>>>
+
+        Respuesta:"""
+    return user_prompt
+
+
+def generation_step(retrieved_qa, user_query, historical_messages, system_prompt, openai_client=None):
+
+    if openai_client is None:
+        openai_client = start_openai_client()
+
+    user_prompt = build_user_prompt(retrieved_qa, user_query)
+    messages = replace_user_prompt(user_prompt, historical_messages)
+    response = chat_openai_with_history(openai_client, messages, system_content=system_prompt)
+
+    return response
+
+
+def generation_main_workflow(user_query, host, index_name, historical_messages, system_prompt, use_cache=True):
+    retrieval_backend = start_retrieval_backend(host, index_name)
+    openai_client = start_openai_client()
+    cacheable = use_cache and is_single_turn(historical_messages)
+
+    try:
+        embedding, matches = retrieve_matches(user_query, retrieval_backend, openai_client)
+    except RetrievalUnavailable as exc:
+        print(f"---- Retrieval unavailable, answering without RAG: {exc} ----")
+        return chat_openai_with_history(openai_client, historical_messages, system_prompt)
+    if cacheable:
+        cached_response = semantic_cache.lookup(embedding, context_key(matches))
+        if cached_response is not None:
+            print("---- Semantic cache hit ----")
+            return cached_response
+
+    retrieved_qa = format_retrieved_qa(matches)
+    response = generation_step(retrieved_qa, user_query, historical_messages, system_prompt, openai_client)
+    if cacheable:
+        semantic_cache.store(embedding, context_key(matches), response)
+    return response
+
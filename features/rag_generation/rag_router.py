@@ -0,0 +1,258 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import joblib
+from fastapi.concurrency import run_in_threadpool
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+
+from features.rag_generation.embedding_cache import normalize_query
+from features.retrieval.backends import RETRIEVAL_NAMESPACE, resolve_namespace
+from features.retrieval.corpus_store import iter_records
+
+
+RAG_ROUTER_ENABLED = os.getenv("RAG_ROUTER_ENABLED", "false").lower() in ("1", "true", "yes")
+RAG_ROUTER_THRESHOLD = float(os.getenv("RAG_ROUTER_THRESHOLD", "0.45"))
+RAG_ROUTER_FOLLOWUP_THRESHOLD = float(os.getenv("RAG_ROUTER_FOLLOWUP_THRESHOLD", "0.55"))
+RAG_ROUTER_IMAGE_THRESHOLD = float(os.getenv("RAG_ROUTER_IMAGE_THRESHOLD", "0.7"))
+RAG_ROUTER_MIN_SCORE = float(os.getenv("RAG_ROUTER_MIN_SCORE", "0.3"))
+RAG_ROUTER_SCORE_TTL_SECONDS = float(os.getenv("RAG_ROUTER_SCORE_TTL_SECONDS", "3600"))
+RAG_ROUTER_MODEL_PATH = os.getenv("RAG_ROUTER_MODEL_PATH", "cache/rag_router.joblib")
+RAG_ROUTER_TRAINING_PATH = os.getenv("RAG_ROUTER_TRAINING_PATH", "")
+RAG_ROUTER_FAQ_SOURCE = os.getenv("RAG_ROUTER_FAQ_SOURCE", "faq_pairs.json")
+SCORE_MEMORY_ENTRIES = 4096
+
+# Standalone questions where the FAQ context can help, on top of the FAQ questions themselves.
+SEED_RETRIEVE = [
+    "¿Qué es una lista en Python?",
+    "¿Cómo defino una función en Python?",
+    "¿Qué diferencia hay entre una lista y una tupla?",
+    "¿Cómo instalo Python en Windows?",
+    "¿Qué versión de Python debería usar?",
+    "¿Cómo leo un fichero de texto en Python?",
+    "¿Qué es un diccionario en Python?",
+    "¿Cómo capturo una excepción?",
+    "¿Para qué sirve un entorno virtual?",
+    "¿Qué es pip y cómo se usa?",
+    "¿Python es compilado o interpretado?",
+    "¿Cómo funcionan los decoradores?",
+    "¿Qué es el GIL de Python?",
+    "¿Por qué Python usa indentación en lugar de llaves?",
+    "¿Cómo se gestiona la memoria en Python?",
+    "¿Qué es una list comprehension?",
+    "¿Cómo importo un módulo propio?",
+    "¿Qué licencia tiene Python?",
+    "¿Dónde encuentro la documentación oficial de Python?",
+    "¿Cómo convierto un string en un número?",
+    "¿Qué son los generadores en Python?",
+    "¿Cómo ordeno una lista de diccionarios por una clave?",
+    "¿Qué es la programación orientada a objetos en Python?",
+    "¿Cómo se usa la sentencia with?",
+    "¿Qué diferencia hay entre is y ==?",
+    "¿Python sirve para desarrollo web?",
+    "¿Cómo ejecuto un script de Python desde la terminal?",
+    "¿Qué es None en Python?",
+    "que es python",
+    "como instalo python en mac",
+]
+
+# Turns that depend on the conversation, not on the FAQ: greetings, thanks and follow-ups.
+SEED_SKIP = [
+    "hola",
+    "hola, buenos días",
+    "buenas tardes",
+    "gracias",
+    "muchas gracias, me ha servido",
+    "ok",
+    "vale",
+    "perfecto",
+    "genial, entendido",
+    "adiós",
+    "hasta luego",
+    "y eso por qué?",
+    "¿por qué?",
+    "¿y eso?",
+    "no lo entiendo",
+    "no entiendo, explícalo mejor",
+    "explícamelo más despacio",
+    "¿puedes repetirlo?",
+    "dame un ejemplo",
+    "dame otro ejemplo",
+    "¿me pones un ejemplo de eso?",
+    "más corto por favor",
+    "resúmelo",
+    "hazlo más sencillo",
+    "¿y si lo hago al revés?",
+    "¿y con el código anterior?",
+    "¿qué quieres decir con eso?",
+    "sigue",
+    "continúa",
+    "¿algo más?",
+    "corrige el código de arriba",
+    "¿qué falla aquí?",
+    "¿qué hace este código?",
+    "mira la imagen",
+    "¿qué error sale en la captura?",
+    "explica la imagen",
+    "¿está bien lo que he hecho?",
+    "tradúcelo al inglés",
+    "¿quién eres?",
+    "¿qué puedes hacer?",
+]
+
+
+class RouteDecision:
+    def __init__(self, retrieve, reason, probability=None):
+        self.retrieve = retrieve
+        self.reason = reason
+        self.probability = probability
+
+
+def faq_questions(source=RAG_ROUTER_FAQ_SOURCE):
+    if not source or not os.path.exists(source):
+        return []
+    return [record["metadata"]["pregunta"] for record in iter_records(source) if "pregunta" in record.get("metadata", {})]
+
+
+def seed_dataset(faq_source=RAG_ROUTER_FAQ_SOURCE, training_path=RAG_ROUTER_TRAINING_PATH):
+    texts = list(SEED_RETRIEVE) + faq_questions(faq_source) + list(SEED_SKIP)
+    labels = [1] * (len(texts) - len(SEED_SKIP)) + [0] * len(SEED_SKIP)
+    # Optional labelled turns, one {"text": ..., "retrieve": true|false} per line.
+    if training_path and os.path.exists(training_path):
+        with open(training_path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    example = json.loads(line)
+                    texts.append(example["text"])
+                    labels.append(int(bool(example["retrieve"])))
+    return texts, labels
+
+
+def build_model():
+    return make_pipeline(
+        TfidfVectorizer(preprocessor=normalize_query, analyzer="char_wb", ngram_range=(2, 4), sublinear_tf=True),
+        LogisticRegression(C=10.0, class_weight="balanced", max_iter=1000),
+    )
+
+
+def train_model(texts, labels):
+    model = build_model()
+    model.fit(texts, labels)
+    return model
+
+
+def turn_has_image(message):
+    content = message["content"]
+    return isinstance(content, list) and any(part.get("type") in ("image_url", "image_ref") for part in content)
+
+
+def route_threshold(historical_messages):
+    # Turns about an attached image, or short replies inside an ongoing conversation,
+    # usually depend on that context rather than on the FAQ, so they need more confidence.
+    if turn_has_image(historical_messages[-1]):
+        return RAG_ROUTER_IMAGE_THRESHOLD
+    if any(message["role"] == "assistant" for message in historical_messages[:-1]):
+        return RAG_ROUTER_FOLLOWUP_THRESHOLD
+    return RAG_ROUTER_THRESHOLD
+
+
+class RagRouter:
+    """Decides per turn whether embedding + vector search is worth it; defaults to retrieving."""
+
+    def __init__(self, model_path=RAG_ROUTER_MODEL_PATH, enabled=RAG_ROUTER_ENABLED,
+                 score_ttl=RAG_ROUTER_SCORE_TTL_SECONDS):
+        self.model_path = model_path
+        self.enabled = enabled
+        self.score_ttl = score_ttl
+        self.model = None
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+        self.retrieved = 0
+        self.skipped = 0
+
+    def load(self):
+        if not self.enabled:
+            return None
+        if self.model_path and os.path.exists(self.model_path):
+            self.model = joblib.load(self.model_path)
+        else:
+            self.model = train_model(*seed_dataset())
+        return self.model
+
+    def _score_key(self, user_query):
+        # Keyed by the physical namespace, so switching the corpus alias after a re-index forgets old scores.
+        return resolve_namespace(RETRIEVAL_NAMESPACE), normalize_query(user_query)
+
+    def record_scores(self, user_query, matches):
+        if not self.enabled:
+            return
+        top_score = max((match["score"] for match in matches), default=0.0)
+        key = self._score_key(user_query)
+        with self._lock:
+            self._scores[key] = (top_score, time.monotonic())
+            self._scores.move_to_end(key)
+            while len(self._scores) > SCORE_MEMORY_ENTRIES:
+                self._scores.popitem(last=False)
+
+    def previous_score(self, user_query):
+        key = self._score_key(user_query)
+        with self._lock:
+            entry = self._scores.get(key)
+            if entry is None:
+                return None
+            score, recorded_at = entry
+            # Skipped questions never refresh their score, so it expires and the next ask retrieves again.
+            if time.monotonic() - recorded_at > self.score_ttl:
+                del self._scores[key]
+                return None
+            return score
+
+    def _decide(self, user_query, historical_messages):
+        if not self.enabled or self.model is None:
+            return RouteDecision(True, "router disabled or not ready")
+        # Retrieval-score history: this question already came back with nothing relevant.
+        previous_score = self.previous_score(user_query)
+        if previous_score is not None and previous_score < RAG_ROUTER_MIN_SCORE:
+            return RouteDecision(False, f"previous top score {previous_score:.2f}")
+        probability = float(self.model.predict_proba([user_query])[0][1])
+        threshold = route_threshold(historical_messages)
+        return RouteDecision(probability >= threshold, f"p={probability:.2f} threshold={threshold:.2f}", probability)
+
+    def should_retrieve(self, user_query, historical_messages, count=True):
+        try:
+            decision = self._decide(user_query, historical_messages)
+        except Exception as exc:
+            decision = RouteDecision(True, f"router error: {exc}")
+        if not count:
+            return decision
+        if decision.retrieve:
+            self.retrieved += 1
+        else:
+            self.skipped += 1
+        return decision
+
+    async def should_retrieve_async(self, user_query, historical_messages, count=True):
+        # The classifier and the namespace alias stat are blocking, so async callers run them in a thread.
+        if not self.enabled or self.model is None:
+            return self.should_retrieve(user_query, historical_messages, count)
+        return await run_in_threadpool(self.should_retrieve, user_query, historical_messages, count)
+
+    async def record_scores_async(self, user_query, matches):
+        if self.enabled:
+            await run_in_threadpool(self.record_scores, user_query, matches)
+
+    def stats(self):
+        decisions = self.retrieved + self.skipped
+        return {
+            "ready": self.model is not None,
+            "retrieved": self.retrieved,
+            "skipped": self.skipped,
+            "skip_ratio": self.skipped / decisions if decisions else 0.0,
+        }
+
+
+rag_router = RagRouter()
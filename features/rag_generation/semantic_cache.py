@@ -0,0 +1,104 @@
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+
+
+def is_single_turn(historical_messages):
+    if len(historical_messages) != 1:
+        return False
+    content = historical_messages[0]["content"]
+    if isinstance(content, list):
+        return all(part.get("type") == "text" for part in content)
+    return True
+
+
+def context_key(matches):
+    return tuple(sorted(match["id"] for match in matches))
+
+
+class SemanticCache:
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS,
+                 max_entries=SEMANTIC_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._by_context = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        bucket = self._by_context[entry["context"]]
+        bucket.discard(entry_id)
+        if not bucket:
+            del self._by_context[entry["context"]]
+
+    def lookup(self, embedding, context):
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        now = time.monotonic()
+        with self._lock:
+            candidate_ids = list(self._by_context.get(context, ()))
+            for entry_id in candidate_ids:
+                if now - self._entries[entry_id]["created_at"] > self.ttl_seconds:
+                    self._drop(entry_id)
+                    self.evictions += 1
+            candidate_ids = list(self._by_context.get(context, ()))
+            if not candidate_ids:
+                self.misses += 1
+                return None
+
+            vectors = np.stack([self._entries[entry_id]["embedding"] for entry_id in candidate_ids])
+            similarities = vectors @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            best_id = candidate_ids[best]
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id]["answer"]
+
+    def store(self, embedding, context, answer):
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = {
+                "embedding": vector,
+                "context": context,
+                "answer": answer,
+                "created_at": time.monotonic(),
+            }
+            self._by_context.setdefault(context, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+            }
+
+
+semantic_cache = SemanticCache()
@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import json
+import os
+from array import array
+
+from features.rag_generation.embedding_cache import normalize_query
+
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def vector_key(vector):
+    return hashlib.sha256(array("f", vector).tobytes()).hexdigest()
+
+
+def turn_key(message):
+    # Text is normalized; images and any other parts are kept whole, so two screenshots never share a key.
+    content = message["content"]
+    if isinstance(content, str):
+        return normalize_query(content)
+    return [normalize_query(part["text"]) if part.get("type") == "text" else part for part in content]
+
+
+def generation_key(user_query, context, historical_messages, system_prompt):
+    # Everything that shapes the prompt except the raw casing/spacing of the question.
+    payload = json.dumps(
+        [system_prompt, normalize_query(user_query), turn_key(historical_messages[-1]), list(context),
+         historical_messages[:-1]],
+        ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _consume_exception(task):
+    # Keeps asyncio from logging "exception was never retrieved" when every caller has gone away.
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    """Shares one in-flight call between concurrent callers with the same key."""
+
+    def __init__(self, enabled=SINGLE_FLIGHT_ENABLED):
+        self.enabled = enabled
+        self._inflight = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key, factory):
+        if not self.enabled:
+            return await factory()
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            # A task, so one caller being cancelled does not cancel the work the others wait on.
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            task.add_done_callback(_consume_exception)
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        calls = self.leaders + self.coalesced
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": self.coalesced / calls if calls else 0.0,
+            "in_flight": len(self._inflight),
+        }
+
+
+class SharedStream:
+    def __init__(self, source):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Event()
+        self.task = asyncio.create_task(self._pump(source))
+
+    async def _pump(self, source):
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._notify()
+        except Exception as exc:
+            self.error = exc
+        finally:
+            self.done = True
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self):
+        # Late subscribers replay what was already generated, then follow the live stream.
+        position = 0
+        while True:
+            while position < len(self.chunks):
+                yield self.chunks[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class StreamSingleFlight:
+    """Fans one upstream async generator out to every concurrent caller with the same key."""
+
+    def __init__(self, enabled=SINGLE_FLIGHT_ENABLED):
+        self.enabled = enabled
+        self._inflight = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def subscribe(self, key, factory):
+        if not self.enabled:
+            return factory()
+        shared = self._inflight.get(key)
+        if shared is None:
+            self.leaders += 1
+            shared = SharedStream(factory())
+            self._inflight[key] = shared
+            shared.task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return shared.subscribe()
+
+    def stats(self):
+        calls = self.leaders + self.coalesced
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": self.coalesced / calls if calls else 0.0,
+            "in_flight": len(self._inflight),
+        }
+
+
+embedding_flight = SingleFlight()
+retrieval_flight = SingleFlight()
+generation_flight = SingleFlight()
+stream_generation_flight = StreamSingleFlight()
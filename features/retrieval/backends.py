@@ -0,0 +1,214 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from features.retrieval.corpus_store import (
+    corpus_exists, corpus_mtime, iter_records, normalize_rows, read_corpus, write_corpus
+)
+
+
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "pinecone")
+RETRIEVAL_NAMESPACE = os.getenv("RETRIEVAL_NAMESPACE", "example")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "cache/local_index")
+LOCAL_INDEX_SOURCE = os.getenv("LOCAL_INDEX_SOURCE", "faq_pairs.json")
+LOCAL_INDEX_DTYPE = os.getenv("LOCAL_INDEX_DTYPE", "float32")
+NAMESPACE_ALIAS_PATH = os.getenv("NAMESPACE_ALIAS_PATH", "cache/namespace_aliases.json")
+NAMESPACE_ALIAS_REFRESH_SECONDS = 1.0
+
+_aliases = {}
+_aliases_checked_at = 0.0
+_aliases_mtime = None
+
+
+def resolve_namespace(namespace):
+    global _aliases, _aliases_checked_at, _aliases_mtime
+    now = time.monotonic()
+    if now - _aliases_checked_at > NAMESPACE_ALIAS_REFRESH_SECONDS:
+        _aliases_checked_at = now
+        try:
+            mtime = os.path.getmtime(NAMESPACE_ALIAS_PATH)
+        except OSError:
+            mtime = None
+            _aliases = {}
+        if mtime is not None and mtime != _aliases_mtime:
+            with open(NAMESPACE_ALIAS_PATH, encoding="utf-8") as file:
+                _aliases = json.load(file)
+        _aliases_mtime = mtime
+    return _aliases.get(namespace, namespace)
+
+
+def set_namespace_alias(namespace, physical_namespace, path=NAMESPACE_ALIAS_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    aliases = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    previous = aliases.get(namespace)
+    aliases[namespace] = physical_namespace
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(json.dumps(aliases, indent=2), encoding="utf-8")
+    os.replace(tmp_path, path)
+    return previous
+
+
+def _compare(value, operator, operand):
+    if operator == "$eq":
+        return value == operand
+    if operator == "$ne":
+        return value != operand
+    if operator == "$in":
+        return value in operand
+    if operator == "$nin":
+        return value not in operand
+    if operator == "$exists":
+        return (value is not None) == operand
+    if value is None:
+        return False
+    if operator == "$gt":
+        return value > operand
+    if operator == "$gte":
+        return value >= operand
+    if operator == "$lt":
+        return value < operand
+    if operator == "$lte":
+        return value <= operand
+    raise ValueError(f"Unsupported filter operator '{operator}'")
+
+
+def matches_filter(metadata, metadata_filter):
+    if not metadata_filter:
+        return True
+    for key, condition in metadata_filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub_filter) for sub_filter in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub_filter) for sub_filter in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if not all(_compare(value, operator, operand) for operator, operand in condition.items()):
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class PineconeRetrievalBackend:
+    def __init__(self, index_client):
+        self.index_client = index_client
+
+    def query(self, vector, namespace=RETRIEVAL_NAMESPACE, top_k=3, filter=None, timeout=None):
+        # gRPC deadline, so a hung call does not hold its thread forever.
+        combined_results = self.index_client.query(
+            vector=vector,
+            namespace=resolve_namespace(namespace),
+            top_k=top_k,
+            filter=filter,
+            include_values=False,
+            include_metadata=True,
+            show_progress=False,
+            alpha=0.5,
+            timeout=timeout
+        )
+        return [
+            {"id": match["id"], "score": match["score"], "metadata": match["metadata"]}
+            for match in combined_results.matches
+        ]
+
+    def query_batch(self, vectors, namespace=RETRIEVAL_NAMESPACE, top_k=3, filter=None):
+        return [self.query(vector, namespace, top_k, filter) for vector in vectors]
+
+    def close(self):
+        self.index_client.close()
+
+
+class LocalVectorIndex:
+    def __init__(self, index_dir=LOCAL_INDEX_DIR, source_path=LOCAL_INDEX_SOURCE, dtype=LOCAL_INDEX_DTYPE):
+        self.index_dir = index_dir
+        self.source_path = source_path
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        self._filter_rows = {}
+        self.load()
+
+    def _is_stale(self):
+        if not corpus_exists(self.index_dir):
+            return True
+        return bool(self.source_path) and os.path.exists(self.source_path) and (
+            os.path.getmtime(self.source_path) > corpus_mtime(self.index_dir)
+        )
+
+    def build(self):
+        records = [
+            {"namespace": RETRIEVAL_NAMESPACE, **record} for record in iter_records(self.source_path)
+        ]
+        write_corpus(self.index_dir, records, dtype=self.dtype)
+
+    def load(self):
+        with self._lock:
+            if self.source_path and self._is_stale():
+                self.build()
+            self.vectors, self.scales, self.records = read_corpus(self.index_dir)
+            self.namespaces = {}
+            for row, record in enumerate(self.records):
+                start, _ = self.namespaces.get(record["namespace"], (row, row))
+                self.namespaces[record["namespace"]] = (start, row + 1)
+            self._filter_rows = {}
+
+    def _candidate_rows(self, namespace, metadata_filter):
+        if namespace not in self.namespaces:
+            return None
+        start, end = self.namespaces[namespace]
+        if not metadata_filter:
+            return slice(start, end)
+        key = (namespace, json.dumps(metadata_filter, sort_keys=True))
+        rows = self._filter_rows.get(key)
+        if rows is None:
+            rows = np.array([
+                row for row in range(start, end) if matches_filter(self.records[row]["metadata"], metadata_filter)
+            ], dtype=np.int64)
+            self._filter_rows[key] = rows
+        return rows
+
+    def query_batch(self, vectors, namespace=RETRIEVAL_NAMESPACE, top_k=3, filter=None):
+        queries = normalize_rows(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+        rows = self._candidate_rows(namespace, filter)
+        if rows is None:
+            return [[] for _ in queries]
+
+        if isinstance(rows, slice):
+            row_ids = np.arange(rows.start, rows.stop)
+        else:
+            row_ids = rows
+        if len(row_ids) == 0:
+            return [[] for _ in queries]
+
+        candidates = self.vectors[rows]
+        scores = np.asarray(candidates @ queries.T, dtype=np.float32)
+        if self.scales is not None:
+            scores = scores * self.scales[rows][:, None]
+
+        k = min(top_k, len(row_ids))
+        results = []
+        for column in range(scores.shape[1]):
+            column_scores = scores[:, column]
+            top = np.argpartition(-column_scores, k - 1)[:k]
+            top = top[np.argsort(-column_scores[top])]
+            results.append([
+                {
+                    "id": self.records[row_ids[position]]["id"],
+                    "score": float(column_scores[position]),
+                    "metadata": self.records[row_ids[position]]["metadata"],
+                }
+                for position in top
+            ])
+        return results
+
+    def query(self, vector, namespace=RETRIEVAL_NAMESPACE, top_k=3, filter=None, timeout=None):
+        return self.query_batch([vector], namespace, top_k, filter)[0]
+
+    def close(self):
+        pass
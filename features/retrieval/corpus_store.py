@@ -0,0 +1,132 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+READ_CHUNK_SIZE = 1 << 16
+
+VECTORS_FILE = "vectors.npy"
+SCALES_FILE = "scales.npy"
+RECORDS_FILE = "records.jsonl"
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def quantize(matrix, dtype):
+    if dtype == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.round(matrix / scales[:, None]).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    return matrix.astype(dtype), None
+
+
+def write_corpus(out_dir, records, dtype="float32"):
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported dtype '{dtype}', expected one of {SUPPORTED_DTYPES}")
+    records = sorted(records, key=lambda record: record.get("namespace", ""))
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    matrix = normalize_rows(np.asarray([record["values"] for record in records], dtype=np.float32))
+    vectors, scales = quantize(matrix, dtype)
+
+    # Write to temporary names first so readers never see a half-written corpus.
+    np.save(out_dir / f".{VECTORS_FILE}", vectors)
+    if scales is not None:
+        np.save(out_dir / f".{SCALES_FILE}", scales)
+    with open(out_dir / f".{RECORDS_FILE}", "w", encoding="utf-8") as file:
+        for record in records:
+            row = {"id": record["id"], "namespace": record.get("namespace", ""), "metadata": record.get("metadata", {})}
+            file.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    os.replace(out_dir / f".{VECTORS_FILE}", out_dir / VECTORS_FILE)
+    if scales is not None:
+        os.replace(out_dir / f".{SCALES_FILE}", out_dir / SCALES_FILE)
+    elif (out_dir / SCALES_FILE).exists():
+        (out_dir / SCALES_FILE).unlink()
+    os.replace(out_dir / f".{RECORDS_FILE}", out_dir / RECORDS_FILE)
+
+
+def read_corpus(in_dir, mmap=True):
+    in_dir = Path(in_dir)
+    vectors = np.load(in_dir / VECTORS_FILE, mmap_mode="r" if mmap else None)
+    scales = np.load(in_dir / SCALES_FILE) if (in_dir / SCALES_FILE).exists() else None
+    with open(in_dir / RECORDS_FILE, encoding="utf-8") as file:
+        records = [json.loads(line) for line in file if line.strip()]
+    return vectors, scales, records
+
+
+def corpus_exists(in_dir):
+    in_dir = Path(in_dir)
+    return (in_dir / VECTORS_FILE).exists() and (in_dir / RECORDS_FILE).exists()
+
+
+def corpus_mtime(in_dir):
+    return os.path.getmtime(Path(in_dir) / RECORDS_FILE)
+
+
+def iter_json_array(path, chunk_size=READ_CHUNK_SIZE):
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as file:
+        buffer = ""
+        position = 0
+        started = False
+        eof = False
+        while True:
+            if not eof and len(buffer) - position < chunk_size:
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if not started:
+                if position >= len(buffer):
+                    if eof:
+                        return
+                    continue
+                if buffer[position] != "[":
+                    raise ValueError(f"{path} does not contain a JSON array")
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            position = end
+            yield record
+
+
+def iter_records(path):
+    path = Path(path)
+    if path.is_dir():
+        vectors, scales, records = read_corpus(path)
+        for row, record in enumerate(records):
+            values = np.asarray(vectors[row], dtype=np.float32)
+            if scales is not None:
+                values = values * scales[row]
+            yield {**record, "values": values.tolist()}
+    elif path.suffix == ".jsonl":
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        yield from iter_json_array(path)
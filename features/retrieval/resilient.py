@@ -0,0 +1,207 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from features.retrieval.backends import RETRIEVAL_NAMESPACE
+
+
+RETRIEVAL_DEADLINE_SECONDS = float(os.getenv("RETRIEVAL_DEADLINE_SECONDS", "2.0"))
+RETRIEVAL_HEDGE_QUANTILE = float(os.getenv("RETRIEVAL_HEDGE_QUANTILE", "0.95"))
+RETRIEVAL_HEDGE_MIN_SECONDS = float(os.getenv("RETRIEVAL_HEDGE_MIN_SECONDS", "0.05"))
+RETRIEVAL_HEDGE_WORKERS = int(os.getenv("RETRIEVAL_HEDGE_WORKERS", "32"))
+RETRIEVAL_FALLBACK = os.getenv("RETRIEVAL_FALLBACK", "local")
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW_SIZE = 512
+
+
+class RetrievalUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+            # Half open: let a single probe through; everyone else keeps using the fallback.
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_inconclusive(self):
+        # The attempt ran out of the caller's budget, which says nothing about the primary's health.
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class ResilientRetrievalBackend:
+    """Deadline-bounded, hedged queries to a primary backend, with a circuit breaker and a local fallback."""
+
+    def __init__(self, primary_factory, fallback_factory=None, deadline=RETRIEVAL_DEADLINE_SECONDS,
+                 hedge_quantile=RETRIEVAL_HEDGE_QUANTILE, workers=RETRIEVAL_HEDGE_WORKERS):
+        self.primary_factory = primary_factory
+        self.fallback_factory = fallback_factory
+        self.deadline = deadline
+        self.hedge_quantile = hedge_quantile
+        self.breaker = CircuitBreaker()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="retrieval-hedge")
+        self._primary_lock = threading.Lock()
+        self._fallback_lock = threading.Lock()
+        self._primary = None
+        self._fallback = None
+        self._latencies = deque(maxlen=LATENCY_WINDOW_SIZE)
+        self.hedged = 0
+        self.failures = 0
+        self.fallbacks = 0
+
+    def load_primary(self):
+        # Created lazily inside the executor, so a stuck control plane is bounded by the deadline too.
+        if self._primary is None:
+            with self._primary_lock:
+                if self._primary is None:
+                    self._primary = self.primary_factory()
+        return self._primary
+
+    def load_fallback(self):
+        if self._fallback is None and self.fallback_factory is not None:
+            with self._fallback_lock:
+                if self._fallback is None:
+                    self._fallback = self.fallback_factory()
+        return self._fallback
+
+    def warm_up(self, timeout=None):
+        """Loads both backends; ready as soon as the fallback is usable, even if the primary is down or hanging."""
+        fallback = None
+        try:
+            fallback = self.load_fallback()
+        except Exception as exc:
+            print(f"Local fallback index not available: {exc}")
+        primary = self._executor.submit(self.load_primary)
+        if fallback is None:
+            primary.result()
+            return
+        try:
+            primary.result(timeout=self.deadline if timeout is None else timeout)
+        except Exception as exc:
+            # The primary keeps loading (or is retried lazily by queries) while the fallback serves.
+            print(f"Primary retrieval unavailable at startup, serving from the local fallback: {exc!r}")
+
+    def hedge_delay(self):
+        if len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return self.deadline / 4
+        recent = sorted(self._latencies)
+        return max(RETRIEVAL_HEDGE_MIN_SECONDS, recent[int(self.hedge_quantile * (len(recent) - 1))])
+
+    def _primary_query(self, vector, namespace, top_k, filter, deadline):
+        # Each attempt carries the time left as its own timeout, so a hung call frees its thread.
+        timeout = max(0.001, deadline - time.monotonic())
+        return self.load_primary().query(vector, namespace, top_k, filter, timeout=timeout)
+
+    def _hedged_query(self, vector, namespace, top_k, filter, budget):
+        start = time.monotonic()
+        deadline = start + budget
+        pending = {self._executor.submit(self._primary_query, vector, namespace, top_k, filter, deadline)}
+        done, _ = wait(pending, timeout=min(self.hedge_delay(), budget))
+        if not done and time.monotonic() < deadline:
+            # The first attempt is slower than usual: race a second one against it.
+            self.hedged += 1
+            pending.add(self._executor.submit(self._primary_query, vector, namespace, top_k, filter, deadline))
+
+        error = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    self._latencies.append(time.monotonic() - start)
+                    return future.result()
+                error = future.exception()
+        for future in pending:
+            future.cancel()
+        raise error or TimeoutError(f"Retrieval did not finish within {budget:.3f}s")
+
+    def _fallback_query(self, vector, namespace, top_k, filter):
+        self.fallbacks += 1
+        try:
+            fallback = self.load_fallback()
+        except Exception as exc:
+            raise RetrievalUnavailable(f"Local fallback index unavailable: {exc}") from exc
+        if fallback is None:
+            raise RetrievalUnavailable("Primary retrieval unavailable and no fallback configured")
+        return fallback.query(vector, namespace, top_k, filter)
+
+    def query(self, vector, namespace=RETRIEVAL_NAMESPACE, top_k=3, filter=None, timeout=None):
+        """timeout: what is left of the caller's request budget; the query never waits longer than that."""
+        budget = self.deadline if timeout is None else min(self.deadline, timeout)
+        if self.breaker.allow():
+            start = time.monotonic()
+            try:
+                matches = self._hedged_query(vector, namespace, top_k, filter, budget)
+            except Exception as exc:
+                self.failures += 1
+                # Timed out (here or as a gRPC deadline) only because the request's budget was shorter.
+                if budget < self.deadline and time.monotonic() - start >= budget * 0.9:
+                    self.breaker.record_inconclusive()
+                else:
+                    self.breaker.record_failure()
+                print(f"Retrieval failed, using fallback: {exc!r}")
+            else:
+                self.breaker.record_success()
+                return matches
+        return self._fallback_query(vector, namespace, top_k, filter)
+
+    def query_batch(self, vectors, namespace=RETRIEVAL_NAMESPACE, top_k=3, filter=None):
+        return [self.query(vector, namespace, top_k, filter) for vector in vectors]
+
+    def stats(self):
+        return {
+            "circuit_state": self.breaker.state,
+            "circuit_opened": self.breaker.times_opened,
+            "hedge_delay_seconds": self.hedge_delay(),
+            "hedged": self.hedged,
+            "failures": self.failures,
+            "fallbacks": self.fallbacks,
+        }
+
+    def close(self):
+        # The primary's index client belongs to the client registry, which closes it.
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._fallback is not None:
+            self._fallback.close()
@@ -0,0 +1,128 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600)))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "cache/sessions.sqlite3")
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+class InMemorySessionStore:
+    def __init__(self, ttl_seconds=SESSION_TTL_SECONDS, max_sessions=SESSION_MAX_SESSIONS):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, messages=None):
+        session_id = new_session_id()
+        with self._lock:
+            self._sessions[session_id] = {"messages": list(messages or []), "updated_at": time.monotonic()}
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session_id
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if time.monotonic() - session["updated_at"] > self.ttl_seconds:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return list(session["messages"])
+
+    def append(self, session_id, *messages):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return False
+            session["messages"].extend(messages)
+            session["updated_at"] = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            return True
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def close(self):
+        pass
+
+
+class SQLiteSessionStore:
+    def __init__(self, path=SESSION_DB_PATH, ttl_seconds=SESSION_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, messages TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def create(self, messages=None):
+        session_id = new_session_id()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO sessions (id, messages, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(list(messages or []), ensure_ascii=False), time.time()),
+            )
+            self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+            self._db.commit()
+        return session_id
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT messages, updated_at FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+        return json.loads(row[0])
+
+    def append(self, session_id, *messages):
+        with self._lock:
+            row = self._db.execute("SELECT messages FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return False
+            stored = json.loads(row[0]) + list(messages)
+            self._db.execute(
+                "UPDATE sessions SET messages = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(stored, ensure_ascii=False), time.time(), session_id),
+            )
+            self._db.commit()
+            return True
+
+    def delete(self, session_id):
+        with self._lock:
+            deleted = self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount
+            self._db.commit()
+        return deleted > 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def build_session_store():
+    if SESSION_STORE == "sqlite":
+        return SQLiteSessionStore()
+    return InMemorySessionStore()
+
+
+session_store = build_session_store()
@@ -0,0 +1,122 @@
+import math
+import os
+
+import numpy as np
+
+
+TARGET_SAMPLE_RATE = int(os.getenv("VOSK_SAMPLE_RATE", "16000"))
+TRIM_SILENCE = os.getenv("TRANSCRIBE_TRIM_SILENCE", "false").lower() in ("1", "true", "yes")
+SILENCE_THRESHOLD_DBFS = float(os.getenv("TRANSCRIBE_SILENCE_THRESHOLD_DBFS", "-45"))
+SILENCE_FRAME_SECONDS = 0.02
+SILENCE_PADDING_SECONDS = 0.2
+
+
+def design_lowpass(up, down, half_width=10, beta=5.0):
+    max_rate = max(up, down)
+    length = 2 * half_width * max_rate + 1
+    n = np.arange(length) - (length - 1) / 2
+    taps = np.sinc(n / max_rate) * np.kaiser(length, beta)
+    return taps * (up / taps.sum())
+
+
+class PolyphaseResampler:
+    def __init__(self, input_rate, output_rate=TARGET_SAMPLE_RATE):
+        divisor = math.gcd(input_rate, output_rate)
+        self.up = output_rate // divisor
+        self.down = input_rate // divisor
+        self.passthrough = self.up == self.down
+
+        taps = design_lowpass(self.up, self.down)
+        self.delay = (len(taps) - 1) // 2
+        taps = np.concatenate([taps, np.zeros((-len(taps)) % self.up)])
+        self.taps_per_phase = len(taps) // self.up
+        # phases[p, j] = taps[p + j * up]: the sub-filter applied to input x[i0 - j] for output phase p.
+        self.phases = np.ascontiguousarray(taps.reshape(self.taps_per_phase, self.up).T, dtype=np.float32)
+        self._offsets = np.arange(self.taps_per_phase)
+
+        self.history = np.zeros(self.taps_per_phase - 1, dtype=np.float32)
+        self.consumed = 0
+        self.next_output = 0
+
+    def process(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        if self.passthrough:
+            self.consumed += len(samples)
+            return samples
+
+        buffer = np.concatenate([self.history, samples])
+        buffer_start = self.consumed - len(self.history)
+        available = self.consumed + len(samples)
+        end_output = max(self.next_output, -(-(available * self.up - self.delay) // self.down))
+
+        outputs = np.arange(self.next_output, end_output)
+        positions = outputs * self.down + self.delay
+        input_index = positions // self.up - buffer_start
+        gathered = buffer[input_index[:, None] - self._offsets[None, :]]
+        resampled = np.einsum("ij,ij->i", gathered, self.phases[positions % self.up])
+
+        self.history = buffer[len(buffer) - len(self.history):]
+        self.consumed = available
+        self.next_output = end_output
+        return resampled.astype(np.float32)
+
+    def flush(self):
+        if self.passthrough:
+            return np.zeros(0, dtype=np.float32)
+        expected = -(-self.consumed * self.up // self.down)
+        consumed = self.consumed
+        tail = self.process(np.zeros(self.taps_per_phase, dtype=np.float32))
+        self.consumed = consumed
+        return tail[:max(0, expected - (self.next_output - len(tail)))]
+
+
+class SilenceTrimmer:
+    def __init__(self, sample_rate, threshold_dbfs=SILENCE_THRESHOLD_DBFS,
+                 padding_seconds=SILENCE_PADDING_SECONDS):
+        self.frame_length = max(1, int(sample_rate * SILENCE_FRAME_SECONDS))
+        self.padding = int(sample_rate * padding_seconds)
+        self.threshold = 10 ** (threshold_dbfs / 20)
+        self.started = False
+        self.remainder = np.zeros(0, dtype=np.float32)
+        self.preroll = np.zeros(0, dtype=np.float32)
+        self.pending = np.zeros(0, dtype=np.float32)
+
+    def process(self, samples):
+        samples = np.concatenate([self.remainder, np.asarray(samples, dtype=np.float32)])
+        frame_count = len(samples) // self.frame_length
+        self.remainder = samples[frame_count * self.frame_length:]
+        frames = samples[:frame_count * self.frame_length].reshape(frame_count, self.frame_length)
+        if frame_count == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        voiced = np.sqrt(np.mean(frames * frames, axis=1)) > self.threshold
+        if not voiced.any():
+            if self.started:
+                self.pending = np.concatenate([self.pending, frames.ravel()])
+            else:
+                self.preroll = np.concatenate([self.preroll, frames.ravel()])[-self.padding:]
+            return np.zeros(0, dtype=np.float32)
+
+        first = int(np.argmax(voiced))
+        last = frame_count - 1 - int(np.argmax(voiced[::-1]))
+        if self.started:
+            head = np.concatenate([self.pending, frames[:first].ravel()])
+        else:
+            head = np.concatenate([self.preroll, frames[:first].ravel()])[-self.padding:]
+            self.started = True
+        self.pending = frames[last + 1:].ravel()
+        return np.concatenate([head, frames[first:last + 1].ravel()])
+
+    def flush(self):
+        if not self.started:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate([self.pending, self.remainder])[:self.padding]
+
+
+def to_int16_bytes(samples):
+    samples = np.clip(samples, -1.0, 1.0)
+    return (samples * 32767).astype(np.int16).tobytes()
+
+
+def int16_bytes_to_float(pcm):
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
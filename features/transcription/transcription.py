@@ -0,0 +1,149 @@
+import io
+import json
+import os
+import threading
+
+import soundfile as sf
+from vosk import Model, KaldiRecognizer
+
+from features.transcription.audio_processing import (
+    TARGET_SAMPLE_RATE, TRIM_SILENCE, PolyphaseResampler, SilenceTrimmer, int16_bytes_to_float, to_int16_bytes
+)
+
+
+MODEL_DIR = os.getenv("VOSK_MODEL_DIR", "models/vosk-model-small-es-0.42")
+SPECULATIVE_TAIL_SECONDS = float(os.getenv("VOICE_SPECULATIVE_TAIL_SECONDS", "1.0"))
+BLOCK_SECONDS = 0.25
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def load_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = Model(MODEL_DIR)
+    return _model
+
+
+def open_audio(source):
+    if isinstance(source, (bytes, bytearray)):
+        return sf.SoundFile(io.BytesIO(source))
+    if hasattr(source, "read"):
+        return sf.SoundFile(source)
+    return sf.SoundFile(str(source))
+
+
+def iter_pcm_blocks(sound_file, block_seconds=BLOCK_SECONDS, target_rate=TARGET_SAMPLE_RATE,
+                    trim_silence=TRIM_SILENCE):
+    blocksize = max(1, int(sound_file.samplerate * block_seconds))
+    output_rate = target_rate or sound_file.samplerate
+    resampler = PolyphaseResampler(sound_file.samplerate, output_rate) if target_rate else None
+    trimmer = SilenceTrimmer(output_rate) if trim_silence else None
+
+    for block in sound_file.blocks(blocksize=blocksize, dtype="float32", always_2d=True):
+        mono = block.mean(axis=1)
+        if resampler is not None:
+            mono = resampler.process(mono)
+        if trimmer is not None:
+            mono = trimmer.process(mono)
+        if len(mono):
+            yield to_int16_bytes(mono)
+
+    if resampler is not None:
+        tail = resampler.flush()
+        if trimmer is not None:
+            tail = trimmer.process(tail)
+        if len(tail):
+            yield to_int16_bytes(tail)
+    if trimmer is not None:
+        tail = trimmer.flush()
+        if len(tail):
+            yield to_int16_bytes(tail)
+
+
+def output_sample_rate(sound_file, target_rate=TARGET_SAMPLE_RATE):
+    return target_rate or sound_file.samplerate
+
+
+def load_wav_bytes_mono_int16(source, target_rate=TARGET_SAMPLE_RATE, trim_silence=TRIM_SILENCE):
+    with open_audio(source) as sound_file:
+        pcm = b"".join(iter_pcm_blocks(sound_file, target_rate=target_rate, trim_silence=trim_silence))
+        return pcm, output_sample_rate(sound_file, target_rate)
+
+
+def transcribe_wav(source, model, target_rate=TARGET_SAMPLE_RATE, trim_silence=TRIM_SILENCE):
+    with open_audio(source) as sound_file:
+        rec = KaldiRecognizer(model, output_sample_rate(sound_file, target_rate))
+        for pcm in iter_pcm_blocks(sound_file, target_rate=target_rate, trim_silence=trim_silence):
+            rec.AcceptWaveform(pcm)
+    return json.loads(rec.FinalResult()).get("text", "").strip()
+
+
+def transcribe_wav_incremental(source, model, on_speculate, tail_seconds=SPECULATIVE_TAIL_SECONDS,
+                               target_rate=TARGET_SAMPLE_RATE, trim_silence=TRIM_SILENCE):
+    """Like transcribe_wav, but hands the running transcript to on_speculate once only the tail is left."""
+    segments = []
+    speculated = False
+    with open_audio(source) as sound_file:
+        rec = KaldiRecognizer(model, output_sample_rate(sound_file, target_rate))
+        tail_frames = int(tail_seconds * sound_file.samplerate)
+        for pcm in iter_pcm_blocks(sound_file, target_rate=target_rate, trim_silence=trim_silence):
+            if rec.AcceptWaveform(pcm):
+                segment = json.loads(rec.Result()).get("text", "").strip()
+                if segment:
+                    segments.append(segment)
+                partial = ""
+            else:
+                partial = json.loads(rec.PartialResult()).get("partial", "").strip()
+            # The end of a recording is usually trailing silence, so this text is rarely different from the final one.
+            if not speculated and sound_file.frames - sound_file.tell() <= tail_frames:
+                text = " ".join(segments + [partial]).strip()
+                if text:
+                    on_speculate(text)
+                    speculated = True
+        final = json.loads(rec.FinalResult()).get("text", "").strip()
+    if final:
+        segments.append(final)
+    return " ".join(segments)
+
+
+def accept_pcm_chunk(rec, chunk):
+    if rec.AcceptWaveform(chunk):
+        return "result", json.loads(rec.Result()).get("text", "").strip()
+    return "partial", json.loads(rec.PartialResult()).get("partial", "").strip()
+
+
+def transcribe_pcm_stream(read_chunk, model, sample_rate, on_event, target_rate=TARGET_SAMPLE_RATE):
+    """Decodes 16-bit mono PCM chunks from read_chunk until it returns None, reporting results and new partials."""
+    resampler = PolyphaseResampler(sample_rate, target_rate)
+    rec = KaldiRecognizer(model, target_rate)
+    segments = []
+    last_partial = ""
+    while True:
+        chunk = read_chunk()
+        if chunk is None:
+            break
+        if not resampler.passthrough:
+            chunk = to_int16_bytes(resampler.process(int16_bytes_to_float(chunk)))
+        if not chunk:
+            continue
+        kind, text = accept_pcm_chunk(rec, chunk)
+        if kind == "result":
+            if text:
+                segments.append(text)
+            last_partial = ""
+            on_event(kind, text)
+        elif text != last_partial:
+            last_partial = text
+            on_event(kind, text)
+
+    tail = resampler.flush()
+    if len(tail):
+        rec.AcceptWaveform(to_int16_bytes(tail))
+    final = json.loads(rec.FinalResult()).get("text", "").strip()
+    if final:
+        segments.append(final)
+    return " ".join(segments)
@@ -0,0 +1,183 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from fastapi.concurrency import run_in_threadpool
+
+from features.transcription.transcription import (
+    load_model, transcribe_pcm_stream, transcribe_wav, transcribe_wav_incremental
+)
+from features.monitoring.metrics import track_stage
+
+
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", str(os.cpu_count() or 1)))
+TRANSCRIBE_QUEUE_SIZE = int(os.getenv("TRANSCRIBE_QUEUE_SIZE", "16"))
+TRANSCRIBE_QUEUE_TIMEOUT = float(os.getenv("TRANSCRIBE_QUEUE_TIMEOUT", "5"))
+# Audio buffered per WebSocket stream before the client is slowed down to the decoder's pace.
+STREAM_BUFFER_CHUNKS = 32
+
+
+class TranscriptionQueueFull(Exception):
+    pass
+
+
+def init_worker():
+    load_model()
+
+
+def run_transcription_job(source):
+    return transcribe_wav(source, load_model())
+
+
+def run_incremental_job(source, partials):
+    return transcribe_wav_incremental(source, load_model(), partials.put)
+
+
+def run_stream_job(chunks, sample_rate, events):
+    return transcribe_pcm_stream(chunks.get, load_model(), sample_rate, lambda kind, text: events.put((kind, text)))
+
+
+def forward_partials(partials, on_partial):
+    while True:
+        text = partials.get()
+        if text is None:
+            return
+        on_partial(text)
+
+
+def ping():
+    return os.getpid()
+
+
+class TranscriptionPool:
+    def __init__(self, workers=TRANSCRIBE_WORKERS, queue_size=TRANSCRIBE_QUEUE_SIZE,
+                 queue_timeout=TRANSCRIBE_QUEUE_TIMEOUT):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._executor = None
+        self._slots = None
+        self._manager = None
+        self._listeners = None
+
+    def start(self):
+        if self._executor is None:
+            # spawn: forking a process that already holds gRPC channels is unsafe.
+            context = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=init_worker,
+            )
+            self._slots = asyncio.Semaphore(self.workers + self.queue_size)
+            # Partial transcripts travel back from the workers through manager queues, each read by
+            # a listener thread; listeners only start once their job holds a slot, so they are bounded too.
+            self._manager = context.Manager()
+            self._listeners = ThreadPoolExecutor(
+                max_workers=self.workers + self.queue_size, thread_name_prefix="transcription-partials"
+            )
+        return self
+
+    def warm_up(self):
+        # Workers load the model in init_worker; waiting on a ping from each one waits for that.
+        self.start()
+        futures = [self._executor.submit(ping) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    async def acquire(self):
+        self.start()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise TranscriptionQueueFull("Transcription queue is full")
+
+    async def submit(self, job, *args):
+        await self.acquire()
+        try:
+            return await asyncio.wrap_future(self._executor.submit(job, *args))
+        finally:
+            self._slots.release()
+
+    async def transcribe(self, source):
+        with track_stage("transcription"):
+            return await self.submit(run_transcription_job, source)
+
+    async def transcribe_incremental(self, source, on_partial, admitted=None):
+        """Transcribes in a worker, calling on_partial (from a listener thread) with its partial transcripts."""
+        await self.acquire()
+        if admitted is not None:
+            admitted.set()
+        try:
+            partials = self._manager.Queue()
+            listener = asyncio.wrap_future(self._listeners.submit(forward_partials, partials, on_partial))
+            try:
+                with track_stage("transcription"):
+                    return await asyncio.wrap_future(self._executor.submit(run_incremental_job, source, partials))
+            finally:
+                # A manager queue call is a blocking round trip to the manager process.
+                await run_in_threadpool(partials.put, None)
+                await listener
+        finally:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def stream(self, sample_rate, on_event):
+        """Holds a worker for one live stream; on_event gets (kind, text) pairs from a listener thread."""
+        await self.acquire()
+        try:
+            chunks = self._manager.Queue(STREAM_BUFFER_CHUNKS)
+            events = self._manager.Queue()
+            listener = asyncio.wrap_future(
+                self._listeners.submit(forward_partials, events, lambda event: on_event(*event))
+            )
+            job = asyncio.wrap_future(self._executor.submit(run_stream_job, chunks, sample_rate, events))
+        except BaseException:
+            self._slots.release()
+            raise
+        try:
+            with track_stage("transcription"):
+                yield TranscriptionStream(chunks, job)
+        finally:
+            # Shielded: a cancelled connection must still stop its job, or the worker would wait on it forever.
+            await asyncio.shield(self._close_stream(chunks, events, job, listener))
+
+    async def _close_stream(self, chunks, events, job, listener):
+        try:
+            if not job.done():
+                await run_in_threadpool(chunks.put, None)
+            await asyncio.wait({job})
+            await run_in_threadpool(events.put, None)
+            await listener
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._listeners.shutdown(wait=False, cancel_futures=True)
+            self._manager.shutdown()
+            self._executor = None
+            self._slots = None
+            self._manager = None
+            self._listeners = None
+
+
+class TranscriptionStream:
+    def __init__(self, chunks, job):
+        self._chunks = chunks
+        self._job = job
+
+    async def send(self, chunk):
+        # Manager queue calls block on a socket round trip, and on a full buffer.
+        await run_in_threadpool(self._chunks.put, chunk)
+
+    async def finish(self):
+        """Ends the audio and returns the full transcript."""
+        await run_in_threadpool(self._chunks.put, None)
+        return await self._job
+
+
+transcription_pool = TranscriptionPool()
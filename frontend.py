@@ -1,30 +1,80 @@
 import base64
-from datetime import datetime
+import json
 import requests
 from io import BytesIO
-from pathlib import Path
 import streamlit as st
 
 
 HOST = "http://127.0.0.1:8000"
 
 
-def call_backend(messages):
-    endpoint = "/chat_with_history"
-    url = HOST + endpoint
-    input_data = {"chat_history": messages}
-    response = requests.post(url, json=input_data)
-    print(response)
-    return response.json()['response']
-
-
-def call_transcribe(wav_path: str) -> str:
-    endpoint = "/transcribe"
-    url = HOST + endpoint
-    data = {"recording_path": wav_path}
-    resp = requests.post(url, json=data)
-    resp.raise_for_status()
-    return resp.json().get("text", "")
+def create_session(messages):
+    url = HOST + "/sessions"
+    response = requests.post(url, json={"chat_history": messages})
+    response.raise_for_status()
+    return response.json()["session_id"]
+
+
+def iter_sse_events(response):
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            event = None
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data = json.loads(line[len("data:"):])
+            if event == "error":
+                raise RuntimeError(data.get("detail", "Error en la respuesta del backend"))
+            if event == "done":
+                return
+            yield event, data
+
+
+def iter_sse_deltas(events):
+    for event, data in events:
+        if event is None:
+            yield data["delta"]
+
+
+def call_backend_stream(messages):
+    # Only the new message travels; the history lives in the backend session.
+    if st.session_state.session_id is None:
+        st.session_state.session_id = create_session(messages[:-1])
+    url = HOST + f"/sessions/{st.session_state.session_id}/chat/stream"
+    response = requests.post(url, json={"message": messages[-1]}, stream=True)
+    if response.status_code == 404:
+        response.close()
+        st.session_state.session_id = create_session(messages[:-1])
+        url = HOST + f"/sessions/{st.session_state.session_id}/chat/stream"
+        response = requests.post(url, json={"message": messages[-1]}, stream=True)
+    with response:
+        response.raise_for_status()
+        yield from iter_sse_deltas(iter_sse_events(response))
+
+
+def open_voice_stream(audio_bytes):
+    # One request: the backend transcribes the audio and streams the answer to the transcript.
+    if st.session_state.session_id is None:
+        st.session_state.session_id = create_session(st.session_state.messages)
+    files = {"file": ("recording.wav", audio_bytes, "audio/wav")}
+    url = HOST + f"/sessions/{st.session_state.session_id}/voice/stream"
+    response = requests.post(url, files=files, stream=True)
+    if response.status_code == 404:
+        response.close()
+        st.session_state.session_id = create_session(st.session_state.messages)
+        url = HOST + f"/sessions/{st.session_state.session_id}/voice/stream"
+        response = requests.post(url, files=files, stream=True)
+    response.raise_for_status()
+    return response
+
+
+def upload_image(image_bytes, filename):
+    url = HOST + "/images"
+    files = {"file": (filename, image_bytes, "image/png")}
+    response = requests.post(url, files=files)
+    response.raise_for_status()
+    return response.json()["image_id"]
 
 
 def b64_to_bytesio(b64_string):
@@ -34,6 +84,14 @@ def b64_to_bytesio(b64_string):
     return BytesIO(image_bytes)
 
 
+def stream_assistant_message(messages):
+    with chat_box:
+        with st.chat_message("assistant"):
+            response = st.write_stream(call_backend_stream(messages))
+    assistant_message = {"role": "assistant", "content": response}
+    st.session_state.messages.append(assistant_message)
+
+
 def show_message(msg):
     with chat_box:
         is_content_img = isinstance(msg["content"], list)
@@ -42,9 +100,12 @@ def show_message(msg):
             text_content = msg_content if not is_content_img else msg_content[0]["text"]
             st.write(text_content)
             if is_content_img:
-                base64_image_url = msg_content[1]["image_url"]["url"]
-                image_io = b64_to_bytesio(base64_image_url)
-                st.image(image_io)
+                image_part = msg_content[1]
+                if image_part["type"] == "image_ref":
+                    st.image(BytesIO(st.session_state.images[image_part["image_id"]]))
+                else:
+                    image_io = b64_to_bytesio(image_part["image_url"]["url"])
+                    st.image(image_io)
 
 
 # ── Page config ──────────────────────────────────────────────
@@ -329,6 +390,12 @@ st.markdown("""
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+if "images" not in st.session_state:
+    st.session_state.images = {}
+
+if "session_id" not in st.session_state:
+    st.session_state.session_id = None
+
 if "last_processed_audio" not in st.session_state:
     st.session_state.last_processed_audio = None
 
@@ -372,23 +439,18 @@ if user_query:
     if user_query["files"]:
         uploaded_file = user_query["files"][0]
         image_bytes = uploaded_file.read()
-        img_b64 = base64.b64encode(image_bytes).decode("utf-8")
+        image_id = upload_image(image_bytes, uploaded_file.name)
+        st.session_state.images[image_id] = image_bytes
         user_content = [
             {"type": "text", "text": user_text},
-            {"type": "image_url", "image_url": {"url": "data:image/png;base64," + img_b64}}
+            {"type": "image_ref", "image_id": image_id}
         ]
 
     user_message = {"role": "user", "content": user_content}
     st.session_state.messages.append(user_message)
     show_message(user_message)
 
-    with chat_box:
-        with st.spinner("Pensando..."):
-            response = call_backend(st.session_state.messages)
-
-    assistant_message = {"role": "assistant", "content": response}
-    st.session_state.messages.append(assistant_message)
-    show_message(assistant_message)
+    stream_assistant_message(st.session_state.messages)
 
 
 # ── Handle audio input ────────────────────────────────────────
@@ -398,32 +460,25 @@ if audio_file is not None and st.session_state.last_processed_audio != audio_fil
     with chat_box:
         st.audio(audio_bytes, format="audio/wav")
 
-    recordings_dir = Path("recordings")
-    recordings_dir.mkdir(exist_ok=True)
-
-    wav_path = recordings_dir / f"recording_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
-    print(str(wav_path))
-
-    with open(wav_path, "wb") as f:
-        f.write(audio_bytes)
-
     with st.spinner("Transcribiendo audio..."):
-        transcription = call_transcribe(str(wav_path))
-
-    if transcription == "":
-        with chat_box:
-            st.warning("Necesitas hablar en el audio. Prueba otra vez.")
-    else:
-        user_message = {"role": "user", "content": transcription}
-        st.session_state.messages.append(user_message)
-        show_message(user_message)
-
-        with chat_box:
-            with st.spinner("Pensando..."):
-                response = call_backend(st.session_state.messages)
-
-        assistant_message = {"role": "assistant", "content": response}
-        st.session_state.messages.append(assistant_message)
-        show_message(assistant_message)
-
-        st.session_state.last_processed_audio = audio_file
\ No newline at end of file
+        response = open_voice_stream(audio_bytes)
+        events = iter_sse_events(response)
+        # The transcript always comes first, before any answer delta.
+        _, transcript_data = next(events, (None, {"text": ""}))
+        transcription = transcript_data["text"]
+
+    with response:
+        if transcription == "":
+            with chat_box:
+                st.warning("Necesitas hablar en el audio. Prueba otra vez.")
+        else:
+            user_message = {"role": "user", "content": transcription}
+            st.session_state.messages.append(user_message)
+            show_message(user_message)
+
+            with chat_box:
+                with st.chat_message("assistant"):
+                    answer = st.write_stream(iter_sse_deltas(events))
+            st.session_state.messages.append({"role": "assistant", "content": answer})
+
+            st.session_state.last_processed_audio = audio_file
\ No newline at end of file
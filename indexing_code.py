@@ -1,33 +1,173 @@
+import argparse
+import hashlib
 import json
+import os
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
 from pinecone.grpc import PineconeGRPC, GRPCClientConfig
 from pinecone import ServerlessSpec
+from features.retrieval.backends import resolve_namespace, set_namespace_alias
+from features.retrieval.corpus_store import iter_records
 
 
-host = "http://localhost:5080"
+host = os.getenv("PINECONE_HOST", "http://localhost:5080")
+index_name = os.getenv("PINECONE_INDEX_NAME", "dense-index")
+namespace = os.getenv("RETRIEVAL_NAMESPACE", "example")
 
-pc_grpc = PineconeGRPC(api_key="pclocal", host=host)
-index_name = "dense-index"
+MANIFEST_PATH = os.getenv("INDEX_MANIFEST_PATH", "cache/index_manifest.json")
+BATCH_SIZE = 100
+CONCURRENCY = 4
+MAX_RETRIES = 5
 
-if pc_grpc.has_index(index_name):
-    pc_grpc.delete_index(name=index_name)
 
-pc_grpc.create_index(
-    name=index_name,
-    dimension=1536,
-    metric="cosine",
-    spec=ServerlessSpec(
-        cloud="aws",
-        region="us-east-1",
-    ),
-    vector_type="dense"
-)
+def content_hash(record):
+    digest = hashlib.sha256(array("f", record["values"]).tobytes())
+    digest.update(json.dumps(record.get("metadata", {}), sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
 
-index_host = pc_grpc.describe_index(name=index_name).host
-index_grpc = pc_grpc.Index(host=index_host, grpc_config=GRPCClientConfig(secure=False))
 
-with open("faq_pairs.json", encoding="utf-8") as file:
-    faq_pairs = json.load(file)
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
 
-index_grpc.upsert(vectors=faq_pairs, namespace='example')
 
-print("Upsert complete")
+def save_manifest(manifest, path=MANIFEST_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(json.dumps(manifest), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def get_index(pc_grpc):
+    if not pc_grpc.has_index(index_name):
+        pc_grpc.create_index(
+            name=index_name,
+            dimension=1536,
+            metric="cosine",
+            spec=ServerlessSpec(
+                cloud="aws",
+                region="us-east-1",
+            ),
+            vector_type="dense"
+        )
+
+    index_host = pc_grpc.describe_index(name=index_name).host
+    return pc_grpc.Index(host=index_host, grpc_config=GRPCClientConfig(secure=False))
+
+
+def with_retries(operation, *args, **kwargs):
+    for attempt in range(MAX_RETRIES):
+        try:
+            return operation(*args, **kwargs)
+        except Exception as exc:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            delay = 0.5 * 2 ** attempt
+            print(f"Retrying in {delay:.1f}s after error: {exc}")
+            time.sleep(delay)
+
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_changed_records(source, previous_hashes, current_hashes):
+    for record in iter_records(source):
+        record_hash = content_hash(record)
+        current_hashes[record["id"]] = record_hash
+        if previous_hashes.get(record["id"]) != record_hash:
+            yield {"id": record["id"], "values": record["values"], "metadata": record.get("metadata", {})}
+
+
+def run_batches(operation, batches, concurrency, target_namespace):
+    processed = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = set()
+        for batch in batches:
+            # Bound the number of batches held in memory to the number of workers.
+            if len(pending) >= concurrency:
+                done = next(as_completed(pending))
+                pending.remove(done)
+                processed += done.result()
+            pending.add(executor.submit(with_retries, operation, batch, target_namespace))
+        for done in as_completed(pending):
+            processed += done.result()
+    return processed
+
+
+def upsert_batch(index_grpc, batch, target_namespace):
+    index_grpc.upsert(vectors=batch, namespace=target_namespace)
+    return len(batch)
+
+
+def delete_batch(index_grpc, ids, target_namespace):
+    index_grpc.delete(ids=ids, namespace=target_namespace)
+    return len(ids)
+
+
+def index_corpus(source, batch_size=BATCH_SIZE, concurrency=CONCURRENCY, new_namespace=False, drop_old=False):
+    pc_grpc = PineconeGRPC(api_key="pclocal", host=host)
+    index_grpc = get_index(pc_grpc)
+    manifest = load_manifest()
+
+    if new_namespace:
+        target_namespace = f"{namespace}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        previous_hashes = {}
+    else:
+        target_namespace = resolve_namespace(namespace)
+        previous_hashes = manifest.get(target_namespace, {})
+
+    current_hashes = {}
+    changed = iter_changed_records(source, previous_hashes, current_hashes)
+    upserted = run_batches(
+        lambda batch, ns: upsert_batch(index_grpc, batch, ns),
+        iter_batches(changed, batch_size), concurrency, target_namespace
+    )
+
+    removed_ids = [record_id for record_id in previous_hashes if record_id not in current_hashes]
+    deleted = run_batches(
+        lambda ids, ns: delete_batch(index_grpc, ids, ns),
+        iter_batches(removed_ids, batch_size), concurrency, target_namespace
+    )
+
+    manifest[target_namespace] = current_hashes
+    save_manifest(manifest)
+    print(f"Upserted {upserted} and deleted {deleted} vectors in namespace '{target_namespace}'")
+
+    if new_namespace:
+        previous_namespace = set_namespace_alias(namespace, target_namespace)
+        print(f"Namespace '{namespace}' now points to '{target_namespace}'")
+        if drop_old and previous_namespace and previous_namespace != target_namespace:
+            index_grpc.delete(delete_all=True, namespace=previous_namespace)
+            manifest.pop(previous_namespace, None)
+            save_manifest(manifest)
+            print(f"Dropped previous namespace '{previous_namespace}'")
+
+    print("Upsert complete")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally index FAQ vectors into Pinecone")
+    parser.add_argument("--source", default="faq_pairs.json",
+                        help="JSON array, JSONL file or corpus directory with id/values/metadata records")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--new-namespace", action="store_true",
+                        help="Build into a fresh namespace and switch the alias to it when complete")
+    parser.add_argument("--drop-old", action="store_true",
+                        help="With --new-namespace, delete the namespace the alias pointed to before")
+    args = parser.parse_args()
+    index_corpus(args.source, args.batch_size, args.concurrency, args.new_namespace, args.drop_old)
@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import time
+from dotenv import load_dotenv
+from features.rag_generation.client_registry import client_registry
+from features.rag_generation.embedding_cache import embedding_cache
+from features.rag_generation.rag_generation import EMBEDDING_MODEL
+from features.retrieval.corpus_store import iter_records, write_corpus
+
+
+load_dotenv()
+
+namespace = os.getenv("RETRIEVAL_NAMESPACE", "example")
+
+EMBEDDING_BATCH_SIZE = 256
+EMBEDDING_CONCURRENCY = 4
+
+
+def build_record(pair):
+    pregunta = pair["pregunta"].strip()
+    respuesta = pair["respuesta"].strip()
+    content = f"{pregunta}\n{respuesta}"
+    metadata = {"pregunta": pregunta, "respuesta": respuesta, "content": content}
+    if "pagina" in pair:
+        metadata["pagina"] = pair["pagina"]
+    record_id = pair.get("id") or hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return {"id": record_id, "namespace": namespace, "metadata": metadata}
+
+
+async def embed_batch(openai_client, semaphore, texts):
+    async with semaphore:
+        response = await openai_client.embeddings.create(input=texts, model=EMBEDDING_MODEL)
+    embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    embedding_cache.put_many(texts, EMBEDDING_MODEL, embeddings)
+    return embeddings
+
+
+async def embed_records(records, batch_size=EMBEDDING_BATCH_SIZE, concurrency=EMBEDDING_CONCURRENCY):
+    openai_client = client_registry.get_async_openai_client()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    missing = []
+    for record in records:
+        content = record["metadata"]["content"]
+        cached = embedding_cache.get(content, EMBEDDING_MODEL)
+        if cached is None:
+            missing.append(record)
+        else:
+            record["values"] = cached
+
+    batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+    results = await asyncio.gather(*(
+        embed_batch(openai_client, semaphore, [record["metadata"]["content"] for record in batch])
+        for batch in batches
+    ))
+    for batch, embeddings in zip(batches, results):
+        for record, embedding in zip(batch, embeddings):
+            record["values"] = embedding
+
+    await client_registry.aclose()
+    return len(records) - len(missing), len(missing), len(batches)
+
+
+def ingest(source, out_dir, batch_size, concurrency, dtype):
+    start = time.perf_counter()
+    records = {}
+    for pair in iter_records(source):
+        record = build_record(pair)
+        records[record["id"]] = record
+    records = list(records.values())
+
+    cached, embedded, requests = asyncio.run(embed_records(records, batch_size, concurrency))
+    write_corpus(out_dir, records, dtype=dtype)
+    embedding_cache.close()
+    print(
+        f"Embedded {embedded} new and reused {cached} cached Q/A pairs in {requests} requests "
+        f"({time.perf_counter() - start:.1f}s), corpus written to {out_dir}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed raw pregunta/respuesta pairs into a vector corpus")
+    parser.add_argument("--source", required=True, help="JSON array or JSONL file with pregunta/respuesta pairs")
+    parser.add_argument("--out", default="cache/faq_corpus", help="Output corpus directory")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=EMBEDDING_CONCURRENCY)
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16", "int8"])
+    args = parser.parse_args()
+    ingest(args.source, args.out, args.batch_size, args.concurrency, args.dtype)
@@ -0,0 +1,27 @@
+from fastapi import APIRouter
+from features.rag_generation.embedding_cache import embedding_cache
+from features.rag_generation.semantic_cache import semantic_cache
+from features.monitoring.telemetry import telemetry_writer
+from features.rag_generation.rag_router import rag_router
+from features.rag_generation.single_flight import (
+    embedding_flight, generation_flight, retrieval_flight, stream_generation_flight
+)
+
+
+cache_stats_router = APIRouter()
+
+
+@cache_stats_router.get("/cache_stats")
+def cache_stats():
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "telemetry": telemetry_writer.stats(),
+        "rag_router": rag_router.stats(),
+        "single_flight": {
+            "embedding": embedding_flight.stats(),
+            "retrieval": retrieval_flight.stats(),
+            "generation": generation_flight.stats(),
+            "stream_generation": stream_generation_flight.stats(),
+        },
+    }
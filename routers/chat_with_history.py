@@ -1,17 +1,33 @@
-from typing import List, Union
-from fastapi import APIRouter
-import mlflow
+import json
+from typing import List, Optional, Union
+from fastapi import APIRouter, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from features.rag_generation.rag_generation import (
-    chat_openai_with_history, generation_main_workflow, start_openai_client
+from features.rag_generation.async_rag_generation import (
+    chat_openai_with_history, generation_main_workflow, start_openai_client,
+    stream_chat_openai_with_history, stream_generation_main_workflow
 )
-from features.monitoring.mlflow_setup import setup_mlflow
+from features.rag_generation.client_registry import PINECONE_HOST, PINECONE_INDEX_NAME
+from features.rag_generation.history_compaction import compact_history
+from features.images.image_store import image_store, resolve_image_refs
+from features.monitoring.telemetry import telemetry_writer
+from features.monitoring.metrics import track_stage
+from features.rag_generation.admission import set_request_deadline
+from features.rag_generation.rag_router import rag_router
+from features.rag_generation.semantic_cache import is_single_turn
 
 
-setup_mlflow()
-
 chat_with_history_router = APIRouter()
 
+SYSTEM_PROMPT = """
+    Eres un experto útil en Python. Responde la pregunta del usuario sobre programación en Python de la manera más precisa y concisa posible, utilizando solo tu propio conocimiento. Si no estás seguro de una respuesta, dilo claramente.
+
+    Las preguntas son en español y pueden llegar procesadas por el modelo vosk vosk-model-small-es-0.42 y KaldiRecognizer, por lo que no entenderá "Python".
+    Errores comunes detectados como Python: país son, faisán,...
+    """
+
+
 class Message(BaseModel):
     role: str
     content: Union[str, list]
@@ -26,8 +42,8 @@ class ChatResponse(BaseModel):
 
 
 def get_user_query(historical_messages):
-    user_content = historical_messages[-1].content
-    if historical_messages[-1].role == "user":
+    user_content = historical_messages[-1]["content"]
+    if historical_messages[-1]["role"] == "user":
         if isinstance(user_content, str):
             user_query = user_content
         elif isinstance(user_content, list):
@@ -37,31 +53,129 @@ def get_user_query(historical_messages):
     return user_query
 
 
-@chat_with_history_router.post("/chat_with_history")
-def chat_with_history(request: ChatHistoryInput) -> ChatResponse:
-    system_prompt = """
-    Eres un experto útil en Python. Responde la pregunta del usuario sobre programación en Python de la manera más precisa y concisa posible, utilizando solo tu propio conocimiento. Si no estás seguro de una respuesta, dilo claramente.
+def is_cache_bypassed(header_value):
+    return header_value is not None and header_value.strip().lower() in ("1", "true", "yes")
+
+
+def log_chat_request(endpoint, user_query, chat_history_len):
+    telemetry_writer.log_run("chat_with_history", params={
+        "endpoint": endpoint,
+        "user_query_len": len(user_query) if user_query else 0,
+        "chat_history_len": chat_history_len,
+    })
+
+
+async def prepare_chat(endpoint, history_as_dicts):
+    set_request_deadline()
+    user_query = get_user_query(history_as_dicts)
+    log_chat_request(endpoint, user_query, len(history_as_dicts))
+    history_as_dicts = await run_in_threadpool(resolve_image_refs, history_as_dicts, image_store)
+    with track_stage("history_compaction"):
+        history_as_dicts = await compact_history(history_as_dicts, start_openai_client())
+    return user_query, history_as_dicts
+
+
+async def answer_chat(endpoint, history_as_dicts, use_cache=True):
+    with track_stage("chat"):
+        return await _answer_chat(endpoint, history_as_dicts, use_cache)
+
+
+def cache_allowed(use_cache, history_as_dicts):
+    # Decided on the history as sent: compaction can shrink a follow-up to a single message,
+    # but its answer still depends on the conversation, so it must never hit the semantic cache.
+    return use_cache and is_single_turn(history_as_dicts)
 
-    Las preguntas son en español y pueden llegar procesadas por el modelo vosk vosk-model-small-es-0.42 y KaldiRecognizer, por lo que no entenderá "Python".
-    Errores comunes detectados como Python: país son, faisán,...
-    """
-    user_query = get_user_query(request.chat_history)
-    history_as_dicts = [m.model_dump() for m in request.chat_history]
-    
-    with mlflow.start_run(run_name="chat_with_history"):
-        mlflow.log_param("endpoint", "/chat_with_history")
-        mlflow.log_param("user_query_len", len(user_query) if user_query else 0)
-        mlflow.log_param("chat_history_len", len(request.chat_history))
-
-        if not user_query:
-            print("---- Chat directly ----")
-            openai_client = start_openai_client()
-            
-            chat_response = chat_openai_with_history(openai_client, history_as_dicts, system_prompt)
-        else:
-            host = "http://localhost:5080"
-            index_name = "dense-index"
-            print("---- RAG ----")
-            chat_response = generation_main_workflow(user_query, host, index_name, history_as_dicts, system_prompt)
 
+async def _answer_chat(endpoint, history_as_dicts, use_cache):
+    use_cache = cache_allowed(use_cache, history_as_dicts)
+    user_query, history_as_dicts = await prepare_chat(endpoint, history_as_dicts)
+
+    if not user_query:
+        print("---- Chat directly ----")
+        openai_client = start_openai_client()
+
+        return await chat_openai_with_history(openai_client, history_as_dicts, SYSTEM_PROMPT)
+
+    route = await rag_router.should_retrieve_async(user_query, history_as_dicts)
+    if not route.retrieve:
+        print(f"---- Chat directly (router: {route.reason}) ----")
+        return await chat_openai_with_history(start_openai_client(), history_as_dicts, SYSTEM_PROMPT)
+
+    print("---- RAG ----")
+    return await generation_main_workflow(
+        user_query, PINECONE_HOST, PINECONE_INDEX_NAME, history_as_dicts, SYSTEM_PROMPT, use_cache=use_cache
+    )
+
+
+async def stream_answer_chat(endpoint, history_as_dicts, use_cache=True):
+    use_cache = cache_allowed(use_cache, history_as_dicts)
+    user_query, history_as_dicts = await prepare_chat(endpoint, history_as_dicts)
+
+    if not user_query:
+        print("---- Chat directly (stream) ----")
+        openai_client = start_openai_client()
+        return stream_chat_openai_with_history(openai_client, history_as_dicts, SYSTEM_PROMPT)
+
+    route = await rag_router.should_retrieve_async(user_query, history_as_dicts)
+    if not route.retrieve:
+        print(f"---- Chat directly (stream, router: {route.reason}) ----")
+        return stream_chat_openai_with_history(start_openai_client(), history_as_dicts, SYSTEM_PROMPT)
+
+    print("---- RAG (stream) ----")
+    return stream_generation_main_workflow(
+        user_query, PINECONE_HOST, PINECONE_INDEX_NAME, history_as_dicts, SYSTEM_PROMPT, use_cache=use_cache
+    )
+
+
+def sse_event(data, event=None):
+    payload = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    if event:
+        payload = f"event: {event}\n" + payload
+    return payload
+
+
+async def stream_chat_events(deltas, on_complete=None):
+    chunks = []
+    try:
+        with track_stage("chat_stream"):
+            async for delta in deltas:
+                chunks.append(delta)
+                yield sse_event({"delta": delta})
+    except Exception as exc:
+        print(f"Streaming chat failed: {exc}")
+        yield sse_event({"detail": str(exc)}, event="error")
+        return
+    if on_complete is not None:
+        # Completion hooks persist the turn (SQLite session store), so they run off the event loop.
+        await run_in_threadpool(on_complete, "".join(chunks))
+    yield sse_event({}, event="done")
+
+
+def sse_response(events):
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@chat_with_history_router.post("/chat_with_history")
+async def chat_with_history(
+    request: ChatHistoryInput, x_bypass_cache: Optional[str] = Header(default=None)
+) -> ChatResponse:
+    history_as_dicts = [m.model_dump() for m in request.chat_history]
+    chat_response = await answer_chat(
+        "/chat_with_history", history_as_dicts, use_cache=not is_cache_bypassed(x_bypass_cache)
+    )
     return ChatResponse(response=chat_response)
+
+
+@chat_with_history_router.post("/chat_with_history/stream")
+async def chat_with_history_stream(
+    request: ChatHistoryInput, x_bypass_cache: Optional[str] = Header(default=None)
+):
+    history_as_dicts = [m.model_dump() for m in request.chat_history]
+    deltas = await stream_answer_chat(
+        "/chat_with_history/stream", history_as_dicts, use_cache=not is_cache_bypassed(x_bypass_cache)
+    )
+    return sse_response(stream_chat_events(deltas))
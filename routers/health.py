@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from features.monitoring.readiness import readiness
+
+
+health_router = APIRouter()
+
+
+@health_router.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+
+@health_router.get("/readyz")
+def readyz():
+    ready = readiness.all_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "starting", "subsystems": readiness.snapshot()},
+    )
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+from pydantic import BaseModel
+from features.images.image_store import InvalidImage, image_store
+
+
+images_router = APIRouter()
+
+
+class ImageUploadResponse(BaseModel):
+    image_id: str
+    width: int
+    height: int
+    bytes: int
+
+
+@images_router.post("/images")
+async def upload_image(file: UploadFile = File(...)) -> ImageUploadResponse:
+    image_bytes = await file.read()
+    try:
+        stored = await run_in_threadpool(image_store.put, image_bytes)
+    except InvalidImage as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return ImageUploadResponse(**stored)
+
+
+@images_router.get("/images/{image_id}")
+async def get_image(image_id: str, detail: str = "high"):
+    variant = await run_in_threadpool(image_store.get_variant, image_id, "low" if detail == "low" else "high")
+    if variant is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    mime_type, data = variant
+    return Response(content=data, media_type=mime_type, headers={"Cache-Control": "public, max-age=31536000, immutable"})
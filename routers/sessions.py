@@ -0,0 +1,90 @@
+import copy
+from typing import List, Optional
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from routers.chat_with_history import (
+    ChatResponse, Message, answer_chat, is_cache_bypassed, sse_response, stream_answer_chat,
+    stream_chat_events
+)
+from features.sessions.session_store import session_store
+
+
+sessions_router = APIRouter()
+
+
+class CreateSessionInput(BaseModel):
+    chat_history: List[Message] = []
+
+
+class SessionResponse(BaseModel):
+    session_id: str
+
+
+class SessionHistoryResponse(BaseModel):
+    session_id: str
+    chat_history: List[Message]
+
+
+class SessionMessageInput(BaseModel):
+    message: Message
+
+
+async def load_session_history(session_id, message):
+    # The store may be SQLite, so every call from an async handler goes through the threadpool.
+    history = await run_in_threadpool(session_store.get, session_id)
+    if history is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    user_message = message.model_dump()
+    # The RAG pipeline rewrites the last message in place, so work on a copy of the stored history.
+    return user_message, copy.deepcopy(history + [user_message])
+
+
+@sessions_router.post("/sessions")
+def create_session(request: Optional[CreateSessionInput] = None) -> SessionResponse:
+    messages = [m.model_dump() for m in request.chat_history] if request else []
+    return SessionResponse(session_id=session_store.create(messages))
+
+
+@sessions_router.get("/sessions/{session_id}")
+def get_session(session_id: str) -> SessionHistoryResponse:
+    history = session_store.get(session_id)
+    if history is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return SessionHistoryResponse(session_id=session_id, chat_history=history)
+
+
+@sessions_router.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"deleted": session_id}
+
+
+@sessions_router.post("/sessions/{session_id}/chat")
+async def chat_in_session(
+    session_id: str, request: SessionMessageInput, x_bypass_cache: Optional[str] = Header(default=None)
+) -> ChatResponse:
+    user_message, history_as_dicts = await load_session_history(session_id, request.message)
+    chat_response = await answer_chat(
+        "/sessions/chat", history_as_dicts, use_cache=not is_cache_bypassed(x_bypass_cache)
+    )
+    await run_in_threadpool(
+        session_store.append, session_id, user_message, {"role": "assistant", "content": chat_response}
+    )
+    return ChatResponse(response=chat_response)
+
+
+@sessions_router.post("/sessions/{session_id}/chat/stream")
+async def chat_in_session_stream(
+    session_id: str, request: SessionMessageInput, x_bypass_cache: Optional[str] = Header(default=None)
+):
+    user_message, history_as_dicts = await load_session_history(session_id, request.message)
+    deltas = await stream_answer_chat(
+        "/sessions/chat/stream", history_as_dicts, use_cache=not is_cache_bypassed(x_bypass_cache)
+    )
+
+    def save_turn(chat_response):
+        session_store.append(session_id, user_message, {"role": "assistant", "content": chat_response})
+
+    return sse_response(stream_chat_events(deltas, on_complete=save_turn))
@@ -1,13 +1,14 @@
-import numpy as np
-import json
-import soundfile as sf
-from vosk import Model, KaldiRecognizer
+import asyncio
+import os
+from typing import List
 from pydantic import BaseModel
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, WebSocket, WebSocketDisconnect
+from features.transcription.worker_pool import TranscriptionQueueFull, transcription_pool
+from features.monitoring.readiness import readiness
 
 
-MODEL_DIR = "models/vosk-model-small-es-0.42"
-model = Model(MODEL_DIR)
+TRANSCRIBE_BATCH_MAX_FILES = int(os.getenv("TRANSCRIBE_BATCH_MAX_FILES", "32"))
+TRANSCRIBE_NOT_READY_RETRY_AFTER = "10"
 
 transcribe_router = APIRouter()
 
@@ -20,25 +21,104 @@ class TranscribeResponse(BaseModel):
     text: str
 
 
-def load_wav_bytes_mono_int16(path):
-    data, sr = sf.read(str(path), always_2d=True)
-    mono = data.mean(axis=1)
-    mono = np.clip(mono, -1.0, 1.0)
-    return (mono * 32767).astype(np.int16).tobytes(), sr
+class BatchTranscription(BaseModel):
+    filename: str
+    text: str
+
 
+class BatchTranscribeResponse(BaseModel):
+    results: List[BatchTranscription]
 
-def transcribe_wav(path, model):
-    pcm, sr = load_wav_bytes_mono_int16(path)
-    rec = KaldiRecognizer(model, sr)
 
-    step = int(sr * 0.25) * 2
-    for i in range(0, len(pcm), step):
-        rec.AcceptWaveform(pcm[i:i+step])
-    return json.loads(rec.FinalResult()).get("text", "").strip()
+def require_transcription_ready():
+    if not readiness.is_ready("transcription"):
+        raise HTTPException(
+            status_code=503, detail="Transcription model is still loading, retry later",
+            headers={"Retry-After": TRANSCRIBE_NOT_READY_RETRY_AFTER},
+        )
 
 
-@transcribe_router.post("/transcribe")
+@transcribe_router.post("/transcribe", dependencies=[Depends(require_transcription_ready)])
 async def chat_from_audio(request: TranscribeRequest):
     file_path = request.recording_path
-    text = transcribe_wav(file_path, model)
+    try:
+        text = await transcription_pool.transcribe(file_path)
+    except TranscriptionQueueFull:
+        raise HTTPException(status_code=503, detail="Transcription queue is full, retry later")
     return TranscribeResponse(text=text)
+
+
+@transcribe_router.post("/transcribe/upload", dependencies=[Depends(require_transcription_ready)])
+async def transcribe_upload(file: UploadFile = File(...)):
+    audio_bytes = await file.read()
+    try:
+        text = await transcription_pool.transcribe(audio_bytes)
+    except TranscriptionQueueFull:
+        raise HTTPException(status_code=503, detail="Transcription queue is full, retry later")
+    return TranscribeResponse(text=text)
+
+
+@transcribe_router.post("/transcribe/batch", dependencies=[Depends(require_transcription_ready)])
+async def transcribe_batch(files: List[UploadFile] = File(...)):
+    if len(files) > TRANSCRIBE_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400, detail=f"At most {TRANSCRIBE_BATCH_MAX_FILES} files per batch"
+        )
+    clips = [await file.read() for file in files]
+    try:
+        texts = await asyncio.gather(*(transcription_pool.transcribe(clip) for clip in clips))
+    except TranscriptionQueueFull:
+        raise HTTPException(status_code=503, detail="Transcription queue is full, retry later")
+    return BatchTranscribeResponse(results=[
+        BatchTranscription(filename=file.filename or "", text=text) for file, text in zip(files, texts)
+    ])
+
+
+async def send_events(websocket, outbox):
+    while True:
+        event = await outbox.get()
+        if event is None:
+            return
+        await websocket.send_json(event)
+
+
+@transcribe_router.websocket("/ws/transcribe")
+async def transcribe_stream(websocket: WebSocket, sample_rate: int = 16000):
+    await websocket.accept()
+    if not readiness.is_ready("transcription"):
+        # 1013: try again later.
+        await websocket.close(code=1013, reason="Transcription model is still loading")
+        return
+    loop = asyncio.get_running_loop()
+    outbox = asyncio.Queue()
+    sender = asyncio.ensure_future(send_events(websocket, outbox))
+
+    def on_event(kind, text):
+        # Called from the pool's listener thread, in the order the worker produced the events.
+        loop.call_soon_threadsafe(outbox.put_nowait, {"type": kind, "text": text})
+
+    try:
+        try:
+            async with transcription_pool.stream(sample_rate, on_event) as stream:
+                while True:
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        return
+                    if message.get("bytes"):
+                        await stream.send(message["bytes"])
+                    elif message.get("text") == "EOF":
+                        break
+                final_text = await stream.finish()
+        except TranscriptionQueueFull:
+            await websocket.close(code=1013, reason="Transcription queue is full")
+            return
+
+        # Leaving the stream waited for the listener, so every partial and result is already queued.
+        outbox.put_nowait({"type": "final", "text": final_text})
+        outbox.put_nowait(None)
+        await sender
+        await websocket.close()
+    except WebSocketDisconnect:
+        return
+    finally:
+        sender.cancel()
@@ -0,0 +1,108 @@
+import asyncio
+import copy
+from typing import Optional
+from fastapi import APIRouter, Depends, File, Header, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from routers.chat_with_history import (
+    is_cache_bypassed, sse_event, sse_response, stream_answer_chat, stream_chat_events
+)
+from routers.transcribe import require_transcription_ready
+from features.rag_generation.async_rag_generation import generate_embedding, start_openai_client
+from features.rag_generation.embedding_cache import normalize_query
+from features.rag_generation.rag_router import rag_router
+from features.sessions.session_store import session_store
+from features.transcription.worker_pool import TranscriptionQueueFull, transcription_pool
+
+
+voice_chat_router = APIRouter()
+
+
+def _consume_exception(task):
+    # Errors are awaited by the request when it still cares; a failed speculation is simply dropped.
+    if not task.cancelled():
+        task.exception()
+
+
+class SpeculativeEmbedding:
+    """Embeds the partial transcript while Vosk decodes the tail; the result lands in the embedding cache."""
+
+    def __init__(self, history):
+        self.history = history
+        self.loop = asyncio.get_running_loop()
+        self.text = None
+
+    def __call__(self, text):
+        # Called from the transcription pool's listener thread, so the router's classifier runs off the loop too.
+        turn = self.history + [{"role": "user", "content": text}]
+        if rag_router.should_retrieve(text, turn, count=False).retrieve:
+            self.loop.call_soon_threadsafe(self._start, text)
+
+    def _start(self, text):
+        self.text = text
+        task = asyncio.ensure_future(generate_embedding(text, start_openai_client()))
+        task.add_done_callback(_consume_exception)
+
+    def matches(self, transcript):
+        return self.text is not None and normalize_query(self.text) == normalize_query(transcript)
+
+
+async def start_transcription(audio_bytes, speculation):
+    """Queues the decode in the transcription pool; returns its task once it holds a slot."""
+    admitted = asyncio.Event()
+    task = asyncio.ensure_future(transcription_pool.transcribe_incremental(audio_bytes, speculation, admitted))
+    task.add_done_callback(_consume_exception)
+    waiter = asyncio.ensure_future(admitted.wait())
+    await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+    waiter.cancel()
+    if task.done() and isinstance(task.exception(), TranscriptionQueueFull):
+        raise HTTPException(status_code=503, detail="Transcription queue is full, retry later")
+    return task
+
+
+async def voice_chat_events(session_id, history, transcription, speculation, use_cache):
+    try:
+        transcript = await transcription
+    except Exception as exc:
+        print(f"Voice transcription failed: {exc}")
+        yield sse_event({"detail": str(exc)}, event="error")
+        return
+
+    yield sse_event({"text": transcript}, event="transcript")
+    if not transcript:
+        yield sse_event({}, event="done")
+        return
+    if speculation.matches(transcript):
+        print("---- Speculative embedding reused ----")
+
+    user_message = {"role": "user", "content": transcript}
+    try:
+        # The RAG pipeline rewrites the last message in place, so work on a copy of the stored history.
+        deltas = await stream_answer_chat(
+            "/sessions/voice/stream", copy.deepcopy(history + [user_message]), use_cache=use_cache
+        )
+    except Exception as exc:
+        print(f"Voice chat failed: {exc}")
+        yield sse_event({"detail": str(exc)}, event="error")
+        return
+
+    def save_turn(chat_response):
+        session_store.append(session_id, user_message, {"role": "assistant", "content": chat_response})
+
+    async for event in stream_chat_events(deltas, on_complete=save_turn):
+        yield event
+
+
+@voice_chat_router.post("/sessions/{session_id}/voice/stream", dependencies=[Depends(require_transcription_ready)])
+async def voice_chat_in_session(
+    session_id: str, file: UploadFile = File(...), x_bypass_cache: Optional[str] = Header(default=None)
+):
+    history = await run_in_threadpool(session_store.get, session_id)
+    if history is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    audio_bytes = await file.read()
+    speculation = SpeculativeEmbedding(history)
+    # Admission happens before the response starts, so a full pool is still a plain 503.
+    transcription = await start_transcription(audio_bytes, speculation)
+    return sse_response(voice_chat_events(
+        session_id, history, transcription, speculation, use_cache=not is_cache_bypassed(x_bypass_cache)
+    ))
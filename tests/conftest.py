@@ -0,0 +1,16 @@
+import os
+import tempfile
+
+
+# Module-level singletons read their paths at import time, so point them at a scratch directory first.
+_SCRATCH = tempfile.mkdtemp(prefix="chatbot-tests-")
+for name, default in (
+    ("EMBEDDING_CACHE_PATH", "embeddings.sqlite3"),
+    ("SESSION_DB_PATH", "sessions.sqlite3"),
+    ("IMAGE_STORE_DIR", "images"),
+    ("LOCAL_INDEX_DIR", "local_index"),
+    ("NAMESPACE_ALIAS_PATH", "namespace_aliases.json"),
+    ("INDEX_MANIFEST_PATH", "index_manifest.json"),
+    ("RAG_ROUTER_MODEL_PATH", "rag_router.joblib"),
+):
+    os.environ.setdefault(name, os.path.join(_SCRATCH, default))
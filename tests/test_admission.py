@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from features.rag_generation.admission import PRIORITY_IMAGE, PRIORITY_TEXT, AdmissionRejected, UpstreamLimiter
+
+
+def rate_limit_error(retry_after):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, headers={"retry-after": str(retry_after)}, request=request)
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_concurrent_waiters_stay_within_the_token_budget():
+    # 6000 TPM refills 100 tokens per second; start empty so every request has to wait for tokens.
+    limiter = UpstreamLimiter("test", max_concurrency=10, tokens_per_minute=6000, latency_target=1.0)
+    limiter.tokens = 0.0
+
+    async def main():
+        start = time.monotonic()
+        admitted_at = []
+
+        async def request():
+            await limiter.acquire(10)
+            admitted_at.append(time.monotonic() - start)
+
+        await asyncio.gather(*(request() for _ in range(4)))
+        return sorted(admitted_at)
+
+    admitted_at = asyncio.run(main())
+    # 40 tokens at 100/s: the last request cannot be admitted before 0.4 s.
+    assert admitted_at[-1] >= 0.38
+    assert limiter.stats()["tokens_available"] >= -1.0
+
+
+def test_cancelled_waiter_returns_its_reserved_tokens():
+    limiter = UpstreamLimiter("test", max_concurrency=10, tokens_per_minute=60, latency_target=1.0)
+    limiter.tokens = 0.0
+
+    async def main():
+        task = asyncio.ensure_future(limiter.acquire(30))
+        await asyncio.sleep(0.05)
+        assert limiter.tokens < -29
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert limiter.tokens > -1.0
+    assert limiter.in_flight == 0
+
+
+def test_rate_limit_halves_the_limit_and_honours_retry_after():
+    limiter = UpstreamLimiter("test", max_concurrency=8, tokens_per_minute=100000, latency_target=1.0)
+
+    async def main():
+        with pytest.raises(openai.RateLimitError):
+            async with limiter.slot(10):
+                raise rate_limit_error(3)
+
+    asyncio.run(main())
+    assert limiter.limit == 4
+    assert limiter.rate_limited == 1
+    assert 2.5 < limiter._blocked_until - time.monotonic() <= 3.0
+
+    # Blocked for 3 s by Retry-After, so a request with a 1 s deadline is rejected up front.
+    with pytest.raises(AdmissionRejected):
+        asyncio.run(limiter.acquire(10, deadline=time.monotonic() + 1.0))
+
+
+def test_request_that_cannot_get_tokens_before_its_deadline_is_rejected():
+    limiter = UpstreamLimiter("test", max_concurrency=10, tokens_per_minute=60, latency_target=1.0)
+    limiter.tokens = 0.0
+
+    with pytest.raises(AdmissionRejected):
+        asyncio.run(limiter.acquire(30, deadline=time.monotonic() + 1.0))
+    assert limiter.rejected == 1
+    assert limiter.in_flight == 0
+    assert limiter.tokens > -1.0
+
+
+def test_deadline_expires_while_queued_for_a_slot():
+    limiter = UpstreamLimiter("test", max_concurrency=1, tokens_per_minute=100000, latency_target=0.01)
+
+    async def main():
+        await limiter.acquire(1)
+        with pytest.raises(AdmissionRejected, match="expired while queued"):
+            await limiter.acquire(1, deadline=time.monotonic() + 0.1)
+
+    asyncio.run(main())
+    assert limiter.in_flight == 1
+    assert not limiter._waiters or all(future.done() for _, _, future in limiter._waiters)
+
+
+def test_text_turns_are_admitted_before_queued_image_turns():
+    limiter = UpstreamLimiter("test", max_concurrency=1, tokens_per_minute=100000, latency_target=1.0)
+    order = []
+
+    async def request(name, priority):
+        await limiter.acquire(1, priority)
+        order.append(name)
+        limiter.in_flight -= 1
+        limiter._wake()
+
+    async def main():
+        await limiter.acquire(1)
+        image = asyncio.ensure_future(request("image", PRIORITY_IMAGE))
+        await asyncio.sleep(0)
+        text = asyncio.ensure_future(request("text", PRIORITY_TEXT))
+        await asyncio.sleep(0)
+        limiter.in_flight -= 1
+        limiter._wake()
+        await asyncio.gather(image, text)
+
+    asyncio.run(main())
+    assert order == ["text", "image"]
@@ -0,0 +1,27 @@
+import threading
+import time
+
+from features.rag_generation import client_registry
+from features.rag_generation.client_registry import ClientRegistry
+
+
+def test_concurrent_first_requests_build_the_local_index_once(monkeypatch):
+    built = []
+
+    class SlowIndex:
+        def __init__(self):
+            built.append(self)
+            time.sleep(0.05)
+
+    monkeypatch.setattr(client_registry, "RETRIEVAL_BACKEND", "local")
+    monkeypatch.setattr(client_registry, "LocalVectorIndex", SlowIndex)
+    registry = ClientRegistry()
+    backends = []
+    threads = [threading.Thread(target=lambda: backends.append(registry.get_retrieval_backend())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(built) == 1
+    assert all(backend is built[0] for backend in backends)
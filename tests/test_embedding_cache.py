@@ -0,0 +1,42 @@
+import threading
+import time
+
+from features.rag_generation.embedding_cache import EmbeddingCache
+
+
+def test_background_writes_reach_disk_after_close(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache(path)
+    cache.put_nowait("¿Qué es una lista?", "model", [0.5, 0.25])
+    assert cache.get_memory("¿qué es  una lista?", "model") == [0.5, 0.25]
+    cache.close()
+
+    reopened = EmbeddingCache(path)
+    assert reopened.get_memory("¿Qué es una lista?", "model") is None
+    assert reopened.get_disk("¿Qué es una lista?", "model") == [0.5, 0.25]
+    assert reopened.get_memory("¿Qué es una lista?", "model") == [0.5, 0.25]
+    reopened.close()
+
+
+def test_full_write_queue_still_serves_from_memory(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"), write_queue_size=1)
+    cache._start_writer = lambda: None
+    cache.put_nowait("uno", "model", [1.0])
+    cache.put_nowait("dos", "model", [2.0])
+    assert cache.dropped_writes == 1
+    assert cache.get_memory("dos", "model") == [2.0]
+
+
+def test_close_gives_up_on_a_stuck_writer(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"), write_queue_size=1)
+    unblock = threading.Event()
+    cache._write_rows = lambda rows: unblock.wait()
+    cache.put_nowait("uno", "model", [1.0])
+    while cache._writes.qsize():
+        time.sleep(0.001)
+    # The writer now blocks on "uno" and "dos" fills the queue, so the stop marker cannot be queued.
+    cache.put_nowait("dos", "model", [2.0])
+
+    cache.close(timeout=0.05)
+    assert cache._writer is None
+    unblock.set()
@@ -0,0 +1,121 @@
+import asyncio
+import base64
+import io
+from types import SimpleNamespace
+
+from PIL import Image
+
+from features.rag_generation import async_rag_generation, history_compaction
+from features.rag_generation.semantic_cache import SemanticCache, context_key
+from routers import chat_with_history
+
+
+LONG_TEXT = "explicación " * 4000
+MATCHES = [{"id": "faq-1", "score": 0.9, "metadata": {"pregunta": "¿Qué es Python?", "respuesta": "Un lenguaje."}}]
+
+
+class FakeOpenAI:
+    def __init__(self, summary_error=None):
+        self.summary_error = summary_error
+        self.summary_requests = []
+        self.chat_calls = 0
+        self.embeddings = SimpleNamespace(create=self._embedding)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+
+    async def _embedding(self, **kwargs):
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[0.3, 0.4, 0.5])])
+
+    async def _chat(self, model, messages, **kwargs):
+        if model == history_compaction.HISTORY_SUMMARY_MODEL:
+            self.summary_requests.append(messages[-1]["content"])
+            if self.summary_error is not None:
+                raise self.summary_error
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="resumen"))])
+        self.chat_calls += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="respuesta nueva"))], usage=None)
+
+
+def conversation(turns, last="¿Y eso?"):
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"pregunta {i}"})
+        messages.append({"role": "assistant", "content": f"respuesta {i}"})
+    return messages + [{"role": "user", "content": last}]
+
+
+def png_data_url(size):
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), "white").save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def test_history_within_budget_is_sent_untouched():
+    messages = conversation(6)
+    client = FakeOpenAI()
+    assert asyncio.run(history_compaction.compact_history(messages, client, token_budget=8000)) == messages
+    assert client.summary_requests == []
+
+
+def test_history_over_budget_keeps_recent_turns_and_summarizes_the_rest():
+    messages = [{"role": "user", "content": LONG_TEXT}, {"role": "assistant", "content": LONG_TEXT}] + conversation(1)
+    client = FakeOpenAI()
+    compacted = asyncio.run(history_compaction.compact_history(messages, client, token_budget=8000, keep_turns=3))
+
+    assert compacted[0]["role"] == "system" and "resumen" in compacted[0]["content"]
+    assert compacted[1:] == messages[2:]
+    assert history_compaction.history_tokens(compacted) <= 8000
+
+
+def test_summaries_are_cached_and_extended_incrementally():
+    older = [{"role": "user", "content": f"tema único {i} " + LONG_TEXT} for i in range(2)]
+    client = FakeOpenAI()
+    asyncio.run(history_compaction.summarize_messages(client, older))
+    asyncio.run(history_compaction.summarize_messages(client, older))
+    assert len(client.summary_requests) == 1
+
+    extended = older + [{"role": "assistant", "content": "tema único nuevo"}]
+    asyncio.run(history_compaction.summarize_messages(client, extended))
+    assert len(client.summary_requests) == 2
+    # Only the new message is sent, on top of the cached summary.
+    assert client.summary_requests[-1].startswith("Resumen previo:\nresumen")
+    assert "tema único 0" not in client.summary_requests[-1]
+
+
+def test_old_images_become_low_detail_thumbnails(monkeypatch):
+    monkeypatch.setattr(history_compaction, "HISTORY_IMAGE_MODE", "thumbnail")
+    part = {"type": "image_url", "image_url": {"url": png_data_url(1024)}}
+    shrunk = history_compaction.shrink_old_images({"role": "user", "content": [{"type": "text", "text": "mira"}, part]})
+
+    thumbnail = shrunk["content"][1]["image_url"]
+    assert thumbnail["detail"] == "low"
+    width, height = Image.open(io.BytesIO(history_compaction.decode_data_url(thumbnail["url"]))).size
+    assert max(width, height) <= history_compaction.HISTORY_THUMBNAIL_SIZE
+    assert history_compaction.image_tokens(shrunk["content"][1]) == history_compaction.LOW_DETAIL_IMAGE_TOKENS
+
+
+def test_old_images_can_be_dropped(monkeypatch):
+    monkeypatch.setattr(history_compaction, "HISTORY_IMAGE_MODE", "drop")
+    part = {"type": "image_url", "image_url": {"url": png_data_url(64)}}
+    shrunk = history_compaction.shrink_old_images({"role": "user", "content": [part]})
+    assert shrunk["content"] == [{"type": "text", "text": "[imagen omitida]"}]
+
+
+def test_follow_up_truncated_to_one_message_never_hits_the_semantic_cache(monkeypatch):
+    client = FakeOpenAI(summary_error=RuntimeError("summary model down"))
+    cache = SemanticCache()
+    monkeypatch.setattr(async_rag_generation, "semantic_cache", cache)
+    monkeypatch.setattr(async_rag_generation, "start_openai_client", lambda: client)
+    monkeypatch.setattr(async_rag_generation, "start_retrieval_backend", lambda host, index_name: SimpleNamespace(
+        query=lambda vector, namespace, top_k=3, filter=None, timeout=None: MATCHES
+    ))
+    monkeypatch.setattr(chat_with_history, "start_openai_client", lambda: client)
+    # A standalone "¿Y eso?" with the same retrieved context was answered before.
+    cache.store([0.3, 0.4, 0.5], context_key(MATCHES), "respuesta cacheada")
+
+    history = [{"role": "user", "content": "clases " + LONG_TEXT}, {"role": "assistant", "content": LONG_TEXT},
+               {"role": "user", "content": "¿Y eso?"}]
+    response = asyncio.run(chat_with_history.answer_chat("/chat_with_history", history))
+
+    assert client.summary_requests
+    assert response == "respuesta nueva"
+    assert client.chat_calls == 1
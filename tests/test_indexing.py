@@ -0,0 +1,99 @@
+import json
+import os
+
+import pytest
+
+import indexing_code
+from features.retrieval import backends
+from features.retrieval.backends import resolve_namespace, set_namespace_alias
+
+
+class RecordingIndex:
+    def __init__(self):
+        self.upserted = {}
+        self.deleted = {}
+        self.dropped = []
+
+    def upsert(self, vectors, namespace):
+        self.upserted.setdefault(namespace, []).extend(vector["id"] for vector in vectors)
+
+    def delete(self, ids=None, namespace=None, delete_all=False):
+        if delete_all:
+            self.dropped.append(namespace)
+        else:
+            self.deleted.setdefault(namespace, []).extend(ids)
+
+
+def record(record_id, values, answer="respuesta"):
+    return {"id": record_id, "values": values, "metadata": {"pregunta": record_id, "respuesta": answer}}
+
+
+def write_source(path, records):
+    path.write_text(json.dumps(records), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def index(monkeypatch):
+    for path in (indexing_code.MANIFEST_PATH, backends.NAMESPACE_ALIAS_PATH):
+        if os.path.exists(path):
+            os.remove(path)
+    # Force resolve_namespace to re-read the alias file.
+    monkeypatch.setattr(backends, "_aliases_checked_at", 0.0)
+    recording = RecordingIndex()
+    monkeypatch.setattr(indexing_code, "PineconeGRPC", lambda api_key, host: None)
+    monkeypatch.setattr(indexing_code, "get_index", lambda pc_grpc: recording)
+    return recording
+
+
+def test_reindexing_only_upserts_changed_records_and_deletes_removed_ones(index, tmp_path):
+    source = write_source(tmp_path / "faq.json", [
+        record("faq-1", [1.0, 0.0]), record("faq-2", [0.0, 1.0]), record("faq-3", [0.5, 0.5]),
+    ])
+    indexing_code.index_corpus(source, batch_size=2, concurrency=2)
+    assert sorted(index.upserted["example"]) == ["faq-1", "faq-2", "faq-3"]
+
+    index.upserted.clear()
+    write_source(tmp_path / "faq.json", [
+        record("faq-1", [1.0, 0.0]),
+        record("faq-2", [0.0, 1.0], answer="respuesta corregida"),
+        record("faq-4", [0.2, 0.8]),
+    ])
+    indexing_code.index_corpus(source, batch_size=2, concurrency=2)
+
+    assert sorted(index.upserted["example"]) == ["faq-2", "faq-4"]
+    assert index.deleted == {"example": ["faq-3"]}
+    assert sorted(indexing_code.load_manifest(indexing_code.MANIFEST_PATH)["example"]) == ["faq-1", "faq-2", "faq-4"]
+
+
+def test_unchanged_corpus_sends_nothing(index, tmp_path):
+    source = write_source(tmp_path / "faq.json", [record("faq-1", [1.0, 0.0])])
+    indexing_code.index_corpus(source)
+    index.upserted.clear()
+    indexing_code.index_corpus(source)
+    assert index.upserted == {}
+    assert index.deleted == {}
+
+
+def test_new_namespace_switches_the_alias_and_drops_the_old_namespace(index, tmp_path):
+    set_namespace_alias("example", "example-old")
+    source = write_source(tmp_path / "faq.json", [record("faq-1", [1.0, 0.0]), record("faq-2", [0.0, 1.0])])
+    indexing_code.index_corpus(source, new_namespace=True, drop_old=True)
+
+    (target,) = index.upserted
+    assert target.startswith("example-") and target != "example-old"
+    assert sorted(index.upserted[target]) == ["faq-1", "faq-2"]
+    assert index.dropped == ["example-old"]
+    assert resolve_namespace("example") == target
+    assert set(indexing_code.load_manifest(indexing_code.MANIFEST_PATH)) == {target}
+
+
+def test_alias_write_is_atomic_and_keeps_other_aliases(tmp_path):
+    path = tmp_path / "aliases.json"
+    assert set_namespace_alias("example", "example-1", path=path) is None
+    set_namespace_alias("otro", "otro-1", path=path)
+    assert set_namespace_alias("example", "example-2", path=path) == "example-1"
+
+    assert json.loads(path.read_text(encoding="utf-8")) == {"example": "example-2", "otro": "otro-1"}
+    # The temporary file is renamed over the alias file, never left behind.
+    assert os.listdir(tmp_path) == ["aliases.json"]
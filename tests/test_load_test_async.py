@@ -0,0 +1,18 @@
+import asyncio
+from types import SimpleNamespace
+
+from benchmarks import load_test_async
+from features.rag_generation import async_rag_generation, rag_generation
+
+
+def test_load_test_smoke(monkeypatch, capsys):
+    # install_fakes patches the pipeline modules; registering the originals restores them afterwards.
+    for module in (rag_generation, async_rag_generation):
+        monkeypatch.setattr(module, "start_retrieval_backend", module.start_retrieval_backend)
+        monkeypatch.setattr(module, "start_openai_client", module.start_openai_client)
+    args = SimpleNamespace(requests=4, concurrency=2, embedding_latency=0.0, query_latency=0.0, chat_latency=0.0)
+
+    asyncio.run(load_test_async.main(args))
+
+    output = capsys.readouterr().out
+    assert "sync " in output and "async " in output and "speedup" in output
@@ -0,0 +1,66 @@
+from features.retrieval.backends import LocalVectorIndex, matches_filter
+from features.retrieval.corpus_store import write_corpus
+
+
+RECORDS = [
+    {"id": "py-1", "namespace": "python", "values": [1.0, 0.0, 0.0],
+     "metadata": {"tema": "clases", "nivel": 1, "pregunta": "¿Qué es una clase?"}},
+    {"id": "py-2", "namespace": "python", "values": [0.9, 0.1, 0.0],
+     "metadata": {"tema": "funciones", "nivel": 2, "pregunta": "¿Qué es una función?"}},
+    {"id": "py-3", "namespace": "python", "values": [0.8, 0.2, 0.0],
+     "metadata": {"tema": "clases", "nivel": 3, "pregunta": "¿Qué es la herencia?"}},
+    {"id": "js-1", "namespace": "javascript", "values": [1.0, 0.0, 0.0],
+     "metadata": {"tema": "clases", "nivel": 1, "pregunta": "¿Qué es un prototipo?"}},
+]
+
+
+def build_index(tmp_path, dtype="float32"):
+    write_corpus(tmp_path / "index", RECORDS, dtype=dtype)
+    return LocalVectorIndex(index_dir=tmp_path / "index", source_path=None, dtype=dtype)
+
+
+def ids(matches):
+    return [match["id"] for match in matches]
+
+
+def test_filter_operators():
+    metadata = {"tema": "clases", "nivel": 2}
+    assert matches_filter(metadata, {"tema": {"$eq": "clases"}})
+    assert matches_filter(metadata, {"tema": {"$in": ["clases", "funciones"]}})
+    assert not matches_filter(metadata, {"tema": {"$in": ["funciones"]}})
+    assert matches_filter(metadata, {"nivel": {"$gte": 2}})
+    assert not matches_filter(metadata, {"nivel": {"$gte": 3}})
+    # A missing field never satisfies a range comparison.
+    assert not matches_filter({"tema": "clases"}, {"nivel": {"$gte": 0}})
+    assert matches_filter(metadata, {"$and": [{"tema": "clases"}, {"nivel": {"$gte": 2}}]})
+    assert not matches_filter(metadata, {"$and": [{"tema": "clases"}, {"nivel": {"$gte": 3}}]})
+
+
+def test_query_ranks_by_cosine_similarity(tmp_path):
+    index = build_index(tmp_path)
+    assert ids(index.query([1.0, 0.0, 0.0], namespace="python", top_k=3)) == ["py-1", "py-2", "py-3"]
+    assert ids(index.query([1.0, 0.0, 0.0], namespace="python", top_k=1)) == ["py-1"]
+
+
+def test_query_applies_metadata_filters(tmp_path):
+    index = build_index(tmp_path)
+    query = [1.0, 0.0, 0.0]
+    assert ids(index.query(query, "python", 3, {"tema": {"$eq": "clases"}})) == ["py-1", "py-3"]
+    assert ids(index.query(query, "python", 3, {"tema": {"$in": ["funciones"]}})) == ["py-2"]
+    assert ids(index.query(query, "python", 3, {"nivel": {"$gte": 2}})) == ["py-2", "py-3"]
+    assert ids(index.query(query, "python", 3, {"$and": [{"tema": "clases"}, {"nivel": {"$gte": 2}}]})) == ["py-3"]
+    assert index.query(query, "python", 3, {"tema": "decoradores"}) == []
+
+
+def test_namespaces_are_isolated(tmp_path):
+    index = build_index(tmp_path)
+    assert ids(index.query([1.0, 0.0, 0.0], namespace="javascript", top_k=3)) == ["js-1"]
+    assert "js-1" not in ids(index.query([1.0, 0.0, 0.0], namespace="python", top_k=5))
+    assert index.query([1.0, 0.0, 0.0], namespace="rust") == []
+
+
+def test_int8_index_keeps_the_ranking(tmp_path):
+    index = build_index(tmp_path, dtype="int8")
+    matches = index.query([1.0, 0.0, 0.0], namespace="python", top_k=3)
+    assert ids(matches) == ["py-1", "py-2", "py-3"]
+    assert abs(matches[0]["score"] - 1.0) < 0.02
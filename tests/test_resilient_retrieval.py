@@ -0,0 +1,120 @@
+import threading
+import time
+
+from features.retrieval.resilient import CircuitBreaker, ResilientRetrievalBackend
+
+
+MATCHES = [{"id": "faq-1", "score": 0.9, "metadata": {}}]
+FALLBACK_MATCHES = [{"id": "local-1", "score": 0.8, "metadata": {}}]
+
+
+class FakeBackend:
+    def __init__(self, delays=(), error=None, matches=MATCHES):
+        self.delays = list(delays)
+        self.error = error
+        self.matches = matches
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def query(self, vector, namespace, top_k=3, filter=None, timeout=None):
+        with self._lock:
+            self.calls += 1
+            delay = self.delays.pop(0) if self.delays else 0.0
+        time.sleep(delay)
+        if self.error is not None:
+            raise self.error
+        return self.matches
+
+    def close(self):
+        pass
+
+
+def resilient(primary, fallback=None, deadline=1.0, breaker=None):
+    backend = ResilientRetrievalBackend(
+        lambda: primary, fallback_factory=(lambda: fallback) if fallback is not None else None, deadline=deadline
+    )
+    if breaker is not None:
+        backend.breaker = breaker
+    return backend
+
+
+def test_slow_attempt_is_hedged_after_the_hedge_delay():
+    primary = FakeBackend(delays=[0.6, 0.0])
+    backend = resilient(primary, deadline=1.0)
+    assert backend.hedge_delay() == 0.25
+
+    start = time.monotonic()
+    assert backend.query([0.1]) == MATCHES
+    elapsed = time.monotonic() - start
+    backend.close()
+
+    assert backend.hedged == 1
+    assert primary.calls == 2
+    assert 0.2 <= elapsed < 0.5
+
+
+def test_fast_attempt_is_not_hedged():
+    primary = FakeBackend()
+    backend = resilient(primary)
+    assert backend.query([0.1]) == MATCHES
+    backend.close()
+    assert backend.hedged == 0
+    assert primary.calls == 1
+
+
+def test_breaker_opens_then_lets_a_single_probe_through_before_closing():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.times_opened == 2
+    assert not breaker.allow()
+
+
+def test_primary_down_serves_the_fallback_and_opens_the_breaker():
+    primary = FakeBackend(error=ConnectionError("pinecone down"))
+    fallback = FakeBackend(matches=FALLBACK_MATCHES)
+    backend = resilient(primary, fallback, breaker=CircuitBreaker(failure_threshold=2, reset_seconds=60))
+
+    results = [backend.query([0.1]) for _ in range(4)]
+    backend.close()
+
+    assert results == [FALLBACK_MATCHES] * 4
+    assert backend.breaker.state == "open"
+    # Once open, the primary is no longer tried.
+    assert primary.calls == 2
+    assert backend.fallbacks == 4
+
+
+def test_timeout_from_a_short_caller_budget_is_inconclusive():
+    primary = FakeBackend(delays=[0.5, 0.5])
+    fallback = FakeBackend(matches=FALLBACK_MATCHES)
+    backend = resilient(primary, fallback, deadline=1.0, breaker=CircuitBreaker(failure_threshold=1, reset_seconds=60))
+
+    assert backend.query([0.1], timeout=0.1) == FALLBACK_MATCHES
+    backend.close()
+
+    assert backend.failures == 1
+    assert backend.breaker.failures == 0
+    assert backend.breaker.state == "closed"
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from features.rag_generation import async_rag_generation
+from features.rag_generation.semantic_cache import SemanticCache, context_key, is_single_turn
+from routers.chat_with_history import is_cache_bypassed
+
+
+CONTEXT = ("faq-1", "faq-2")
+MATCHES = [{"id": "faq-1", "score": 0.9, "metadata": {"pregunta": "¿Qué es Python?", "respuesta": "Un lenguaje."}}]
+
+
+def test_hit_above_threshold_and_miss_below_it():
+    cache = SemanticCache(threshold=0.95)
+    cache.store([1.0, 0.0], CONTEXT, "respuesta")
+    # cos = 0.995 and 0.8 respectively.
+    assert cache.lookup([1.0, 0.1], CONTEXT) == "respuesta"
+    assert cache.lookup([1.0, 0.75], CONTEXT) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_same_question_with_different_retrieved_context_misses():
+    cache = SemanticCache(threshold=0.95)
+    cache.store([1.0, 0.0], CONTEXT, "respuesta")
+    assert cache.lookup([1.0, 0.0], ("faq-3",)) is None
+    assert context_key([{"id": "faq-2"}, {"id": "faq-1"}]) == CONTEXT
+
+
+def test_entries_expire_after_the_ttl():
+    cache = SemanticCache(ttl_seconds=0.05)
+    cache.store([1.0, 0.0], CONTEXT, "respuesta")
+    time.sleep(0.06)
+    assert cache.lookup([1.0, 0.0], CONTEXT) is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["evictions"] == 1
+
+
+def test_oldest_entries_are_evicted_beyond_max_entries():
+    cache = SemanticCache(max_entries=2)
+    cache.store([1.0, 0.0], ("a",), "primera")
+    cache.store([1.0, 0.0], ("b",), "segunda")
+    cache.store([1.0, 0.0], ("c",), "tercera")
+    assert cache.lookup([1.0, 0.0], ("a",)) is None
+    assert cache.lookup([1.0, 0.0], ("c",)) == "tercera"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_only_plain_single_turns_are_cacheable():
+    assert is_single_turn([{"role": "user", "content": "¿Qué es Python?"}])
+    assert not is_single_turn([
+        {"role": "user", "content": "¿Qué es Python?"},
+        {"role": "assistant", "content": "Un lenguaje."},
+        {"role": "user", "content": "¿Y eso?"},
+    ])
+    assert not is_single_turn([{"role": "user", "content": [
+        {"type": "text", "text": "¿Qué falla?"},
+        {"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA"}},
+    ]}])
+
+
+def test_bypass_header_values():
+    assert is_cache_bypassed("1") and is_cache_bypassed(" True ") and is_cache_bypassed("yes")
+    assert not is_cache_bypassed(None) and not is_cache_bypassed("0")
+
+
+class CountingOpenAI:
+    def __init__(self):
+        self.chat_calls = 0
+        self.embeddings = SimpleNamespace(create=self._embedding)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+
+    async def _embedding(self, **kwargs):
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[0.3, 0.4, 0.5])])
+
+    async def _chat(self, **kwargs):
+        self.chat_calls += 1
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=f"respuesta {self.chat_calls}"))], usage=None
+        )
+
+
+class FixedIndex:
+    def query(self, vector, namespace, top_k=3, filter=None, timeout=None):
+        return MATCHES
+
+
+def test_bypass_skips_the_semantic_cache(monkeypatch):
+    client = CountingOpenAI()
+    monkeypatch.setattr(async_rag_generation, "semantic_cache", SemanticCache())
+    monkeypatch.setattr(async_rag_generation, "start_openai_client", lambda: client)
+    monkeypatch.setattr(async_rag_generation, "start_retrieval_backend", lambda host, index_name: FixedIndex())
+
+    def ask(use_cache):
+        history = [{"role": "user", "content": "¿Qué es una clase en Python?"}]
+        return asyncio.run(async_rag_generation.generation_main_workflow(
+            "¿Qué es una clase en Python?", "host", "index", history, "Eres un experto.", use_cache=use_cache
+        ))
+
+    assert ask(use_cache=True) == "respuesta 1"
+    assert ask(use_cache=True) == "respuesta 1"
+    assert ask(use_cache=False) == "respuesta 2"
+    assert client.chat_calls == 2
@@ -0,0 +1,53 @@
+import time
+
+from features.sessions.session_store import InMemorySessionStore, SQLiteSessionStore
+
+
+USER = {"role": "user", "content": "¿Qué es una tupla?"}
+ASSISTANT = {"role": "assistant", "content": "Una secuencia inmutable."}
+
+
+def test_memory_store_expires_idle_sessions():
+    store = InMemorySessionStore(ttl_seconds=0.05)
+    session_id = store.create([USER])
+    assert store.get(session_id) == [USER]
+    time.sleep(0.06)
+    assert store.get(session_id) is None
+    assert not store.append(session_id, ASSISTANT)
+
+
+def test_memory_store_evicts_the_least_recently_used_session():
+    store = InMemorySessionStore(max_sessions=2)
+    first = store.create()
+    second = store.create()
+    # Touching the first session makes the second the least recently used one.
+    assert store.append(first, USER)
+    third = store.create()
+    assert store.get(second) is None
+    assert store.get(first) == [USER]
+    assert store.get(third) == []
+
+
+def test_sqlite_store_persists_across_instances(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    store = SQLiteSessionStore(path)
+    session_id = store.create([USER])
+    assert store.append(session_id, ASSISTANT)
+    store.close()
+
+    reopened = SQLiteSessionStore(path)
+    assert reopened.get(session_id) == [USER, ASSISTANT]
+    assert reopened.delete(session_id)
+    assert reopened.get(session_id) is None
+    reopened.close()
+
+
+def test_sqlite_store_expires_idle_sessions(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"), ttl_seconds=0.05)
+    session_id = store.create([USER])
+    time.sleep(0.06)
+    assert store.get(session_id) is None
+    # Creating a session also purges the expired rows.
+    store.create()
+    assert store._db.execute("SELECT COUNT(*) FROM sessions WHERE id = ?", (session_id,)).fetchone()[0] == 0
+    store.close()
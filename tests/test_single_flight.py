@@ -0,0 +1,109 @@
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+from features.images.image_store import ImageStore
+from features.rag_generation.single_flight import SharedStream, generation_key
+from routers import chat_with_history
+
+
+SYSTEM_PROMPT = "Eres un experto en Python."
+
+
+def image_turn(text, url):
+    return {"role": "user", "content": [
+        {"type": "text", "text": text},
+        {"type": "image_url", "image_url": {"url": url}},
+    ]}
+
+
+def test_same_text_with_different_images_is_not_coalesced():
+    first = generation_key("¿Qué falla aquí?", [], [image_turn("¿Qué falla aquí?", "data:image/png;base64,AAAA")],
+                           SYSTEM_PROMPT)
+    second = generation_key("¿Qué falla aquí?", [], [image_turn("¿Qué falla aquí?", "data:image/png;base64,BBBB")],
+                            SYSTEM_PROMPT)
+    assert first != second
+
+
+def ref_turn(text, image_id):
+    return {"role": "user", "content": [
+        {"type": "text", "text": text},
+        {"type": "image_ref", "image_id": image_id},
+    ]}
+
+
+def png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def prepared_key(history):
+    # Keys are taken after prepare_chat, once image_ref parts have become inline image_url parts.
+    user_query, messages = asyncio.run(chat_with_history.prepare_chat("/chat_with_history", history))
+    return generation_key(user_query, [], messages, SYSTEM_PROMPT)
+
+
+def test_image_refs_are_keyed_by_the_resolved_image(tmp_path, monkeypatch):
+    store = ImageStore(tmp_path)
+    monkeypatch.setattr(chat_with_history, "image_store", store)
+    monkeypatch.setattr(chat_with_history, "start_openai_client", lambda: None)
+    white = store.put(png_bytes("white"))["image_id"]
+    black = store.put(png_bytes("black"))["image_id"]
+
+    assert prepared_key([ref_turn("¿Qué falla aquí?", white)]) == prepared_key([ref_turn("¿qué falla  aquí?", white)])
+    assert prepared_key([ref_turn("¿Qué falla aquí?", white)]) != prepared_key([ref_turn("¿Qué falla aquí?", black)])
+
+
+def test_text_turns_differing_only_in_case_and_spacing_are_coalesced():
+    first = generation_key("¿Qué es Python?", [], [{"role": "user", "content": "¿Qué es Python?"}], SYSTEM_PROMPT)
+    second = generation_key("¿qué es  python?", [], [{"role": "user", "content": "¿qué es  python?"}], SYSTEM_PROMPT)
+    assert first == second
+
+
+def test_late_subscriber_replays_earlier_chunks_then_follows_the_live_stream():
+    async def scenario():
+        release = asyncio.Event()
+
+        async def source():
+            yield "Hola"
+            yield ", "
+            await release.wait()
+            yield "mundo"
+
+        shared = SharedStream(source())
+        first = shared.subscribe()
+        assert [await first.__anext__(), await first.__anext__()] == ["Hola", ", "]
+
+        late = shared.subscribe()
+        # The late joiner gets what was already generated without waiting on the source.
+        assert [await late.__anext__(), await late.__anext__()] == ["Hola", ", "]
+        pending = asyncio.ensure_future(late.__anext__())
+        await asyncio.sleep(0)
+        assert not pending.done()
+
+        release.set()
+        assert await pending == "mundo"
+        assert [chunk async for chunk in first] == ["mundo"]
+        assert [chunk async for chunk in late] == []
+
+    asyncio.run(scenario())
+
+
+def test_subscribers_see_the_upstream_error_after_the_replayed_chunks():
+    async def scenario():
+        async def source():
+            yield "parcial"
+            raise RuntimeError("upstream cortado")
+
+        shared = SharedStream(source())
+        await shared.task
+        received = []
+        with pytest.raises(RuntimeError, match="upstream cortado"):
+            async for chunk in shared.subscribe():
+                received.append(chunk)
+        assert received == ["parcial"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+from features.monitoring.telemetry import TelemetryWriter
+
+
+class RecordingClient:
+    def __init__(self):
+        self.calls = []
+        self.batches = []
+
+    def create_run(self, experiment_id, start_time=None, tags=None, run_name=None):
+        self.calls.append("create_run")
+        return SimpleNamespace(info=SimpleNamespace(run_id=f"run-{len(self.calls)}"))
+
+    def log_batch(self, run_id, metrics=(), params=(), tags=()):
+        self.calls.append("log_batch")
+        self.batches.append((run_id, list(metrics), list(params)))
+
+    def set_terminated(self, run_id, end_time=None):
+        self.calls.append("set_terminated")
+
+
+def record(endpoint, query_len, timestamp_ms):
+    return {
+        "run_name": "chat_with_history",
+        "params": {"endpoint": endpoint, "user_query_len": query_len, "chat_history_len": 1},
+        "metrics": {},
+        "tags": {},
+        "timestamp_ms": timestamp_ms,
+    }
+
+
+def test_flush_writes_one_run_per_endpoint_with_a_step_per_request():
+    client = RecordingClient()
+    writer = TelemetryWriter()
+    writer._experiment = lambda: (client, "1")
+
+    writer._flush([record("/chat_with_history", 10 + i, 1000 + i) for i in range(20)] + [record("/sessions/chat", 5, 2000)])
+
+    assert client.calls.count("create_run") == 2
+    assert client.calls.count("log_batch") == 2
+    assert client.calls.count("set_terminated") == 2
+    assert writer.logged == 21
+    _, metrics, params = client.batches[0]
+    assert {(param.key, param.value) for param in params} == {("endpoint", "/chat_with_history"), ("requests", "20")}
+    query_lens = sorted((metric.step, metric.value) for metric in metrics if metric.key == "user_query_len")
+    assert query_lens == [(step, float(10 + step)) for step in range(20)]
+
+
+def test_failed_group_only_drops_its_own_records():
+    client = RecordingClient()
+
+    def create_run(experiment_id, start_time=None, tags=None, run_name=None):
+        if run_name == "broken":
+            raise RuntimeError("mlflow down")
+        return RecordingClient.create_run(client, experiment_id, start_time, tags, run_name)
+
+    client.create_run = create_run
+    writer = TelemetryWriter()
+    writer._experiment = lambda: (client, "1")
+
+    broken = {**record("/chat_with_history", 1, 1000), "run_name": "broken"}
+    writer._flush([broken, record("/chat_with_history", 2, 1001)])
+
+    assert writer.failed == 1
+    assert writer.logged == 1
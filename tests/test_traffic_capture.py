@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+from features.monitoring import traffic_capture
+from features.monitoring.traffic_capture import TrafficCaptureMiddleware, TrafficCaptureWriter, prepare_body
+
+
+IMAGE_URL = "data:image/png;base64," + "A" * 4000
+BODY = json.dumps({"chat_history": [{"role": "user", "content": [
+    {"type": "text", "text": "Escríbeme a ana@example.com"},
+    {"type": "image_url", "image_url": {"url": IMAGE_URL}},
+]}]}).encode("utf-8")
+
+
+class QueueingWriter:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+
+async def echo_app(scope, receive, send):
+    while (await receive()).get("more_body"):
+        pass
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def call(middleware, chunks):
+    messages = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "POST", "path": "/chat_with_history",
+             "headers": [(b"content-type", b"application/json")]}
+    asyncio.run(middleware(scope, receive, send))
+
+
+def test_body_is_queued_raw_and_redacted_by_the_writer():
+    writer = QueueingWriter()
+    call(TrafficCaptureMiddleware(echo_app, writer=writer), [BODY[:100], BODY[100:]])
+    (record,) = writer.records
+    assert record["body"] == BODY
+    assert record["request_bytes"] == len(BODY)
+
+    body = prepare_body(record["path"], record["body"], "application/json")
+    text, image = body["chat_history"][0]["content"]
+    assert text["text"] == "Escríbeme a <email>"
+    assert image == {"type": "image_url", "redacted_bytes": len(IMAGE_URL)}
+    # Without the image the body fits the cap; with nothing left to remove it does not.
+    assert prepare_body(record["path"], record["body"], "application/json", max_bytes=200) is not None
+    assert prepare_body(record["path"], record["body"], "application/json", max_bytes=50) is None
+
+
+def test_oversized_request_is_recorded_without_buffering_its_body(monkeypatch):
+    monkeypatch.setattr(traffic_capture, "TRAFFIC_CAPTURE_MAX_BUFFER_BYTES", 1000)
+    writer = QueueingWriter()
+    call(TrafficCaptureMiddleware(echo_app, writer=writer), [BODY[:600], BODY[600:]])
+    (record,) = writer.records
+    assert record["body"] is None
+    assert record["request_bytes"] == len(BODY)
+    assert record["status"] == 200
+
+
+def test_writer_thread_writes_anonymized_records(tmp_path):
+    path = tmp_path / "traffic.jsonl"
+    writer = TrafficCaptureWriter(str(path)).start()
+    writer.write({"path": "/chat_with_history", "headers": {"content-type": "application/json"}, "body": BODY})
+    writer.write({"path": "/chat_with_history", "headers": {"content-type": "application/json"}, "body": b"[1]"})
+    writer.stop()
+
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert writer.written == 2
+    assert lines[0]["body"]["chat_history"][0]["content"][1]["redacted_bytes"] == len(IMAGE_URL)
+    assert IMAGE_URL not in path.read_text(encoding="utf-8")
+    assert lines[1]["body"] is None
@@ -0,0 +1,37 @@
+import json
+
+from features.transcription import transcription
+
+
+class ScriptedRecognizer:
+    """Ends a segment every third chunk and reports the chunks seen so far as the partial."""
+
+    def __init__(self, model, sample_rate):
+        self.chunks = 0
+
+    def AcceptWaveform(self, pcm):
+        self.chunks += 1
+        return self.chunks % 3 == 0
+
+    def Result(self):
+        return json.dumps({"text": f"segmento {self.chunks // 3}"})
+
+    def PartialResult(self):
+        return json.dumps({"partial": "hola" if self.chunks % 3 == 2 else ""})
+
+    def FinalResult(self):
+        return json.dumps({"text": "fin"})
+
+
+def test_stream_reports_results_and_only_changed_partials(monkeypatch):
+    monkeypatch.setattr(transcription, "KaldiRecognizer", ScriptedRecognizer)
+    chunks = iter([b"\x00\x00" * 160] * 6 + [None])
+    events = []
+
+    text = transcription.transcribe_pcm_stream(lambda: next(chunks), None, 16000, lambda *event: events.append(event))
+
+    assert events == [
+        ("partial", "hola"), ("result", "segmento 1"),
+        ("partial", "hola"), ("result", "segmento 2"),
+    ]
+    assert text == "segmento 1 segmento 2 fin"